@@ -0,0 +1,154 @@
+import asyncio
+import math
+import os
+import time
+from collections import OrderedDict
+from typing import Dict, Optional
+
+
+class AdmissionRejected(Exception):
+    """Raised when a request is shed instead of being queued"""
+
+    def __init__(self, status_code: int, reason: str, retry_after: float):
+        super().__init__(reason)
+        self.status_code = status_code
+        self.reason = reason
+        self.retry_after = max(1, math.ceil(retry_after))
+
+
+class TokenBucket:
+    """Classic token bucket: `rate` tokens per second, holding at most `capacity`"""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def take(self, now: Optional[float] = None) -> float:
+        """Take one token. Returns 0 when allowed, otherwise seconds until a token is free"""
+        now = time.monotonic() if now is None else now
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        if self.rate <= 0:
+            return float("inf")
+        return (1 - self.tokens) / self.rate
+
+
+class AdmissionController:
+    """Per-client rate limiting plus a global in-flight cap with a bounded wait queue"""
+
+    def __init__(
+        self,
+        rate: float = 1.0,
+        burst: float = 10,
+        max_in_flight: int = 32,
+        max_queue_depth: int = 64,
+        max_queue_wait: float = 2.0,
+        max_clients: int = 10000,
+    ):
+        self.rate = rate
+        self.burst = burst
+        self.max_in_flight = max_in_flight
+        self.max_queue_depth = max_queue_depth
+        self.max_queue_wait = max_queue_wait
+        self.max_clients = max_clients
+
+        self._buckets: "OrderedDict[str, TokenBucket]" = OrderedDict()
+        self._semaphore: Optional[asyncio.Semaphore] = None
+
+        self.in_flight = 0
+        self.queue_depth = 0
+        self.max_queue_depth_seen = 0
+        self.admitted = 0
+        self.rejected_rate_limited = 0
+        self.rejected_queue_full = 0
+        self.rejected_queue_timeout = 0
+
+    def _get_semaphore(self) -> asyncio.Semaphore:
+        # Created lazily so it binds to the running event loop
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_in_flight)
+        return self._semaphore
+
+    def _check_rate(self, client_id: str):
+        bucket = self._buckets.get(client_id)
+        if bucket is None:
+            bucket = TokenBucket(self.rate, self.burst)
+            self._buckets[client_id] = bucket
+            # Bound memory: forget the least recently seen clients
+            while len(self._buckets) > self.max_clients:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(client_id)
+
+        wait = bucket.take()
+        if wait > 0:
+            self.rejected_rate_limited += 1
+            raise AdmissionRejected(429, "Rate limit exceeded", wait)
+
+    async def acquire(self, client_id: str):
+        """Admit a request or raise AdmissionRejected. Pair every success with release()"""
+        self._check_rate(client_id)
+
+        semaphore = self._get_semaphore()
+        if semaphore.locked():
+            # Shed immediately rather than grow an unbounded backlog
+            if self.queue_depth >= self.max_queue_depth:
+                self.rejected_queue_full += 1
+                raise AdmissionRejected(503, "Server busy", self.max_queue_wait)
+
+            self.queue_depth += 1
+            self.max_queue_depth_seen = max(self.max_queue_depth_seen, self.queue_depth)
+            try:
+                await asyncio.wait_for(semaphore.acquire(), timeout=self.max_queue_wait)
+            except asyncio.TimeoutError:
+                self.rejected_queue_timeout += 1
+                raise AdmissionRejected(503, "Server busy", self.max_queue_wait)
+            finally:
+                self.queue_depth -= 1
+        else:
+            await semaphore.acquire()
+
+        self.in_flight += 1
+        self.admitted += 1
+
+    def release(self):
+        self.in_flight -= 1
+        self._get_semaphore().release()
+
+    def stats(self) -> Dict:
+        return {
+            "in_flight": self.in_flight,
+            "max_in_flight": self.max_in_flight,
+            "queue_depth": self.queue_depth,
+            "max_queue_depth": self.max_queue_depth,
+            "max_queue_depth_seen": self.max_queue_depth_seen,
+            "admitted": self.admitted,
+            "rejected": {
+                "rate_limited": self.rejected_rate_limited,
+                "queue_full": self.rejected_queue_full,
+                "queue_timeout": self.rejected_queue_timeout,
+            },
+            "tracked_clients": len(self._buckets),
+        }
+
+
+_chat_admission = None
+
+def get_chat_admission() -> AdmissionController:
+    """Get or create the admission controller for /chat"""
+    global _chat_admission
+    if _chat_admission is None:
+        _chat_admission = AdmissionController(
+            rate=float(os.getenv("CHAT_RATE_LIMIT", "1.0")),
+            burst=float(os.getenv("CHAT_RATE_BURST", "10")),
+            max_in_flight=int(os.getenv("CHAT_MAX_IN_FLIGHT", "32")),
+            max_queue_depth=int(os.getenv("CHAT_MAX_QUEUE_DEPTH", "64")),
+            max_queue_wait=float(os.getenv("CHAT_MAX_QUEUE_WAIT", "2.0")),
+        )
+    return _chat_admission
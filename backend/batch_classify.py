@@ -0,0 +1,209 @@
+import argparse
+import asyncio
+import concurrent.futures
+import csv
+import itertools
+import json
+import os
+import time
+from collections import Counter
+from typing import Dict, Iterator, List, Optional
+
+from batching import atomic_write
+from gazetteer import resolve_place
+from langgraph_workflow import classify_without_llm, classify_batch_with_llm, extract_severity, find_location_in_text
+from llm_ledger import set_llm_context
+
+BATCH_FORMATS = ["csv", "jsonl"]
+
+
+def detect_format(path: str, explicit: Optional[str] = None) -> str:
+    if explicit:
+        return explicit
+    return "csv" if path.lower().endswith(".csv") else "jsonl"
+
+
+def iter_rows(path: str, fmt: str) -> Iterator[Dict]:
+    """Stream input rows as dicts without loading the file"""
+    with open(path, encoding="utf-8", newline="") as f:
+        if fmt == "csv":
+            yield from csv.DictReader(f)
+        else:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+
+
+def enrich_chunk(texts: List[str]) -> List[Dict]:
+    """CPU-bound keyword, local model and regex work for one chunk (runs in a worker process)"""
+    results = []
+    for text in texts:
+        department = classify_without_llm(text)
+        # Same extraction as the live first turn: a named place or nothing, never the whole text
+        location = find_location_in_text(text)
+        place = resolve_place(location) if location else None
+        results.append({
+            "department": department,
+            "department_source": "local" if department else None,
+            "severity_level": extract_severity(text),
+            "location": location,
+            "place_id": place.place_id if place else None,
+            "place_name": place.name if place else None,
+        })
+    return results
+
+
+async def resolve_with_llm(texts: List[str], results: List[Dict], semaphore: Optional[asyncio.Semaphore],
+                           batch_size: int = 20):
+    """Fill in departments the local pass could not decide, `batch_size` rows per LLM call"""
+    undecided = [(text, result) for text, result in zip(texts, results) if result["department"] is None]
+
+    async def resolve(batch):
+        departments = [None] * len(batch)
+        if semaphore is not None:
+            async with semaphore:
+                departments = await asyncio.to_thread(classify_batch_with_llm, [text for text, _ in batch])
+        for (_, result), department in zip(batch, departments):
+            result["department"] = department or "traffic_dept"
+            result["department_source"] = "llm" if department else "default"
+
+    await asyncio.gather(*(
+        resolve(undecided[i:i + batch_size]) for i in range(0, len(undecided), batch_size)
+    ))
+
+
+def _read_checkpoint(path: str) -> Dict:
+    if not os.path.exists(path):
+        return {"rows": 0}
+    with open(path) as f:
+        return json.load(f)
+
+
+def _write_checkpoint(path: str, rows: int, offset: int):
+    with atomic_write(path) as f:
+        json.dump({"rows": rows, "offset": offset}, f)
+
+
+def truncate_to_checkpoint(path: str, offset: Optional[int]):
+    """Drop output written after the last checkpoint (a crash between write and checkpoint)"""
+    if offset is not None and os.path.exists(path) and os.path.getsize(path) > offset:
+        with open(path, "r+b") as f:
+            f.truncate(offset)
+
+
+def _write_rows(out, writer, fmt: str, rows: List[Dict]):
+    if fmt == "csv":
+        writer.writerows(rows)
+    else:
+        out.write("".join(json.dumps(row, default=str) + "\n" for row in rows))
+
+
+async def run_batch(
+    input_path: str,
+    out_path: str,
+    text_field: str = "message",
+    input_format: Optional[str] = None,
+    output_format: Optional[str] = None,
+    workers: Optional[int] = None,
+    chunk_size: int = 500,
+    llm_concurrency: int = 8,
+    llm_batch_size: int = 20,
+    use_llm: bool = True,
+    resume: bool = False,
+) -> Dict:
+    """Classify every row of `input_path` and write enriched rows to `out_path` in input order.
+
+    Chunks are enriched in a process pool; chunks waiting on LLM fallbacks overlap with
+    later chunks. After each chunk is written the row count and output size are saved to
+    <out>.checkpoint; a resume truncates the output to that size before appending.
+    """
+    input_format = detect_format(input_path, input_format)
+    output_format = detect_format(out_path, output_format)
+    checkpoint_path = f"{out_path}.checkpoint"
+    checkpoint = _read_checkpoint(checkpoint_path) if resume else {"rows": 0}
+    skip = checkpoint["rows"]
+    appending = skip > 0 and os.path.exists(out_path)
+    if appending:
+        truncate_to_checkpoint(out_path, checkpoint.get("offset"))
+
+    set_llm_context(source="batch")
+    semaphore = asyncio.Semaphore(llm_concurrency) if use_llm else None
+    loop = asyncio.get_running_loop()
+    workers = workers or os.cpu_count() or 1
+    rows = itertools.islice(iter_rows(input_path, input_format), skip, None)
+    done, sources = skip, Counter()
+    started = time.perf_counter()
+
+    async def process(chunk: List[Dict]) -> List[Dict]:
+        texts = [str(row.get(text_field) or "") for row in chunk]
+        results = await loop.run_in_executor(pool, enrich_chunk, texts)
+        await resolve_with_llm(texts, results, semaphore, llm_batch_size)
+        return [{**row, **result} for row, result in zip(chunk, results)]
+
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as pool, \
+            open(out_path, "a" if appending else "w", encoding="utf-8", newline="") as out:
+        writer = None
+        pending = []
+        exhausted = False
+        while pending or not exhausted:
+            # Keep a bounded number of chunks in flight so memory stays flat on huge inputs
+            while not exhausted and len(pending) < workers * 2:
+                chunk = list(itertools.islice(rows, chunk_size))
+                if not chunk:
+                    exhausted = True
+                    break
+                pending.append(asyncio.create_task(process(chunk)))
+            if not pending:
+                break
+
+            enriched = await pending.pop(0)
+            if output_format == "csv" and writer is None:
+                fieldnames = list(enriched[0].keys())
+                writer = csv.DictWriter(out, fieldnames=fieldnames, extrasaction="ignore")
+                if not appending:
+                    writer.writeheader()
+            _write_rows(out, writer, output_format, enriched)
+            out.flush()
+            done += len(enriched)
+            sources.update(row["department_source"] for row in enriched)
+            # Checkpoint only after the chunk is on disk so a resume never skips rows; the offset
+            # lets a resume cut off a chunk written after this checkpoint instead of repeating it
+            _write_checkpoint(checkpoint_path, done, out.tell())
+            print(f"Classified {done} rows ({(done - skip) / (time.perf_counter() - started):.0f} rows/s)")
+
+    return {"rows": done, "skipped": skip, "sources": dict(sources)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Classify a complaint backlog (CSV or JSONL) offline")
+    parser.add_argument("input", help="CSV or JSONL file")
+    parser.add_argument("--out", required=True, help="Output file (.csv or .jsonl)")
+    parser.add_argument("--text-field", default="message", help="Column holding the complaint text")
+    parser.add_argument("--input-format", choices=BATCH_FORMATS)
+    parser.add_argument("--output-format", choices=BATCH_FORMATS)
+    parser.add_argument("--workers", type=int, help="Worker processes (default: CPU count)")
+    parser.add_argument("--chunk-size", type=int, default=500)
+    parser.add_argument("--llm-concurrency", type=int, default=8, help="LLM calls in flight")
+    parser.add_argument("--llm-batch-size", type=int, default=20, help="Undecided rows classified per LLM call")
+    parser.add_argument("--no-llm", action="store_true", help="Never call OpenAI; undecided rows go to traffic")
+    parser.add_argument("--resume", action="store_true", help="Continue from the <out>.checkpoint row count")
+    args = parser.parse_args()
+
+    summary = asyncio.run(run_batch(
+        args.input,
+        args.out,
+        text_field=args.text_field,
+        input_format=args.input_format,
+        output_format=args.output_format,
+        workers=args.workers,
+        chunk_size=args.chunk_size,
+        llm_concurrency=args.llm_concurrency,
+        llm_batch_size=args.llm_batch_size,
+        use_llm=not args.no_llm,
+        resume=args.resume,
+    ))
+    print(f"[OK] Batch finished: {summary['rows']} rows written to {args.out} ({summary['sources']})")
+
+
+if __name__ == "__main__":
+    main()
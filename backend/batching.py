@@ -0,0 +1,163 @@
+import json
+import os
+import threading
+from collections import deque
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, List, Optional
+
+# Every buffer created in this process, so shutdown can drain them all
+_buffers: List["BatchBuffer"] = []
+_registry_lock = threading.Lock()
+
+
+class BatchBuffer:
+    """Collect items in memory and hand them to `flush_fn` in batches from a background thread.
+
+    A batch whose flush raises goes back to the front of the queue and is retried on the next
+    flush, up to `max_retries` times in a row; after that it is dropped and counted in `dropped`.
+    """
+
+    def __init__(
+        self,
+        flush_fn: Callable[[list], None],
+        max_items: int = 500,
+        flush_interval: float = 2.0,
+        max_pending: int = 10000,
+        max_retries: int = 3,
+        name: str = "batch",
+    ):
+        self.flush_fn = flush_fn
+        self.max_items = max_items
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.max_retries = max_retries
+        self.name = name
+        self.dropped = 0
+        self.flushed = 0
+        self._failures = 0  # consecutive failed flushes of the batch at the front
+        self._items: deque = deque()
+        self._reset()
+        with _registry_lock:
+            _buffers.append(self)
+
+    def _reset(self):
+        # Locks and threads do not survive fork(); rebuild them in the child
+        self._pid = os.getpid()
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopped = False
+        self._thread: Optional[threading.Thread] = None
+
+    def _ensure_thread(self):
+        if self._pid != os.getpid():
+            self._reset()
+        if self._thread is None and not self._stopped:
+            self._thread = threading.Thread(target=self._run, name=f"{self.name}-flusher", daemon=True)
+            self._thread.start()
+
+    def add(self, item):
+        """Queue an item; never blocks on I/O"""
+        self._ensure_thread()
+        with self._lock:
+            if len(self._items) >= self.max_pending:
+                # Bounded memory: drop the oldest item rather than grow without limit
+                self._items.popleft()
+                self.dropped += 1
+            self._items.append(item)
+            full = len(self._items) >= self.max_items
+        if full:
+            self._wakeup.set()
+
+    def pending(self) -> int:
+        return len(self._items)
+
+    def flush(self) -> bool:
+        """Write out everything buffered so far; False if the write failed"""
+        with self._flush_lock:
+            with self._lock:
+                items = list(self._items)
+                self._items.clear()
+            if not items:
+                return True
+            try:
+                self.flush_fn(items)
+            except Exception as e:
+                self._failures += 1
+                if self._failures > self.max_retries:
+                    self._failures = 0
+                    self.dropped += len(items)
+                    print(f"[ERROR] {self.name} flush failed {self.max_retries + 1} times, dropping {len(items)} items: {e}")
+                    return False
+                print(f"[ERROR] {self.name} flush failed ({len(items)} items, will retry): {e}")
+                with self._lock:
+                    # Back in front of anything added meanwhile, still within max_pending
+                    self._items.extendleft(reversed(items))
+                    while len(self._items) > self.max_pending:
+                        self._items.popleft()
+                        self.dropped += 1
+                return False
+            self._failures = 0
+            self.flushed += len(items)
+            return True
+
+    def close(self):
+        """Stop the background thread and flush what is left"""
+        self._stopped = True
+        self._wakeup.set()
+        if self._thread is not None and self._pid == os.getpid():
+            self._thread.join(timeout=5)
+        self._thread = None
+        # Give a failing batch its remaining retries before giving up on it
+        for _ in range(self.max_retries + 1):
+            if self.flush():
+                break
+
+    def _run(self):
+        while not self._stopped:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            self.flush()
+
+
+def close_all():
+    """Drain every buffer in this process (call on shutdown)"""
+    with _registry_lock:
+        buffers = list(_buffers)
+    for buffer in buffers:
+        buffer.close()
+
+
+def append_jsonl(path: str, records: Iterable[Dict]):
+    """Append records as JSON lines, creating the directory if needed.
+
+    One write per batch keeps concurrent writers from interleaving lines.
+    """
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(path, "a", encoding="utf-8") as f:
+        f.write("".join(json.dumps(r, default=str) + "\n" for r in records))
+
+
+@contextmanager
+def atomic_write(path: str, mode: str = "w"):
+    """Write to a temporary file that replaces `path` only once the block completes.
+
+    Readers see the old file or the new one, never a partial write. The temporary name is
+    per process, so workers saving the same file at once do not clash; the last rename wins.
+    """
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        with open(tmp_path, mode) as f:
+            yield f
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
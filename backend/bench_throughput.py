@@ -0,0 +1,117 @@
+import argparse
+import asyncio
+import itertools
+import os
+import signal
+import socket
+import subprocess
+import sys
+import time
+
+import httpx
+
+from serve import available_cpus
+
+# Keyword-routed messages: exercises JSON, routing and regex work without calling OpenAI
+MESSAGES = [
+    "Huge pothole on the main road near the market",
+    "Garbage bins overflowing behind the school for a week",
+    "Street lights are not working on 5th avenue",
+    "Traffic signal stuck on red at the junction",
+]
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_server(workers: int, port: int) -> subprocess.Popen:
+    env = {**os.environ, "WEB_CONCURRENCY": str(workers), "PORT": str(port)}
+    return subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "main:app"],
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+
+
+def wait_until_up(url: str, timeout: float = 30.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if httpx.get(f"{url}/health", timeout=1.0).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f"Server at {url} did not start")
+
+
+async def load(url: str, path: str, concurrency: int, duration: float) -> dict:
+    """Keep `concurrency` requests in flight for `duration` seconds"""
+    latencies, errors = [], 0
+    messages = itertools.cycle(MESSAGES)
+    deadline = time.monotonic() + duration
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    async with httpx.AsyncClient(base_url=url, limits=limits, timeout=10.0) as client:
+        async def user():
+            nonlocal errors
+            while time.monotonic() < deadline:
+                started = time.perf_counter()
+                try:
+                    response = await client.post(path, json={"message": next(messages)})
+                    if response.status_code != 200:
+                        errors += 1
+                        continue
+                except httpx.HTTPError:
+                    errors += 1
+                    continue
+                latencies.append(time.perf_counter() - started)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(user() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+
+    latencies.sort()
+
+    def percentile(p):
+        return round(latencies[min(len(latencies) - 1, int(p * len(latencies)))] * 1000, 1) if latencies else 0.0
+
+    return {"rps": len(latencies) / elapsed, "p50": percentile(0.50), "p99": percentile(0.99), "errors": errors}
+
+
+def main():
+    cpus = available_cpus()
+    default_workers = sorted({1, 2, 4, cpus} & set(range(1, cpus + 1)))
+    parser = argparse.ArgumentParser(description="Measure how request throughput scales with worker count")
+    parser.add_argument("--workers", default=",".join(map(str, default_workers)),
+                        help=f"Comma-separated worker counts (default: {','.join(map(str, default_workers))})")
+    parser.add_argument("--path", default="/classify", help="Endpoint to POST to")
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--duration", type=float, default=10.0, help="Seconds per run")
+    args = parser.parse_args()
+
+    print(f"Available cores: {cpus}. POST {args.path}, {args.concurrency} concurrent clients, {args.duration:.0f}s per run\n")
+    print(f"{'workers':>7} {'req/s':>9} {'scaling':>8} {'p50 ms':>8} {'p99 ms':>8} {'errors':>7}")
+    baseline = None
+    for workers in [int(w) for w in args.workers.split(",")]:
+        port = free_port()
+        url = f"http://127.0.0.1:{port}"
+        server = start_server(workers, port)
+        try:
+            wait_until_up(url)
+            result = asyncio.run(load(url, args.path, args.concurrency, args.duration))
+        finally:
+            server.send_signal(signal.SIGTERM)
+            server.wait(timeout=60)
+        baseline = baseline or result["rps"]
+        print(f"{workers:>7} {result['rps']:>9.0f} {result['rps'] / baseline:>7.2f}x "
+              f"{result['p50']:>8} {result['p99']:>8} {result['errors']:>7}")
+
+
+if __name__ == "__main__":
+    main()
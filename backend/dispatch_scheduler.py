@@ -0,0 +1,179 @@
+import concurrent.futures
+import os
+import threading
+import time
+from collections import defaultdict, deque
+from typing import Callable, Dict, List, Optional, Tuple
+
+# (lane name, minimum severity), highest priority first
+DEFAULT_LANES: List[Tuple[str, int]] = [("critical", 8), ("high", 5), ("low", 0)]
+
+
+class _Job:
+    __slots__ = ("fn", "args", "key", "lane", "enqueued_at", "future")
+
+    def __init__(self, fn, args, key, lane):
+        self.fn = fn
+        self.args = args
+        self.key = key
+        self.lane = lane
+        self.enqueued_at = time.monotonic()
+        self.future = concurrent.futures.Future()
+
+
+class LaneStats:
+    """Counters and a rolling window of queue wait times for one lane"""
+
+    def __init__(self, window: int = 1000):
+        self.submitted = 0
+        self.started = 0
+        self.promoted = 0
+        self.waits = deque(maxlen=window)
+
+    def snapshot(self, queued: int) -> Dict:
+        waits = sorted(self.waits)
+
+        def percentile(p):
+            return round(waits[min(len(waits) - 1, int(p * len(waits)))] * 1000, 1) if waits else 0.0
+
+        return {
+            "queued": queued,
+            "submitted": self.submitted,
+            "started": self.started,
+            "promoted_by_aging": self.promoted,
+            "wait_ms": {
+                "avg": round(sum(waits) / len(waits) * 1000, 1) if waits else 0.0,
+                "p50": percentile(0.50),
+                "p95": percentile(0.95),
+                "max": round(waits[-1] * 1000, 1) if waits else 0.0,
+            },
+        }
+
+
+class PriorityScheduler:
+    """Worker pool fed from severity lanes.
+
+    Workers take from the highest-priority lane, except that any job waiting longer than
+    `max_wait` is served first (oldest first) so low lanes cannot starve. At most
+    `key_limit` jobs with the same key (department) run at once; blocked jobs are skipped,
+    not dropped.
+    """
+
+    def __init__(self, workers: int = 4, lanes: List[Tuple[str, int]] = None,
+                 max_wait: float = 30.0, key_limit: int = 2, name: str = "scheduler"):
+        self.workers = workers
+        self.lanes = lanes or DEFAULT_LANES
+        self.max_wait = max_wait
+        self.key_limit = key_limit
+        self.name = name
+        self._queues: Dict[str, deque] = {lane: deque() for lane, _ in self.lanes}
+        self._stats: Dict[str, LaneStats] = {lane: LaneStats() for lane, _ in self.lanes}
+        self._running: Dict[str, int] = defaultdict(int)
+        self._cond = threading.Condition()
+        self._threads: List[threading.Thread] = []
+        self._pid = None
+        self._closing = False
+
+    def lane_for(self, severity: int) -> str:
+        for lane, min_severity in self.lanes:
+            if severity >= min_severity:
+                return lane
+        return self.lanes[-1][0]
+
+    def submit(self, fn: Callable, *args, severity: int = 0, key: Optional[str] = None) -> concurrent.futures.Future:
+        lane = self.lane_for(severity)
+        job = _Job(fn, args, key, lane)
+        with self._cond:
+            if self._closing:
+                raise RuntimeError(f"{self.name} is shutting down")
+            self._ensure_workers()
+            self._queues[lane].append(job)
+            self._stats[lane].submitted += 1
+            self._cond.notify()
+        return job.future
+
+    def _ensure_workers(self):
+        # Threads do not survive fork(); start them in whichever process submits
+        if self._pid == os.getpid():
+            return
+        self._pid = os.getpid()
+        self._threads = []
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._work, name=f"{self.name}-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def _eligible(self, job: _Job) -> bool:
+        return job.key is None or self._running[job.key] < self.key_limit
+
+    def _next_job(self) -> Optional[_Job]:
+        """Pick the next job; caller holds the lock"""
+        now = time.monotonic()
+
+        # Starvation protection: the longest-waiting overdue job goes first, whatever its lane
+        overdue = None
+        for lane, _ in self.lanes:
+            for job in self._queues[lane]:
+                if now - job.enqueued_at < self.max_wait:
+                    break  # lanes are FIFO, later jobs waited less
+                if self._eligible(job):
+                    if overdue is None or job.enqueued_at < overdue.enqueued_at:
+                        overdue = job
+                    break
+        if overdue is not None:
+            self._queues[overdue.lane].remove(overdue)
+            if overdue.lane != self.lanes[0][0]:
+                self._stats[overdue.lane].promoted += 1
+            return overdue
+
+        for lane, _ in self.lanes:
+            for job in self._queues[lane]:
+                if self._eligible(job):
+                    self._queues[lane].remove(job)
+                    return job
+        return None
+
+    def _work(self):
+        while True:
+            with self._cond:
+                job = self._next_job()
+                while job is None:
+                    if self._closing and not any(self._queues.values()):
+                        return
+                    # Wake up periodically so aging is re-evaluated
+                    self._cond.wait(timeout=min(self.max_wait, 1.0))
+                    job = self._next_job()
+                if job.key is not None:
+                    self._running[job.key] += 1
+                self._stats[job.lane].started += 1
+                self._stats[job.lane].waits.append(time.monotonic() - job.enqueued_at)
+
+            try:
+                if job.future.set_running_or_notify_cancel():
+                    job.future.set_result(job.fn(*job.args))
+            except Exception as e:
+                job.future.set_exception(e)
+            finally:
+                with self._cond:
+                    if job.key is not None:
+                        self._running[job.key] -= 1
+                    # A key slot opened up: blocked jobs may now be eligible
+                    self._cond.notify_all()
+
+    def drain(self, timeout: Optional[float] = None):
+        """Finish everything already queued, then stop the workers"""
+        with self._cond:
+            self._closing = True
+            self._cond.notify_all()
+        if self._pid == os.getpid():
+            for thread in self._threads:
+                thread.join(timeout)
+
+    def stats(self) -> Dict:
+        with self._cond:
+            return {
+                "lanes": {lane: self._stats[lane].snapshot(len(self._queues[lane])) for lane, _ in self.lanes},
+                "running_by_key": {k: v for k, v in self._running.items() if v},
+                "key_limit": self.key_limit,
+                "max_wait_seconds": self.max_wait,
+            }
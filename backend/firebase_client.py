@@ -2,6 +2,7 @@ import firebase_admin
 from firebase_admin import credentials, firestore
 from typing import Optional, Dict
 import os
+from tracing import traced
 
 # 1. Initialize Firebase (Singleton pattern to prevent re-init errors)
 if not firebase_admin._apps:
@@ -22,18 +23,60 @@ def get_db():
         print(f"Firebase Init Error: {e}")
         return None
 
+def warm_up_firestore():
+    """Create the client and open its channel with one cheap read"""
+    db = get_db()
+    if not db:
+        raise RuntimeError("Firestore is not configured")
+    db.collection("conversations").document("_warmup").get(timeout=5.0)
+
+# Sessions held open by a persistent connection (WebSocket): state is served from memory
+# and every save writes through, so only the initial load costs a Firestore read
+_pinned_sessions: Dict[str, Dict] = {}
+
+def pin_session(session_id: str):
+    """Load a session once and keep it in memory until unpin_session()"""
+    entry = _pinned_sessions.get(session_id)
+    if entry is not None:
+        entry["refs"] += 1
+        return
+    entry = {"refs": 1, "loaded": False, "state": None}
+    _pinned_sessions[session_id] = entry
+    entry["state"] = get_conversation_state(session_id)
+    entry["loaded"] = True
+
+def unpin_session(session_id: str):
+    entry = _pinned_sessions.get(session_id)
+    if entry is None:
+        return
+    entry["refs"] -= 1
+    if entry["refs"] <= 0:
+        del _pinned_sessions[session_id]
+
+def _to_state(data: Dict) -> Dict:
+    """Map a stored conversation document to workflow state fields (exclude timestamps)"""
+    return {
+        "session_id": data.get("session_id", ""),
+        "department": data.get("department", ""),
+        "location": data.get("location", ""),
+        "issue_description": data.get("issue_description", ""),
+        "severity_level": data.get("severity_level", 0),
+        "status": data.get("status", "in_progress"),
+        "user_message": data.get("last_message", ""),
+        "ai_response": data.get("ai_response", ""),
+        "last_message": data.get("last_message", ""),
+        "missing_fields": []
+    }
+
 # --- Main Functions ---
 
+@traced("firestore.save_conversation_state")
 def save_conversation_state(state: Dict):
     """Save conversation state to Firestore (Upsert)"""
     session_id = state.get("session_id")
     if not session_id:
         return
 
-    db = get_db()
-    if not db: 
-        return
-
     # Data to save
     data = {
         "session_id": session_id,
@@ -47,6 +90,14 @@ def save_conversation_state(state: Dict):
         "updated_at": firestore.SERVER_TIMESTAMP
     }
 
+    pinned = _pinned_sessions.get(session_id)
+    if pinned is not None and pinned["loaded"]:
+        pinned["state"] = _to_state(data)
+
+    db = get_db()
+    if not db: 
+        return
+
     try:
         # .document(session_id) creates a doc with that specific ID
         # merge=True means "Update fields if exists, Create if not"
@@ -54,8 +105,13 @@ def save_conversation_state(state: Dict):
     except Exception as e:
         print(f"[ERROR] Firebase Save Error: {e}")
 
+@traced("firestore.get_conversation_state")
 def get_conversation_state(session_id: str) -> Optional[Dict]:
     """Retrieve conversation state"""
+    pinned = _pinned_sessions.get(session_id)
+    if pinned is not None and pinned["loaded"]:
+        return dict(pinned["state"]) if pinned["state"] else None
+
     db = get_db()
     if not db: 
         return None
@@ -65,36 +121,41 @@ def get_conversation_state(session_id: str) -> Optional[Dict]:
         doc = doc_ref.get()
         
         if doc.exists:
-            data = doc.to_dict()
             # Return only valid state fields (exclude timestamps)
-            return {
-                "session_id": data.get("session_id", ""),
-                "department": data.get("department", ""),
-                "location": data.get("location", ""),
-                "issue_description": data.get("issue_description", ""),
-                "severity_level": data.get("severity_level", 0),
-                "status": data.get("status", "in_progress"),
-                "user_message": data.get("last_message", ""),
-                "ai_response": data.get("ai_response", ""),
-                "last_message": data.get("last_message", ""),
-                "missing_fields": []
-            }
+            return _to_state(doc.to_dict())
     except Exception as e:
         print(f"[ERROR] Firebase Read Error: {e}")
     
     return None
 
-def save_report(report: Dict):
-    """Save completed report to Firestore"""
+@traced("firestore.save_report")
+def save_report(report: Dict) -> Optional[str]:
+    """Save completed report to Firestore; returns the new report id"""
     db = get_db()
     if not db:
-        return
+        return None
 
     try:
         # Add a timestamp
         report["created_at"] = firestore.SERVER_TIMESTAMP
         # .add() automatically generates a unique ID for the report
-        db.collection("reports").add(report)
+        _, doc_ref = db.collection("reports").add(report)
         print("[OK] Report saved to Firebase!")
+        return doc_ref.id
+    except Exception as e:
+        print(f"[ERROR] Failed to save report: {e}")
+        return None
+
+def update_report_status(report_id: str, status: str):
+    """Record how far a saved report got (e.g. dispatched, webhook_failed)"""
+    db = get_db()
+    if not db:
+        return
+
+    try:
+        db.collection("reports").document(report_id).update({
+            "status": status,
+            "status_updated_at": firestore.SERVER_TIMESTAMP
+        })
     except Exception as e:
-        print(f"[ERROR] Failed to save report: {e}")
\ No newline at end of file
+        print(f"[ERROR] Failed to update report status: {e}")
\ No newline at end of file
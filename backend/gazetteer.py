@@ -0,0 +1,442 @@
+import argparse
+import csv
+import hashlib
+import mmap
+import os
+import re
+import struct
+import sys
+import time
+from typing import Iterator, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+
+from batching import atomic_write
+
+DEFAULT_GAZETTEER_PATH = "data/gazetteer.bin"
+DEFAULT_SOURCE_PATH = "data/gazetteer_sample.csv"
+
+MAGIC = b"GAZ2"
+SECTIONS = [
+    "key_offsets", "key_place", "place_offsets", "key_blob", "place_blob",
+    # Fuzzy index: distinctive tokens -> keys containing them, and hashed deletion variants -> tokens
+    "token_offsets", "token_blob", "token_key_offsets", "token_keys",
+    "variant_hashes", "variant_token_offsets", "variant_tokens",
+]
+# magic; key, place, token and variant counts; then the byte offset of each section
+HEADER = struct.Struct(f"<4s4I{len(SECTIONS)}Q")
+
+ABBREVIATIONS = {
+    "rd": "road", "st": "street", "str": "street", "ave": "avenue", "av": "avenue", "ln": "lane",
+    "stn": "station", "jn": "junction", "jct": "junction", "hwy": "highway", "blvd": "boulevard",
+    "sq": "square", "mkt": "market", "hosp": "hospital", "sec": "sector", "chk": "chowk",
+}
+FILLERS = {
+    "near", "nr", "at", "the", "opposite", "opp", "behind", "beside", "outside", "on", "in", "of", "by",
+    "next", "to", "area", "front", "close",
+}
+# Kinds of place rather than names: "mill road" must not fuzzy-match "mi road" on the shared suffix
+GENERIC_WORDS = {
+    "road", "street", "avenue", "lane", "marg", "highway", "boulevard", "square", "market", "bazaar",
+    "station", "junction", "chowk", "circle", "nagar", "colony", "sector", "bridge", "flyover", "park",
+    "hospital", "temple", "bus", "stand", "stop",
+}
+_TOKEN = re.compile(r"[a-z0-9]+")
+
+
+def normalize(text: str) -> str:
+    """Canonical lookup key: "Near M.G. rd" -> "mg road" """
+    tokens = []
+    for token in _TOKEN.findall((text or "").lower().replace(".", "")):
+        token = ABBREVIATIONS.get(token, token)
+        if token not in FILLERS:
+            tokens.append(token)
+    return " ".join(tokens)
+
+
+def split_generic(key: str) -> Tuple[List[str], List[str]]:
+    """Normalized key -> (distinctive tokens, generic place words): "mg road" -> (["mg"], ["road"])"""
+    distinctive, generic = [], []
+    for token in key.split():
+        (generic if token in GENERIC_WORDS else distinctive).append(token)
+    return distinctive, generic
+
+
+def fuzzy_limit(length: int) -> int:
+    """Typos tolerated in a token of this length; short tokens ("mi", "tonk") must match exactly"""
+    return 0 if length <= 4 else 1 if length <= 8 else 2
+
+
+def deletions(token: str, distance: int) -> set:
+    """The token and every string made by deleting up to `distance` characters from it"""
+    variants, frontier = {token}, {token}
+    for _ in range(distance):
+        frontier = {v[:i] + v[i + 1:] for v in frontier for i in range(len(v))}
+        variants |= frontier
+    return variants
+
+
+_GENERIC_VARIANTS = {}
+for _word in sorted(GENERIC_WORDS):
+    for _variant in deletions(_word, fuzzy_limit(len(_word))):
+        _GENERIC_VARIANTS.setdefault(_variant, []).append(_word)
+
+
+def generic_word(token: str) -> Optional[Tuple[str, int]]:
+    """(generic word, typos) when the token is a generic word, possibly misspelled: "nagr" -> ("nagar", 1)"""
+    if token in GENERIC_WORDS:
+        return token, 0
+    best = None
+    for variant in deletions(token, fuzzy_limit(len(token))):
+        for word in _GENERIC_VARIANTS.get(variant, ()):
+            limit = fuzzy_limit(max(len(token), len(word)))
+            distance = edit_distance(token, word, limit)
+            if distance <= limit and (best is None or distance < best[1]):
+                best = (word, distance)
+    return best
+
+
+def variant_hash(variant: str) -> int:
+    return int.from_bytes(hashlib.blake2b(variant.encode(), digest_size=8).digest(), "little")
+
+
+class PlaceMatch(NamedTuple):
+    place_id: str
+    name: str
+    kind: str
+    method: str  # "exact", "partial" (a phrase inside the text) or "fuzzy"
+    distance: int = 0
+
+
+def edit_distance(a: str, b: str, limit: int) -> int:
+    """Levenshtein distance, giving up (returns limit + 1) once it must exceed `limit`"""
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    previous = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        current = [i]
+        for j, cb in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ca != cb)))
+        if min(current) > limit:
+            return limit + 1
+        previous = current
+    return previous[-1]
+
+
+def _string_table(strings: List[bytes]) -> Tuple[bytes, bytes]:
+    offsets = np.zeros(len(strings) + 1, dtype=np.uint32)
+    offsets[1:] = np.cumsum([len(item) for item in strings])
+    return offsets.tobytes(), b"".join(strings)
+
+
+def _postings(lists: List[List[int]]) -> Tuple[bytes, bytes]:
+    offsets = np.zeros(len(lists) + 1, dtype=np.uint32)
+    offsets[1:] = np.cumsum([len(items) for items in lists])
+    values = np.array([value for items in lists for value in items], dtype=np.uint32)
+    return offsets.tobytes(), values.tobytes()
+
+
+def build(rows: Iterator[Tuple[str, str, str, List[str]]], out_path: str) -> Tuple[int, int]:
+    """Write the gazetteer: a sorted table of normalized names/aliases pointing at places.
+
+    `rows` yields (place_id, name, kind, aliases). Returns (keys, places).
+    """
+    places: List[Tuple[str, str, str]] = []
+    keys = {}
+    for place_id, name, kind, aliases in rows:
+        place = len(places)
+        places.append((place_id, name, kind))
+        for alias in [name] + aliases:
+            key = normalize(alias).encode()
+            if not key:
+                continue
+            if key in keys and keys[key] != place:
+                print(f"Warning: '{alias}' already names {places[keys[key]][0]}; keeping the first")
+                continue
+            keys[key] = place
+
+    sorted_keys = sorted(keys)
+    key_offsets, key_blob = _string_table(sorted_keys)
+    key_place = np.array([keys[k] for k in sorted_keys], dtype=np.uint32)
+    place_offsets, place_blob = _string_table(["\t".join(place).encode() for place in places])
+
+    # Symmetric-deletion index over distinctive tokens, so a fuzzy lookup is a few binary searches
+    token_keys = {}
+    for i, key in enumerate(sorted_keys):
+        for token in set(split_generic(key.decode())[0]):
+            token_keys.setdefault(token, []).append(i)
+    tokens = sorted(token_keys)
+    # Variants are stored as 64-bit hashes; a collision only adds a candidate that edit distance rejects
+    variant_tokens = {}
+    for token_id, token in enumerate(tokens):
+        for variant in deletions(token, fuzzy_limit(len(token))):
+            variant_tokens.setdefault(variant_hash(variant), []).append(token_id)
+    variants = sorted(variant_tokens)
+
+    token_offsets, token_blob = _string_table([t.encode() for t in tokens])
+    token_key_offsets, token_key_values = _postings([token_keys[t] for t in tokens])
+    variant_token_offsets, variant_token_values = _postings([variant_tokens[v] for v in variants])
+
+    sections = [key_offsets, key_place.tobytes(), place_offsets, key_blob, place_blob,
+                token_offsets, token_blob, token_key_offsets, token_key_values,
+                np.array(variants, dtype=np.uint64).tobytes(), variant_token_offsets, variant_token_values]
+    offsets, position = [], HEADER.size
+    for section in sections:
+        position += -position % 8  # keep the uint32 arrays aligned
+        offsets.append(position)
+        position += len(section)
+
+    with atomic_write(out_path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, len(sorted_keys), len(places), len(tokens), len(variants), *offsets))
+        for offset, section in zip(offsets, sections):
+            f.write(b"\0" * (offset - f.tell()))
+            f.write(section)
+    return len(sorted_keys), len(places)
+
+
+class Gazetteer:
+    """Read-only, memory-mapped gazetteer.
+
+    The file is mapped rather than read, so every worker process shares the same page-cache
+    pages. Lookups binary-search the sorted key table directly in the mapping.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = open(path, "rb")
+        self._mm = None
+        try:
+            self._map(path)
+        except Exception:
+            # Stale or truncated file: release the mapping and handle before reporting it
+            self.close()
+            raise
+
+    def _map(self, path: str):
+        self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic = self._mm[:4]
+        if magic == b"GAZ1":
+            raise ValueError(f"{path} was built by an older version; rebuild it with 'python gazetteer.py build'")
+        if magic != MAGIC or len(self._mm) < HEADER.size:
+            raise ValueError(f"{path} is not a gazetteer file")
+        _, self.n_keys, self.n_places, self.n_tokens, self.n_variants, *offsets = HEADER.unpack_from(self._mm, 0)
+        at = dict(zip(SECTIONS, offsets))
+
+        def uint32s(name, count):
+            return np.frombuffer(self._mm, dtype=np.uint32, count=count, offset=at[name])
+
+        self._key_blob, self._place_blob = at["key_blob"], at["place_blob"]
+        self._token_blob = at["token_blob"]
+        self._key_offsets = uint32s("key_offsets", self.n_keys + 1)
+        self._key_place = uint32s("key_place", self.n_keys)
+        self._place_offsets = uint32s("place_offsets", self.n_places + 1)
+        self._token_offsets = uint32s("token_offsets", self.n_tokens + 1)
+        self._token_key_offsets = uint32s("token_key_offsets", self.n_tokens + 1)
+        self._token_keys = uint32s("token_keys", int(self._token_key_offsets[-1]))
+        self._variant_hashes = np.frombuffer(self._mm, dtype=np.uint64, count=self.n_variants, offset=at["variant_hashes"])
+        self._variant_token_offsets = uint32s("variant_token_offsets", self.n_variants + 1)
+        self._variant_tokens = uint32s("variant_tokens", int(self._variant_token_offsets[-1]))
+
+    def __len__(self):
+        return self.n_keys
+
+    def _string(self, blob: int, offsets: np.ndarray, i: int) -> bytes:
+        return self._mm[blob + int(offsets[i]):blob + int(offsets[i + 1])]
+
+    def _lower_bound_in(self, blob: int, offsets: np.ndarray, n: int, target: bytes) -> int:
+        low, high = 0, n
+        while low < high:
+            mid = (low + high) // 2
+            if self._string(blob, offsets, mid) < target:
+                low = mid + 1
+            else:
+                high = mid
+        return low
+
+    def key(self, i: int) -> bytes:
+        return self._string(self._key_blob, self._key_offsets, i)
+
+    def place(self, i: int) -> Tuple[str, str, str]:
+        place_id, name, kind = self._string(self._place_blob, self._place_offsets, i).decode().split("\t")
+        return place_id, name, kind
+
+    def _lower_bound(self, target: bytes) -> int:
+        return self._lower_bound_in(self._key_blob, self._key_offsets, self.n_keys, target)
+
+    def _match(self, i: int, method: str, distance: int = 0) -> PlaceMatch:
+        return PlaceMatch(*self.place(int(self._key_place[i])), method=method, distance=distance)
+
+    def exact(self, key: str) -> Optional[PlaceMatch]:
+        """Look up an already-normalized key"""
+        target = key.encode()
+        i = self._lower_bound(target)
+        if i < self.n_keys and self.key(i) == target:
+            return self._match(i, "exact")
+        return None
+
+    def prefix(self, prefix: str, limit: int = 10) -> List[PlaceMatch]:
+        """Places whose normalized name or alias starts with `prefix` (autocomplete)"""
+        target = normalize(prefix).encode()
+        matches, seen = [], set()
+        i = self._lower_bound(target)
+        while i < self.n_keys and len(matches) < limit and self.key(i).startswith(target):
+            match = self._match(i, "prefix")
+            if match.place_id not in seen:
+                seen.add(match.place_id)
+                matches.append(match)
+            i += 1
+        return matches
+
+    def _similar_tokens(self, token: str) -> dict:
+        """Indexed tokens within the length-relative typo limit of `token`: {token_id: distance}"""
+        found = {}
+        hashes = np.array([variant_hash(v) for v in deletions(token, fuzzy_limit(len(token)))], dtype=np.uint64)
+        positions = np.minimum(np.searchsorted(self._variant_hashes, hashes), max(self.n_variants - 1, 0))
+        hits = positions[self._variant_hashes[positions] == hashes] if self.n_variants else positions[:0]
+        for i in hits:
+            start, end = int(self._variant_token_offsets[i]), int(self._variant_token_offsets[i + 1])
+            for token_id in self._variant_tokens[start:end]:
+                token_id = int(token_id)
+                if token_id in found:
+                    continue
+                candidate = self._string(self._token_blob, self._token_offsets, token_id).decode()
+                limit = fuzzy_limit(max(len(token), len(candidate)))
+                distance = edit_distance(token, candidate, limit)
+                if distance <= limit:
+                    found[token_id] = distance
+        return found
+
+    def fuzzy(self, key: str) -> Optional[PlaceMatch]:
+        """Closest key whose distinctive words each match within a typo limit relative to their length.
+
+        Generic words ("road", "street") never count towards a match: they must agree exactly
+        when the text has any, so "mill road" does not become "MI Road".
+        """
+        distinctive, generic, generic_typos = [], [], 0
+        for token in key.split():
+            # A misspelled generic word ("nagr") is still not part of the name
+            word = generic_word(token)
+            if word:
+                generic.append(word[0])
+                generic_typos += word[1]
+            else:
+                distinctive.append(token)
+        if not distinctive:
+            return None
+        matches = [self._similar_tokens(token) for token in distinctive]
+        if not all(matches):
+            return None
+
+        # Candidate keys come from the postings of the most selective query word
+        def postings(token_id):
+            start, end = int(self._token_key_offsets[token_id]), int(self._token_key_offsets[token_id + 1])
+            return self._token_keys[start:end]
+
+        narrowest = min(matches, key=lambda found: sum(len(postings(t)) for t in found))
+        candidates = sorted({int(i) for token_id in narrowest for i in postings(token_id)})
+        best = None
+        for i in candidates:
+            key_distinctive, key_generic = split_generic(self.key(i).decode())
+            if len(key_distinctive) != len(distinctive) or (generic and sorted(generic) != sorted(key_generic)):
+                continue
+            distance = generic_typos
+            for token, found in zip(key_distinctive, matches):
+                key_token = self._lower_bound_in(self._token_blob, self._token_offsets, self.n_tokens, token.encode())
+                if key_token not in found:
+                    break
+                distance += found[key_token]
+            else:
+                if best is None or distance < best[1]:
+                    best = (i, distance)
+        return self._match(best[0], "fuzzy", best[1]) if best else None
+
+    def lookup(self, text: str) -> Optional[PlaceMatch]:
+        """Resolve free text to a place: exact, then the longest known phrase inside it, then fuzzy"""
+        key = normalize(text)
+        if not key:
+            return None
+        match = self.exact(key)
+        if match:
+            return match
+        # "mg road bus stop" -> "mg road": longest phrase first, leftmost first
+        tokens = key.split()[:8]
+        for size in range(len(tokens) - 1, 0, -1):
+            for start in range(len(tokens) - size + 1):
+                match = self.exact(" ".join(tokens[start:start + size]))
+                if match and (size > 1 or len(tokens[start]) > 3):
+                    return match._replace(method="partial")
+        return self.fuzzy(key)
+
+    def close(self):
+        self._key_offsets = self._key_place = self._place_offsets = None
+        self._token_offsets = self._token_key_offsets = self._token_keys = None
+        self._variant_hashes = self._variant_token_offsets = self._variant_tokens = None
+        if self._mm is not None:
+            self._mm.close()
+        self._file.close()
+
+
+_gazetteer = None
+_gazetteer_loaded = False
+
+def get_gazetteer() -> Optional[Gazetteer]:
+    """Map the gazetteer once; None when it has not been built"""
+    global _gazetteer, _gazetteer_loaded
+    if not _gazetteer_loaded:
+        _gazetteer_loaded = True
+        path = os.getenv("GAZETTEER_PATH", DEFAULT_GAZETTEER_PATH)
+        if os.path.exists(path):
+            try:
+                _gazetteer = Gazetteer(path)
+                print(f"[OK] Gazetteer mapped: {len(_gazetteer)} names for {_gazetteer.n_places} places")
+            except (OSError, ValueError) as e:
+                # A stale or truncated file must not take report submission down with it
+                print(f"[ERROR] Failed to load gazetteer '{path}': {e}. Reports will be stored without a place_id.")
+        else:
+            print(f"Gazetteer '{path}' not found. Reports will be stored without a place_id.")
+    return _gazetteer
+
+
+def resolve_place(location: str) -> Optional[PlaceMatch]:
+    """Canonical place for a report location, if the gazetteer knows it"""
+    gazetteer = get_gazetteer()
+    if gazetteer is None or not location:
+        return None
+    return gazetteer.lookup(location)
+
+
+def read_source(path: str) -> Iterator[Tuple[str, str, str, List[str]]]:
+    """CSV with place_id,name,kind,aliases (aliases separated by '|')"""
+    with open(path, encoding="utf-8", newline="") as f:
+        for row in csv.DictReader(f):
+            aliases = [a.strip() for a in (row.get("aliases") or "").split("|") if a.strip()]
+            yield row["place_id"].strip(), row["name"].strip(), (row.get("kind") or "").strip(), aliases
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build or query the location gazetteer")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    build_parser = subparsers.add_parser("build", help="Build the memory-mapped gazetteer from a CSV")
+    build_parser.add_argument("source", nargs="?", default=DEFAULT_SOURCE_PATH)
+    build_parser.add_argument("--out", default=os.getenv("GAZETTEER_PATH", DEFAULT_GAZETTEER_PATH))
+    lookup_parser = subparsers.add_parser("lookup", help="Resolve locations to places")
+    lookup_parser.add_argument("text", nargs="+")
+    args = parser.parse_args()
+
+    if args.command == "build":
+        keys, places = build(read_source(args.source), args.out)
+        print(f"[OK] Gazetteer built: {keys} names for {places} places -> {args.out}")
+        return
+
+    gazetteer = get_gazetteer()
+    if gazetteer is None:
+        sys.exit(1)
+    for text in args.text:
+        started = time.perf_counter()
+        match = gazetteer.lookup(text)
+        elapsed_us = (time.perf_counter() - started) * 1e6
+        print(f"{text!r} -> {match} ({elapsed_us:.0f} µs)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,26 @@
+# Production server settings: gunicorn -c gunicorn.conf.py main:app (or python serve.py)
+import os
+
+import serve
+
+bind = f"0.0.0.0:{os.getenv('PORT', '8000')}"
+workers = serve.worker_count()
+worker_class = "serve.TunedUvicornWorker"
+
+# Import the app (FastAPI, LangGraph, langchain) once in the master; workers fork with it loaded.
+# Clients, threads and buffers are created lazily, so nothing fork-unsafe exists yet.
+preload_app = True
+
+graceful_timeout = serve.graceful_timeout()
+timeout = int(os.getenv("WORKER_TIMEOUT", "60"))
+keepalive = int(os.getenv("KEEPALIVE", "5"))
+# Only these peers may rewrite the client address with X-Forwarded-For (see TRUSTED_PROXY_HOPS in main.py)
+forwarded_allow_ips = os.getenv("FORWARDED_ALLOW_IPS", "127.0.0.1")
+accesslog = "-" if os.getenv("ACCESS_LOG", "false").lower() == "true" else None
+
+
+def when_ready(server):
+    # Load the local intent model before forking so workers share its pages
+    from local_classifier import get_local_classifier
+    get_local_classifier()
+    server.log.info(f"[OK] Serving with {workers} workers")
@@ -0,0 +1,202 @@
+import asyncio
+import hashlib
+import os
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Optional
+
+from google.api_core.exceptions import AlreadyExists, FailedPrecondition, NotFound
+
+from cache import TTLCache
+from firebase_client import get_db
+
+MAX_KEY_LENGTH = 255
+
+
+class IdempotencyConflict(Exception):
+    """The key was already used for a different request"""
+
+
+class IdempotencyInFlight(Exception):
+    """Another worker is still executing this key; the client should retry later"""
+
+
+def request_fingerprint(*parts: Optional[str]) -> str:
+    return hashlib.sha256("\n".join(p or "" for p in parts).encode()).hexdigest()
+
+
+def _doc_id(key: str) -> str:
+    # Client keys may contain characters Firestore ids cannot
+    return hashlib.sha256(key.encode()).hexdigest()
+
+
+class IdempotencyCache:
+    """Stores the response for each Idempotency-Key: bounded in memory, shared through Firestore.
+
+    A key is reserved atomically in the `idempotency_keys` collection (create() fails if the
+    document exists), so only one worker or instance executes it. Retries elsewhere poll that
+    document until the response is written, and get IdempotencyInFlight if it takes longer than
+    `wait_timeout`. A reservation not completed within `pending_ttl` (crashed worker) is taken over.
+    """
+
+    def __init__(self, max_items: int = 10000, ttl: float = 86400, use_store: bool = True,
+                 pending_ttl: float = 120.0, wait_timeout: float = 10.0, poll_interval: float = 0.2):
+        self.ttl = ttl
+        self.use_store = use_store
+        self.pending_ttl = pending_ttl
+        self.wait_timeout = wait_timeout
+        self.poll_interval = poll_interval
+        self.replayed = 0
+        self._cache = TTLCache(max_items=max_items, ttl=ttl)
+        self._pending: Dict[str, asyncio.Future] = {}
+        self._owned: set = set()  # keys this process reserved in the store and has not settled
+
+    async def begin(self, key: str, fingerprint: str) -> Optional[Dict]:
+        """Return the stored response for a repeated key, or reserve the key and return None.
+
+        A caller that gets None must follow up with complete() or abandon().
+        """
+        while True:
+            entry = self._cache.get(key)
+            if entry is not None:
+                return self._replay(entry, fingerprint)
+
+            pending = self._pending.get(key)
+            if pending is None:
+                break
+            # Same key already executing in this process: wait for its outcome. If it failed,
+            # every waiter loops back here and exactly one of them takes the reservation below.
+            entry = await asyncio.shield(pending)
+            if entry is not None:
+                return self._replay(entry, fingerprint)
+
+        # No await between the check above and this line, so one coroutine owns the key locally
+        self._pending[key] = asyncio.get_running_loop().create_future()
+        if not self.use_store:
+            return None
+        try:
+            entry = await self._reserve_store(key, fingerprint)
+        except BaseException:
+            self._resolve(key, None)
+            raise
+        if entry is not None:
+            self._cache.set(key, entry)
+            self._resolve(key, entry)
+            return self._replay(entry, fingerprint)
+        return None
+
+    async def complete(self, key: str, fingerprint: str, response: Dict):
+        """Record the response; it is in the shared store before this returns"""
+        entry = {"fingerprint": fingerprint, "response": response}
+        self._cache.set(key, entry)
+        if key in self._owned:
+            self._owned.discard(key)
+            await asyncio.to_thread(self._write_store, key, entry)
+        self._resolve(key, entry)
+
+    async def abandon(self, key: str):
+        """Release the key after a failure so a retry executes normally (no-op after complete)"""
+        if key in self._owned:
+            self._owned.discard(key)
+            await asyncio.to_thread(self._delete_store, key)
+        self._resolve(key, None)
+
+    def _resolve(self, key: str, entry: Optional[Dict]):
+        pending = self._pending.pop(key, None)
+        if pending is not None and not pending.done():
+            pending.set_result(entry)
+
+    def _replay(self, entry: Dict, fingerprint: str) -> Dict:
+        if entry["fingerprint"] != fingerprint:
+            raise IdempotencyConflict("Idempotency-Key was already used with a different request")
+        self.replayed += 1
+        return entry["response"]
+
+    async def _reserve_store(self, key: str, fingerprint: str) -> Optional[Dict]:
+        """Reserve the key in Firestore; returns the finished entry if another request already ran it"""
+        deadline = time.monotonic() + self.wait_timeout
+        while True:
+            state, entry = await asyncio.to_thread(self._try_reserve, key, fingerprint)
+            if state in ("reserved", "unavailable"):
+                return None
+            if state == "complete":
+                return entry
+            if entry["fingerprint"] != fingerprint:
+                raise IdempotencyConflict("Idempotency-Key was already used with a different request")
+            if time.monotonic() >= deadline:
+                raise IdempotencyInFlight("A request with this Idempotency-Key is still being processed")
+            await asyncio.sleep(self.poll_interval)
+
+    def _try_reserve(self, key: str, fingerprint: str):
+        """One attempt: ("reserved"|"unavailable", None), ("complete", entry) or ("pending", entry)"""
+        db = get_db()
+        if not db:
+            return "unavailable", None
+        ref = db.collection("idempotency_keys").document(_doc_id(key))
+        now = datetime.now(timezone.utc)
+        try:
+            for _ in range(3):
+                try:
+                    ref.create({"state": "pending", "fingerprint": fingerprint,
+                                "expires_at": now + timedelta(seconds=self.pending_ttl)})
+                    self._owned.add(key)
+                    return "reserved", None
+                except AlreadyExists:
+                    pass
+                doc = ref.get()
+                if not doc.exists:
+                    continue  # deleted in between (abandoned); try to create again
+                data = doc.to_dict()
+                expires_at = data.get("expires_at")
+                if expires_at and expires_at < now:
+                    # An expired response, or a reservation whose worker died: take it over,
+                    # unless someone else changed the document since we read it
+                    try:
+                        ref.delete(option=db.write_option(last_update_time=doc.update_time))
+                    except (FailedPrecondition, NotFound):
+                        pass
+                    continue
+                entry = {"fingerprint": data["fingerprint"], "response": data.get("response")}
+                return ("pending" if data.get("state") == "pending" else "complete"), entry
+        except Exception as e:
+            print(f"[ERROR] Idempotency store reservation failed: {e}. Continuing without it")
+        return "unavailable", None
+
+    def _write_store(self, key: str, entry: Dict):
+        db = get_db()
+        if not db:
+            return
+        # expires_at drives the Firestore TTL policy (see firestore.indexes.json)
+        expires_at = datetime.now(timezone.utc) + timedelta(seconds=self.ttl)
+        try:
+            db.collection("idempotency_keys").document(_doc_id(key)).set(
+                {**entry, "state": "complete", "expires_at": expires_at})
+        except Exception as e:
+            print(f"[ERROR] Idempotency store write failed: {e}")
+
+    def _delete_store(self, key: str):
+        db = get_db()
+        if not db:
+            return
+        try:
+            db.collection("idempotency_keys").document(_doc_id(key)).delete()
+        except Exception as e:
+            print(f"[ERROR] Idempotency store release failed: {e}")
+
+    def stats(self) -> Dict:
+        return {**self._cache.stats(), "in_flight": len(self._pending), "replayed": self.replayed}
+
+
+_chat_idempotency = None
+
+def get_chat_idempotency() -> IdempotencyCache:
+    """Get or create the idempotency cache for /chat"""
+    global _chat_idempotency
+    if _chat_idempotency is None:
+        _chat_idempotency = IdempotencyCache(
+            max_items=int(os.getenv("IDEMPOTENCY_CACHE_SIZE", "10000")),
+            ttl=float(os.getenv("IDEMPOTENCY_TTL_SECONDS", "86400")),
+            pending_ttl=float(os.getenv("IDEMPOTENCY_PENDING_SECONDS", "120")),
+            wait_timeout=float(os.getenv("IDEMPOTENCY_WAIT_SECONDS", "10")),
+        )
+    return _chat_idempotency
@@ -0,0 +1,407 @@
+import json
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from datetime import datetime, timezone
+from typing import Callable, Dict, List, Optional
+
+from firebase_admin import firestore
+
+from batching import BatchBuffer, append_jsonl, atomic_write
+from firebase_client import get_db
+from report_search import tokenize
+
+DEFAULT_CHECKPOINT_PATH = "data/incident_state.json"
+DEFAULT_EVENT_LOG_PATH = "data/incidents.jsonl"
+
+
+def location_cell(location: str) -> str:
+    """Group key for a location with no gazetteer place_id: "M.G. Road" and "near MG road" share a cell"""
+    return " ".join(tokenize(location))
+
+
+def parse_thresholds(value: str) -> Dict[str, int]:
+    """"waste=5,traffic=3" -> {"waste": 5, "traffic": 3}"""
+    thresholds = {}
+    for part in (value or "").split(","):
+        if "=" in part:
+            department, count = part.split("=", 1)
+            thresholds[department.strip()] = int(count)
+    return thresholds
+
+
+class _Window:
+    """Report counts for one (department, cell) in fixed-size time buckets"""
+    __slots__ = ("counts", "epochs", "total", "last_epoch", "max_severity", "report_ids", "escalated_at")
+
+    def __init__(self, buckets: int):
+        self.counts = [0] * buckets
+        self.epochs = [-1] * buckets
+        self.total = 0
+        self.last_epoch = -1
+        self.max_severity = 0
+        self.report_ids = deque(maxlen=20)
+        self.escalated_at = None
+
+    def advance(self, epoch: int):
+        """Expire buckets that fell out of the window; touches at most `buckets` slots"""
+        buckets = len(self.counts)
+        for e in range(max(self.last_epoch + 1, epoch - buckets + 1), epoch + 1):
+            slot = e % buckets
+            if self.epochs[slot] != e:
+                self.total -= self.counts[slot]
+                self.counts[slot] = 0
+                self.epochs[slot] = e
+        if self.total == 0:
+            self.max_severity = 0  # every earlier report has expired
+        self.last_epoch = max(self.last_epoch, epoch)
+
+    def to_dict(self) -> Dict:
+        return {"counts": list(self.counts), "epochs": list(self.epochs), "total": self.total,
+                "last_epoch": self.last_epoch, "max_severity": self.max_severity,
+                "report_ids": list(self.report_ids), "escalated_at": self.escalated_at}
+
+    @classmethod
+    def from_dict(cls, buckets: int, item: Dict) -> "_Window":
+        window = cls(buckets)
+        window.counts = list(item["counts"])
+        window.epochs = list(item["epochs"])
+        window.total = item["total"]
+        window.last_epoch = item["last_epoch"]
+        window.max_severity = item["max_severity"]
+        window.report_ids.extend(item["report_ids"])
+        window.escalated_at = item["escalated_at"]
+        return window
+
+
+class IncidentDetector:
+    """Sliding-window counters per (department, location cell) that escalate report clusters.
+
+    Each report is O(1): it lands in the current bucket of its key and buckets older than
+    the window are expired lazily. When a key reaches its threshold one escalation event is
+    emitted, then the key is quiet for `cooldown` seconds. At most `max_keys` keys are kept
+    (least recently updated are evicted), and the state can be checkpointed and restored.
+    """
+    store = "memory"
+
+    def __init__(self, window: float = 600.0, bucket: float = 60.0, min_reports: int = 3,
+                 dept_thresholds: Optional[Dict[str, int]] = None, cooldown: float = 1800.0,
+                 max_keys: int = 10000, clock: Callable[[], float] = time.time):
+        self.bucket = bucket
+        self.buckets = max(1, int(round(window / bucket)))
+        self.window = self.buckets * bucket
+        self.min_reports = min_reports
+        self.dept_thresholds = dept_thresholds or {}
+        self.cooldown = cooldown
+        self.max_keys = max_keys
+        self.clock = clock
+        self._windows: "OrderedDict[tuple, _Window]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._listeners: List[Callable[[Dict], None]] = []
+        self.recent = deque(maxlen=100)
+        self.observed = 0
+        self.escalations = 0
+        self.evicted = 0
+
+    def threshold(self, department: str) -> int:
+        return self.dept_thresholds.get(department, self.min_reports)
+
+    def _count(self, window: _Window, department: str, cell: str, location: str, severity: int,
+               report_id: Optional[str], now: float) -> Optional[Dict]:
+        """Add one report to `window`; returns the escalation event if it crossed the threshold.
+
+        Only touches `window`, so a Firestore transaction can safely run it again on retry.
+        """
+        epoch = int(now // self.bucket)
+        window.advance(epoch)
+        window.counts[epoch % self.buckets] += 1
+        window.total += 1
+        window.max_severity = max(window.max_severity, severity or 0)
+        if report_id:
+            window.report_ids.append(report_id)
+
+        if window.total < self.threshold(department):
+            return None
+        if window.escalated_at is not None and now - window.escalated_at < self.cooldown:
+            return None
+        window.escalated_at = now
+        return {
+            "type": "incident",
+            "department": department,
+            "cell": cell,
+            "location": location,
+            "reports": window.total,
+            "window_seconds": self.window,
+            "max_severity": window.max_severity,
+            "report_ids": list(window.report_ids),
+            "escalated_at": datetime.fromtimestamp(now, timezone.utc).isoformat(),
+        }
+
+    def _escalated(self, event: Optional[Dict]) -> Optional[Dict]:
+        """Count the observation and tell listeners about an escalation"""
+        with self._lock:
+            self.observed += 1
+            if event is None:
+                return None
+            self.escalations += 1
+            self.recent.append(event)
+            listeners = list(self._listeners)
+
+        for listener in listeners:
+            try:
+                listener(event)
+            except Exception as e:
+                print(f"[ERROR] Incident listener failed: {e}")
+        return event
+
+    def observe(self, department: str, location: str, severity: int = 0,
+                report_id: Optional[str] = None, cell: Optional[str] = None) -> Optional[Dict]:
+        """Count one report; returns the escalation event if this report triggered one"""
+        cell = cell or location_cell(location)
+        if not department or not cell:
+            return None
+        now = self.clock()
+        key = (department, cell)
+
+        with self._lock:
+            window = self._windows.get(key)
+            if window is None:
+                window = self._windows[key] = _Window(self.buckets)
+                if len(self._windows) > self.max_keys:
+                    self._windows.popitem(last=False)
+                    self.evicted += 1
+            else:
+                self._windows.move_to_end(key)
+            event = self._count(window, department, cell, location, severity, report_id, now)
+        return self._escalated(event)
+
+    def subscribe(self, callback: Callable[[Dict], None]):
+        with self._lock:
+            self._listeners.append(callback)
+
+    def unsubscribe(self, callback: Callable[[Dict], None]):
+        with self._lock:
+            if callback in self._listeners:
+                self._listeners.remove(callback)
+
+    def hot_cells(self, limit: int = 20) -> List[Dict]:
+        """Keys with reports in the current window, busiest first"""
+        epoch = int(self.clock() // self.bucket)
+        with self._lock:
+            rows = []
+            for (department, cell), window in self._windows.items():
+                window.advance(epoch)
+                if window.total:
+                    rows.append({"department": department, "cell": cell, "reports": window.total,
+                                 "threshold": self.threshold(department), "max_severity": window.max_severity})
+        rows.sort(key=lambda row: -row["reports"])
+        return rows[:limit]
+
+    def recent_events(self, limit: int = 20) -> List[Dict]:
+        """Latest escalations, newest first"""
+        with self._lock:
+            return list(self.recent)[-limit:][::-1]
+
+    def checkpoint(self) -> Dict:
+        """Serializable state (wall-clock bucket epochs, so it survives a restart)"""
+        with self._lock:
+            return {
+                "bucket": self.bucket,
+                "buckets": self.buckets,
+                "windows": [
+                    {"department": department, "cell": cell, **w.to_dict()}
+                    for (department, cell), w in self._windows.items()
+                ],
+            }
+
+    def restore(self, state: Dict):
+        """Load a checkpoint; ignored if it was taken with a different bucket layout"""
+        if state.get("bucket") != self.bucket or state.get("buckets") != self.buckets:
+            print("Warning: incident checkpoint uses a different window layout; starting empty")
+            return
+        with self._lock:
+            self._windows.clear()
+            for item in state.get("windows", [])[-self.max_keys:]:
+                self._windows[(item["department"], item["cell"])] = _Window.from_dict(self.buckets, item)
+
+    def save(self, path: str):
+        with atomic_write(path) as f:
+            json.dump(self.checkpoint(), f)
+
+    def load(self, path: str):
+        if os.path.exists(path):
+            try:
+                with open(path) as f:
+                    self.restore(json.load(f))
+            except (OSError, ValueError, KeyError) as e:
+                print(f"Warning: could not restore incident state from '{path}': {e}")
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "store": self.store,
+                "keys": len(self._windows),
+                "max_keys": self.max_keys,
+                "observed": self.observed,
+                "escalations": self.escalations,
+                "evicted": self.evicted,
+                "window_seconds": self.window,
+            }
+
+
+def _window_doc_id(department: str, cell: str) -> str:
+    return f"{department}__{cell}".replace("/", "_")
+
+
+@firestore.transactional
+def _observe_in_transaction(transaction, detector: "FirestoreIncidentDetector", department: str, cell: str,
+                            location: str, severity: int, report_id: Optional[str], now: float) -> Optional[Dict]:
+    ref = detector.db.collection(FirestoreIncidentDetector.WINDOWS).document(_window_doc_id(department, cell))
+    snapshot = ref.get(transaction=transaction)
+    data = snapshot.to_dict() if snapshot.exists else None
+    if data and len(data.get("counts", [])) == detector.buckets:
+        window = _Window.from_dict(detector.buckets, data)
+    else:
+        window = _Window(detector.buckets)  # new cell, or the window layout changed
+    event = detector._count(window, department, cell, location, severity, report_id, now)
+    transaction.set(ref, {
+        **window.to_dict(),
+        "department": department,
+        "cell": cell,
+        "location": location,
+        "updated_at": now,
+        # Idle cells are removed by the TTL policy in firestore.indexes.json
+        "expires_at": datetime.fromtimestamp(now + max(detector.window, detector.cooldown), timezone.utc),
+    })
+    if event:
+        transaction.set(detector.db.collection(FirestoreIncidentDetector.EVENTS).document(), event)
+    return event
+
+
+class FirestoreIncidentDetector(IncidentDetector):
+    """The same sliding windows, stored in Firestore so every worker and instance shares them.
+
+    Each report updates its cell's document in a transaction and the escalation is decided
+    inside it, so a cluster escalates once whichever worker delivers the threshold report.
+    """
+    store = "firestore"
+    WINDOWS = "incident_windows"
+    EVENTS = "incidents"
+
+    def __init__(self, db, **kwargs):
+        super().__init__(**kwargs)
+        self.db = db
+
+    def observe(self, department: str, location: str, severity: int = 0,
+                report_id: Optional[str] = None, cell: Optional[str] = None) -> Optional[Dict]:
+        cell = cell or location_cell(location)
+        if not department or not cell:
+            return None
+        try:
+            event = _observe_in_transaction(self.db.transaction(), self, department, cell, location,
+                                            severity, report_id, self.clock())
+        except Exception as e:
+            print(f"[ERROR] Incident counter update failed: {e}")
+            return None
+        return self._escalated(event)
+
+    def hot_cells(self, limit: int = 20) -> List[Dict]:
+        now = self.clock()
+        epoch = int(now // self.bucket)
+        query = (self.db.collection(self.WINDOWS)
+                 .where(filter=firestore.FieldFilter("updated_at", ">=", now - self.window))
+                 .limit(self.max_keys))
+        rows = []
+        for doc in query.stream():
+            data = doc.to_dict()
+            if len(data.get("counts", [])) != self.buckets:
+                continue
+            window = _Window.from_dict(self.buckets, data)
+            window.advance(epoch)
+            if window.total:
+                rows.append({"department": data["department"], "cell": data["cell"], "reports": window.total,
+                             "threshold": self.threshold(data["department"]), "max_severity": window.max_severity})
+        rows.sort(key=lambda row: -row["reports"])
+        return rows[:limit]
+
+    def recent_events(self, limit: int = 20) -> List[Dict]:
+        query = (self.db.collection(self.EVENTS)
+                 .order_by("escalated_at", direction=firestore.Query.DESCENDING)
+                 .limit(limit))
+        return [doc.to_dict() for doc in query.stream()]
+
+    def save(self, path: str):
+        pass  # the windows already live in Firestore
+
+    def load(self, path: str):
+        pass
+
+
+def _write_events(events: List[Dict]):
+    append_jsonl(os.getenv("INCIDENT_LOG_PATH", DEFAULT_EVENT_LOG_PATH), events)
+
+
+_detector = None
+_detector_lock = threading.Lock()
+_event_log = None
+_last_checkpoint = 0.0
+
+
+def _checkpoint_path() -> str:
+    return os.getenv("INCIDENT_CHECKPOINT_PATH", DEFAULT_CHECKPOINT_PATH)
+
+
+def get_incident_detector() -> IncidentDetector:
+    """Get or create the detector: shared Firestore counters, or in-process ones restored from the checkpoint"""
+    global _detector, _event_log
+    with _detector_lock:
+        if _detector is None:
+            options = dict(
+                window=float(os.getenv("INCIDENT_WINDOW_SECONDS", "600")),
+                bucket=float(os.getenv("INCIDENT_BUCKET_SECONDS", "60")),
+                min_reports=int(os.getenv("INCIDENT_MIN_REPORTS", "3")),
+                dept_thresholds=parse_thresholds(os.getenv("INCIDENT_MIN_REPORTS_BY_DEPT", "")),
+                cooldown=float(os.getenv("INCIDENT_COOLDOWN_SECONDS", "1800")),
+                max_keys=int(os.getenv("INCIDENT_MAX_KEYS", "10000")),
+            )
+            db = get_db() if os.getenv("INCIDENT_STORE", "firestore") == "firestore" else None
+            if db is not None:
+                detector = FirestoreIncidentDetector(db, **options)
+            else:
+                # Each process counts only the reports it delivers: run with WEB_CONCURRENCY=1
+                print("Warning: incident counters are in-process; escalation needs a single worker (WEB_CONCURRENCY=1)")
+                detector = IncidentDetector(**options)
+                detector.load(_checkpoint_path())
+            # Escalations are appended to an event log in batches
+            _event_log = BatchBuffer(_write_events, max_items=50, flush_interval=1.0, name="incident-events")
+            detector.subscribe(_event_log.add)
+            _detector = detector
+    return _detector
+
+
+def observe_report(report: Dict, report_id: Optional[str] = None) -> Optional[Dict]:
+    """Feed a saved report to the detector and checkpoint every INCIDENT_CHECKPOINT_SECONDS"""
+    global _last_checkpoint
+    detector = get_incident_detector()
+    event = detector.observe(
+        report.get("department", ""),
+        report.get("location", ""),
+        severity=int(report.get("severity_level") or 0),
+        report_id=report_id,
+        cell=report.get("place_id"),
+    )
+    now = time.monotonic()
+    if now - _last_checkpoint >= float(os.getenv("INCIDENT_CHECKPOINT_SECONDS", "60")):
+        _last_checkpoint = now
+        try:
+            detector.save(_checkpoint_path())
+        except OSError as e:
+            print(f"[ERROR] Failed to checkpoint incident state: {e}")
+    return event
+
+
+def save_incident_state():
+    """Checkpoint on shutdown so a restart resumes the current windows"""
+    if _detector is not None:
+        _detector.save(_checkpoint_path())
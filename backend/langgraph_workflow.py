@@ -3,10 +3,19 @@ from typing import TypedDict, Annotated, Literal, Optional
 from langgraph.graph import StateGraph, END
 from langchain_openai import ChatOpenAI
 from langchain.prompts import ChatPromptTemplate
-from webhook_client import send_webhook
+from report_dispatch import dispatch_report
 from dotenv import load_dotenv
 import json
-from firebase_client import save_conversation_state, get_conversation_state, save_report
+import re
+from firebase_client import save_conversation_state, get_conversation_state
+from tracing import span
+from profiling import register_thread
+from local_classifier import get_local_classifier, get_local_threshold, record_label
+from transcript_store import get_transcript_store
+from llm_ledger import track_llm_call, record_cache_hit, set_llm_context
+from cache import TTLCache
+from gazetteer import resolve_place
+import functools
 
 # Load environment variables
 load_dotenv()
@@ -21,9 +30,18 @@ def get_llm():
         api_key = os.getenv("OPENAI_API_KEY")
         if not api_key:
             raise ValueError("OPENAI_API_KEY environment variable is required")
-        _llm = ChatOpenAI(temperature=0, model="gpt-3.5-turbo", openai_api_key=api_key)
+        _llm = ChatOpenAI(temperature=0, model=LLM_MODEL, openai_api_key=api_key)
     return _llm
 
+
+LLM_MODEL = "gpt-3.5-turbo"
+
+# Answers to messages the LLM has already classified (normalized text -> department)
+_llm_answers = TTLCache(
+    max_items=int(os.getenv("LLM_CACHE_SIZE", "5000")),
+    ttl=float(os.getenv("LLM_CACHE_TTL", "86400")),
+)
+
 # State definition
 class ConversationState(TypedDict):
     session_id: str
@@ -40,6 +58,12 @@ class ConversationState(TypedDict):
 
 def classify_intent(message: str) -> str:
     """Classify user intent into department categories"""
+    # Default fallback to traffic
+    return classify_without_llm(message) or classify_with_llm(message) or "traffic_dept"
+
+
+def classify_without_llm(message: str) -> Optional[str]:
+    """Keyword rules, then the local model; None when neither is confident"""
     message_lower = message.lower()
     
     # Primary: Keyword-based classification (works without OpenAI)
@@ -54,7 +78,35 @@ def classify_intent(message: str) -> str:
     elif any(word in message_lower for word in energy_keywords):
         return "energy_dept"
     
-    # Secondary: Try OpenAI if available (with error handling)
+    # Secondary: Local statistical model (microseconds, no network)
+    model = get_local_classifier()
+    if model is not None:
+        department, confidence = model.predict(message)
+        if department and confidence >= get_local_threshold():
+            return department
+    return None
+
+
+def _parse_department(response: str) -> Optional[str]:
+    response = (response or "").strip().lower()
+    if "traffic_dept" in response or "traffic" in response:
+        return "traffic_dept"
+    elif "waste_dept" in response or "waste" in response:
+        return "waste_dept"
+    elif "energy_dept" in response or "energy" in response:
+        return "energy_dept"
+    return None
+
+
+def classify_with_llm(message: str) -> Optional[str]:
+    """Ask OpenAI (answers are cached); None if it is unavailable or unparseable"""
+    cache_key = " ".join(message.lower().split())
+    department = _llm_answers.get(cache_key)
+    if department:
+        record_cache_hit("classify_intent", LLM_MODEL, department)
+        return department
+
+    # Tertiary: Try OpenAI if available (with error handling)
     try:
         prompt = ChatPromptTemplate.from_messages([
             ("system", """You are a routing assistant. Classify the user's message into one of these departments:
@@ -67,21 +119,72 @@ def classify_intent(message: str) -> str:
         ])
         
         chain = prompt | get_llm()
-        response = chain.invoke({"message": message}).content.strip().lower()
+        with span("llm.classify_intent"), track_llm_call("classify_intent", LLM_MODEL) as usage:
+            department = _parse_department(chain.invoke({"message": message}).content)
+            usage["department"] = department
+            usage["outcome"] = "ok" if department else "unparsed"
         
-        if "traffic_dept" in response or "traffic" in response:
-            return "traffic_dept"
-        elif "waste_dept" in response or "waste" in response:
-            return "waste_dept"
-        elif "energy_dept" in response or "energy" in response:
-            return "energy_dept"
+        if department:
+            _llm_answers.set(cache_key, department)
+            # Keep the answer as training data for the local model
+            record_label(message, department)
+            return department
     except Exception as e:
         # OpenAI unavailable (quota, API key, etc.) - use keyword fallback
         print(f"OpenAI classification failed: {str(e)}. Using keyword-based routing.")
         pass
-    
-    # Default fallback to traffic
-    return "traffic_dept"
+    return None
+
+
+def classify_batch_with_llm(messages: list) -> list:
+    """Classify several messages in one JSON-mode OpenAI call (cached answers are reused).
+
+    Returns a department or None per message, in order; all None if the call fails.
+    """
+    keys = [" ".join(m.lower().split()) for m in messages]
+    departments = [_llm_answers.get(key) for key in keys]
+    for department in departments:
+        if department:
+            record_cache_hit("classify_intent", LLM_MODEL, department)
+    missing = list(dict.fromkeys(key for key, department in zip(keys, departments) if not department))
+    if not missing:
+        return departments
+
+    try:
+        prompt = ChatPromptTemplate.from_messages([
+            ("system", """You are a routing assistant. Classify each numbered message into one of these departments:
+            - traffic_dept: For congestion, road issues, traffic lights, parking, accidents, road maintenance
+            - waste_dept: For trash, recycling, garbage collection, waste disposal, litter
+            - energy_dept: For parks, green spaces, electricity issues, pollution, environmental concerns
+
+            Respond with a JSON object {{"departments": [...]}} holding one of traffic_dept, waste_dept
+            or energy_dept per message, in the same order."""),
+            ("user", "{messages}")
+        ])
+        originals = {key: message for key, message in zip(keys, messages)}
+        numbered = "\n".join(f"{i + 1}. {originals[key]}" for i, key in enumerate(missing))
+        chain = prompt | get_llm().bind(response_format={"type": "json_object"})
+        with span("llm.classify_intent_batch", size=len(missing)), \
+                track_llm_call("classify_intent_batch", LLM_MODEL) as usage:
+            try:
+                labels = json.loads(chain.invoke({"messages": numbered}).content).get("departments")
+            except (json.JSONDecodeError, AttributeError):
+                labels = None
+            if not isinstance(labels, list) or len(labels) != len(missing):
+                usage["outcome"] = "unparsed"
+                return departments
+    except Exception as e:
+        print(f"OpenAI batch classification failed: {str(e)}. Using keyword-based routing.")
+        return departments
+
+    answers = {}
+    for key, label in zip(missing, labels):
+        department = _parse_department(str(label))
+        if department:
+            answers[key] = department
+            _llm_answers.set(key, department)
+            record_label(originals[key], department)
+    return [department or answers.get(key) for key, department in zip(keys, departments)]
 
 
 def extract_location(message: str) -> Optional[str]:
@@ -196,6 +299,120 @@ def extract_severity(message: str) -> Optional[int]:
     return None
 
 
+# Words that end a place name ("MG Road", "railway station", "Sector 14")
+PLACE_SUFFIXES = (r"(?:road|rd|street|st|avenue|ave|lane|ln|marg|highway|boulevard|blvd|drive|dr|circle|chowk|"
+                  r"nagar|colony|market|station|park|bridge|flyover|junction|square|bus\s+stop|school|hospital|"
+                  r"temple|mall|sector\s+\d+)")
+PLACE_PREPOSITIONS = r"(?:at|near|on|in|opposite|outside|behind|beside)"
+# Words that may sit between a preposition and the suffix of a place name
+PLACE_NAME_WORD = r"(?:(?!(?:my|our|your|this|that|the|a|an|on|in|at|near|of|to|is|are|and|or|for|with|from|by)\b)[\w.]+\s+)"
+# On their own these describe a kind of place, not which one ("in the road", "at the junction")
+GENERIC_PLACE_WORDS = {
+    "road", "rd", "street", "st", "avenue", "ave", "lane", "ln", "marg", "highway", "boulevard", "blvd",
+    "drive", "dr", "circle", "chowk", "nagar", "colony", "market", "station", "park", "bridge", "flyover",
+    "junction", "square", "bus", "stop", "school", "hospital", "temple", "mall", "sector", "area", "corner",
+}
+
+LOCATION_IN_TEXT_PATTERNS = [
+    # Coordinates
+    re.compile(r"-?\d{1,3}\.\d+,\s*-?\d{1,3}\.\d+"),
+    # Street addresses with numbers ("12 Park Street")
+    re.compile(r"\b\d+\s+(?:[A-Za-z.]+\s+){1,3}?(?:street|st|avenue|ave|road|rd|lane|ln|drive|dr|boulevard|blvd)\b", re.IGNORECASE),
+    # Place names after a preposition ("at M.G. Road", "near the railway station")
+    re.compile(PLACE_PREPOSITIONS + r"\s+(?:the\s+)?(" + PLACE_NAME_WORD + r"{0,3}?" + PLACE_SUFFIXES + r")\b", re.IGNORECASE),
+    # Capitalized names after a preposition ("near Hawa Mahal, Jaipur")
+    re.compile(r"\b(?:at|near|in|opposite|outside|behind)\s+([A-Z][\w.]*(?:\s+[A-Z][\w.]*)*(?:,\s*[A-Z]\w+)?)"),
+]
+
+EXPLICIT_SEVERITY_PATTERNS = [
+    re.compile(r"\b(\d+)\s*(?:out\s+of\s+10|/\s*10)\b", re.IGNORECASE),  # "9/10", "9 out of 10"
+    re.compile(r"\b(?:severity|level|score|rating)\s*:?\s*(\d+)\b", re.IGNORECASE),  # "severity 9"
+]
+
+
+def is_named_place(candidate: str) -> bool:
+    """A specific place needs a name: a capitalized or numbered word, or a gazetteer match"""
+    words = re.findall(r"[\w.]+", candidate)
+    named = [w for w in words if w.lower().strip(".") not in GENERIC_PLACE_WORDS]
+    if not named:
+        return False
+    if any(w[0].isupper() or any(ch.isdigit() for ch in w) for w in named):
+        return True
+    return resolve_place(candidate) is not None
+
+
+def find_location_in_text(message: str) -> Optional[str]:
+    """Find a location inside a longer message; unlike extract_location, never falls back to the whole text.
+
+    Generic mentions ("in the road", "at the junction") are skipped so the bot still asks where.
+    """
+    for pattern in LOCATION_IN_TEXT_PATTERNS:
+        for match in pattern.finditer(message):
+            location = (match.group(1) if match.groups() else match.group(0)).strip(" ,.")
+            if len(location) > 3 and is_named_place(location):
+                return location
+    return None
+
+
+def extract_explicit_severity(message: str) -> Optional[int]:
+    """Severity only when the user states a number ("9/10", "severity 9"); keywords are not enough here"""
+    for pattern in EXPLICIT_SEVERITY_PATTERNS:
+        match = pattern.search(message)
+        if match and 1 <= int(match.group(1)) <= 10:
+            return int(match.group(1))
+    return None
+
+
+def structured_extraction_enabled() -> bool:
+    return os.getenv("LLM_STRUCTURED_EXTRACTION", "false").lower() == "true"
+
+
+def extract_report_with_llm(message: str) -> dict:
+    """One JSON-mode LLM call for the severity and location in a first message; {} if unavailable"""
+    try:
+        prompt = ChatPromptTemplate.from_messages([
+            ("system", """Extract the civic issue report from the user's message. Respond with a JSON object:
+            {{"severity_level": <integer 1-10 if the user gave a number, else null>,
+              "location": <the street, landmark or coordinates exactly as written, else null>}}
+            Do not guess: use null for anything the message does not state."""),
+            ("user", "{message}")
+        ])
+        chain = prompt | get_llm().bind(response_format={"type": "json_object"})
+        with span("llm.extract_report"), track_llm_call("extract_report", LLM_MODEL) as usage:
+            try:
+                fields = json.loads(chain.invoke({"message": message}).content)
+            except json.JSONDecodeError:
+                usage["outcome"] = "unparsed"
+                return {}
+
+        extracted = {}
+        severity = fields.get("severity_level")
+        if isinstance(severity, int) and 1 <= severity <= 10:
+            extracted["severity_level"] = severity
+        location = fields.get("location")
+        if isinstance(location, str) and len(location.strip()) >= 3:
+            extracted["location"] = location.strip()
+        return extracted
+    except Exception as e:
+        print(f"OpenAI extraction failed: {str(e)}. Asking for the missing details instead.")
+        return {}
+
+
+def extract_report_fields(message: str) -> dict:
+    """Severity and location stated in the message itself (local extractors, then the optional LLM call)"""
+    fields = {}
+    severity = extract_explicit_severity(message)
+    if severity:
+        fields["severity_level"] = severity
+    location = find_location_in_text(message)
+    if location:
+        fields["location"] = location
+    if len(fields) < 2 and structured_extraction_enabled():
+        for key, value in extract_report_with_llm(message).items():
+            fields.setdefault(key, value)
+    return fields
+
+
 def start_node(state: ConversationState) -> ConversationState:
     """Initial node that receives user input"""
     return state
@@ -316,19 +533,22 @@ def process_department_node(state: ConversationState, dept_code: str, dept_name:
         save_conversation_state(state)
         return state
     
-    # STATE: Greeting or starting new issue - ask for severity after recording issue
-    if state.get("status") in ["greeting", "in_progress", "", None]:
-        state["issue_description"] = message_text
-        state["ai_response"] = "On a scale of 1-10, how severe is this issue? (1 = minor, 10 = critical)"
-        state["status"] = "awaiting_severity"
-        save_conversation_state(state)
-        return state
-    
-    # STATE: Awaiting issue description
-    if state.get("status") == "awaiting_issue":
+    # STATE: Greeting, starting a new issue or awaiting the issue description
+    if state.get("status") in ["greeting", "in_progress", "", None, "awaiting_issue"]:
         state["issue_description"] = message_text
-        state["ai_response"] = "On a scale of 1-10, how severe is this issue? (1 = minor, 10 = critical)"
-        state["status"] = "awaiting_severity"
+        # A well-formed first message may already carry the severity and location
+        fields = extract_report_fields(message_text)
+        state["severity_level"] = fields.get("severity_level", 0)
+        state["location"] = fields.get("location", "")
+        
+        if state["severity_level"] and state["location"]:
+            return _submit_report(state, dept_name)
+        if state["severity_level"]:
+            state["ai_response"] = "Thank you. Could you please provide the location (address, coordinates, or landmark) where this is occurring?"
+            state["status"] = "awaiting_location"
+        else:
+            state["ai_response"] = "On a scale of 1-10, how severe is this issue? (1 = minor, 10 = critical)"
+            state["status"] = "awaiting_severity"
         save_conversation_state(state)
         return state
     
@@ -345,6 +565,9 @@ def process_department_node(state: ConversationState, dept_code: str, dept_name:
         
         # Valid severity received
         state["severity_level"] = severity
+        if state.get("location"):
+            # The location came with the issue description
+            return _submit_report(state, dept_name)
         state["ai_response"] = "Thank you. Could you please provide the location (address, coordinates, or landmark) where this is occurring?"
         state["status"] = "awaiting_location"
         save_conversation_state(state)
@@ -362,30 +585,7 @@ def process_department_node(state: ConversationState, dept_code: str, dept_name:
         
         # Valid location received - submit report
         state["location"] = location.strip()
-        dept_display = dept_name.replace("_", " ").replace("dept", "").strip()
-        state["ai_response"] = f"Thank you! I've collected all the information about your {dept_display} report. Your report has been submitted to the appropriate department."
-        state["status"] = "complete"
-        save_conversation_state(state)
-        
-        # Save to database and send webhook
-        report_data = {
-            "session_id": state["session_id"],
-            "department": dept_name,
-            "location": state["location"],
-            "issue_description": state["issue_description"],
-            "severity_level": state["severity_level"]
-        }
-        save_report(report_data)
-        
-        webhook_data = {
-            "location": state["location"],
-            "issue_description": state["issue_description"],
-            "severity_level": state["severity_level"],
-            "department": dept_name
-        }
-        send_webhook(webhook_data)
-        save_conversation_state(state)
-        return state
+        return _submit_report(state, dept_name)
     
     # Default fallback
     dept_display = dept_name.replace("_", " ").replace("dept", "").strip()
@@ -395,6 +595,38 @@ def process_department_node(state: ConversationState, dept_code: str, dept_name:
     return state
 
 
+def _submit_report(state: ConversationState, dept_name: str) -> ConversationState:
+    """All fields collected: confirm, save the state once and hand the report to dispatch"""
+    dept_display = dept_name.replace("_", " ").replace("dept", "").strip()
+    state["ai_response"] = f"Thank you! I've collected all the information about your {dept_display} report. Your report has been submitted to the appropriate department."
+    # Canonical place so "near MG rd" and "M.G. Road" group together downstream.
+    # Resolved before the state is stored as complete, so a failure here leaves the turn retryable
+    place = resolve_place(state["location"])
+    
+    state["status"] = "complete"
+    save_conversation_state(state)
+    
+    # Save to database and send webhook (in the background)
+    report_data = {
+        "session_id": state["session_id"],
+        "department": dept_name,
+        "location": state["location"],
+        "place_id": place.place_id if place else None,
+        "place_name": place.name if place else None,
+        "issue_description": state["issue_description"],
+        "severity_level": state["severity_level"],
+        "status": "submitted"
+    }
+    webhook_data = {
+        "location": state["location"],
+        "issue_description": state["issue_description"],
+        "severity_level": state["severity_level"],
+        "department": dept_name
+    }
+    dispatch_report(report_data, webhook_data)
+    return state
+
+
 def should_continue(state: ConversationState) -> str:
     """Determine next node based on department"""
     # After greeting, if we have a new message with a department, proceed to that department
@@ -416,14 +648,24 @@ def should_continue(state: ConversationState) -> str:
     return "__end__"
 
 
+def instrumented(name: str, node):
+    """Wrap a graph node in a tracing span and expose its thread to the request profiler"""
+    @functools.wraps(node)
+    def wrapper(state: ConversationState) -> ConversationState:
+        register_thread()
+        with span(f"node.{name}", session_id=state.get("session_id")):
+            return node(state)
+    return wrapper
+
+
 # Build the graph
 workflow = StateGraph(ConversationState)
 
-workflow.add_node("start_node", start_node)
-workflow.add_node("router_node", router_node)
-workflow.add_node("traffic_node", traffic_node)
-workflow.add_node("waste_node", waste_node)
-workflow.add_node("energy_node", energy_node)
+workflow.add_node("start_node", instrumented("start_node", start_node))
+workflow.add_node("router_node", instrumented("router_node", router_node))
+workflow.add_node("traffic_node", instrumented("traffic_node", traffic_node))
+workflow.add_node("waste_node", instrumented("waste_node", waste_node))
+workflow.add_node("energy_node", instrumented("energy_node", energy_node))
 
 workflow.set_entry_point("start_node")
 workflow.add_edge("start_node", "router_node")
@@ -444,11 +686,19 @@ workflow.add_edge("energy_node", END)
 app = workflow.compile()
 
 
+def run_graph(state: dict) -> dict:
+    """Invoke the compiled graph (runs on an executor thread)"""
+    register_thread()
+    with span("graph.invoke"):
+        return app.invoke(state)
+
+
 async def process_message(message: str, session_id: str = None) -> dict:
     """Process a user message through the LangGraph workflow"""
     import uuid
     import asyncio
     import concurrent.futures
+    import contextvars
     
     if not session_id:
         session_id = str(uuid.uuid4())
@@ -474,14 +724,26 @@ async def process_message(message: str, session_id: str = None) -> dict:
         loop = asyncio.new_event_loop()
         asyncio.set_event_loop(loop)
     
+    # Copy the context so tracing spans and the request profiler follow the work
+    ctx = contextvars.copy_context()
+    ctx.run(set_llm_context, session_id=session_id, source="chat")
     with concurrent.futures.ThreadPoolExecutor() as executor:
-        result = await loop.run_in_executor(executor, app.invoke, state)
+        result = await loop.run_in_executor(executor, ctx.run, run_graph, state)
     
     # Ensure we always have a response
     ai_response = result.get("ai_response", "")
     if not ai_response:
         ai_response = "I'm processing your request. Please provide more details."
     
+    # Keep the full conversation history (buffered, written in batches)
+    get_transcript_store().record_turn(
+        result.get("session_id", session_id),
+        message,
+        ai_response,
+        department=result.get("department", ""),
+        status=result.get("status", "")
+    )
+    
     return {
         "response": ai_response,
         "session_id": result.get("session_id", session_id),
@@ -0,0 +1,246 @@
+import contextvars
+import json
+import os
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+from langchain_community.callbacks import get_openai_callback
+
+from batching import BatchBuffer, append_jsonl, atomic_write
+
+DEFAULT_LEDGER_PATH = "data/llm_ledger.jsonl"
+# session_id is recorded in the ledger but deliberately not exposed as a grouping
+GROUP_FIELDS = ["day", "department", "source", "purpose", "model", "cache", "outcome"]
+
+# Who the current LLM call is made for; set per request, follows the work into graph threads
+_llm_context: contextvars.ContextVar[Dict] = contextvars.ContextVar("llm_context", default={})
+
+
+def set_llm_context(**fields):
+    """Attribute LLM calls made from this context (e.g. session_id, source)"""
+    _llm_context.set({**_llm_context.get(), **fields})
+
+
+def _ledger_path() -> str:
+    return os.getenv("LLM_LEDGER_PATH", DEFAULT_LEDGER_PATH)
+
+
+def _write_records(records: List[Dict]):
+    append_jsonl(_ledger_path(), records)
+
+
+_ledger = None
+
+def get_ledger() -> BatchBuffer:
+    """Get or create the batched ledger writer"""
+    global _ledger
+    if _ledger is None:
+        _ledger = BatchBuffer(_write_records, max_items=200, flush_interval=2.0, name="llm-ledger")
+    return _ledger
+
+
+def _new_record(purpose: str, model: str, cache: str) -> Dict:
+    now = datetime.now(timezone.utc)
+    context = _llm_context.get()
+    return {
+        "ts": now.isoformat(),
+        "day": now.date().isoformat(),
+        "purpose": purpose,
+        "model": model,
+        "session_id": context.get("session_id"),
+        "source": context.get("source", "unknown"),
+        "department": None,
+        "cache": cache,
+        "outcome": "ok",
+        "prompt_tokens": 0,
+        "completion_tokens": 0,
+        "cost_usd": 0.0,
+        "latency_ms": 0.0,
+    }
+
+
+@contextmanager
+def track_llm_call(purpose: str, model: str):
+    """Record one LLM call: token usage, cost, latency and outcome.
+
+    The caller may set record["department"] and record["outcome"] ("ok"/"unparsed").
+    """
+    record = _new_record(purpose, model, cache="miss")
+    started = time.perf_counter()
+    with get_openai_callback() as usage:
+        try:
+            yield record
+        except Exception as e:
+            record["outcome"] = "error"
+            record["error"] = str(e)[:200]
+            raise
+        finally:
+            record["latency_ms"] = round((time.perf_counter() - started) * 1000, 1)
+            record["prompt_tokens"] = usage.prompt_tokens
+            record["completion_tokens"] = usage.completion_tokens
+            record["cost_usd"] = round(usage.total_cost, 6)
+            get_ledger().add(record)
+
+
+def record_cache_hit(purpose: str, model: str, department: Optional[str]):
+    """An answer served from the LLM cache: no tokens, but still counted"""
+    record = _new_record(purpose, model, cache="hit")
+    record["department"] = department
+    get_ledger().add(record)
+
+
+def iter_records(since: Optional[str] = None):
+    """Stream ledger records (optionally from a day onwards) without loading the file"""
+    path = _ledger_path()
+    if not os.path.exists(path):
+        return
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            if since and record.get("day", "") < since:
+                continue
+            yield record
+
+
+def _new_totals() -> Dict:
+    return {"calls": 0, "cache_hits": 0, "errors": 0, "prompt_tokens": 0, "completion_tokens": 0,
+            "cost_usd": 0.0, "latency_ms_total": 0.0, "latency_ms_max": 0.0}
+
+
+def _add_record(totals: Dict, record: Dict):
+    totals["calls"] += 1
+    totals["cache_hits"] += record.get("cache") == "hit"
+    totals["errors"] += record.get("outcome") == "error"
+    totals["prompt_tokens"] += record.get("prompt_tokens", 0)
+    totals["completion_tokens"] += record.get("completion_tokens", 0)
+    totals["cost_usd"] += record.get("cost_usd", 0.0)
+    totals["latency_ms_total"] += record.get("latency_ms", 0.0)
+    totals["latency_ms_max"] = max(totals["latency_ms_max"], record.get("latency_ms", 0.0))
+
+
+def _merge(totals: Dict, other: Dict):
+    for name, value in other.items():
+        totals[name] = max(totals[name], value) if name == "latency_ms_max" else totals[name] + value
+
+
+class LedgerRollup:
+    """Running totals per (day, department, source, ...) so /metrics/llm only reads new ledger lines.
+
+    The byte offset of the last complete line read is kept with the totals; both are written
+    to `<ledger>.rollup.json` so a restarted worker resumes instead of re-reading the ledger.
+    A new or truncated ledger file starts the rollup over.
+    """
+
+    def __init__(self, ledger_path: str):
+        self.ledger_path = ledger_path
+        self.snapshot_path = f"{ledger_path}.rollup.json"
+        self._lock = threading.Lock()
+        self._reset(None)
+        self._load()
+
+    def _reset(self, file_id):
+        self.file_id = file_id
+        self.offset = 0
+        self.cells: Dict[tuple, Dict] = {}
+
+    def _load(self):
+        try:
+            with open(self.snapshot_path) as f:
+                state = json.load(f)
+            self.file_id = state["file_id"]
+            self.offset = state["offset"]
+            self.cells = {tuple(key): totals for key, totals in state["cells"]}
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            print(f"Warning: could not load LLM ledger rollup '{self.snapshot_path}': {e}")
+            self._reset(None)
+
+    def _save(self):
+        state = {"file_id": self.file_id, "offset": self.offset,
+                 "cells": [[list(key), totals] for key, totals in self.cells.items()]}
+        try:
+            with atomic_write(self.snapshot_path) as f:
+                json.dump(state, f)
+        except OSError as e:
+            print(f"Warning: could not save LLM ledger rollup: {e}")
+
+    def update(self) -> int:
+        """Fold complete lines appended since the last call into the totals; returns how many"""
+        try:
+            stat = os.stat(self.ledger_path)
+        except FileNotFoundError:
+            return 0
+        with open(self.ledger_path, "rb") as f:
+            # Device, inode and the first line identify the file, so rotation or truncation is noticed
+            file_id = [stat.st_dev, stat.st_ino, f.readline(256).hex()]
+            if file_id != self.file_id or stat.st_size < self.offset:
+                self._reset(file_id)
+            if stat.st_size == self.offset:
+                return 0
+            f.seek(self.offset)
+            data = f.read(stat.st_size - self.offset)
+
+        added = 0
+        end = data.rfind(b"\n") + 1  # a line still being appended is left for next time
+        for line in data[:end].splitlines():
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            key = tuple(record.get(field) for field in GROUP_FIELDS)
+            totals = self.cells.get(key)
+            if totals is None:
+                totals = self.cells[key] = _new_totals()
+            _add_record(totals, record)
+            added += 1
+        self.offset += end
+        if end:
+            self._save()
+        return added
+
+    def rows(self, group_by: List[str], since: Optional[str] = None) -> List[Dict]:
+        with self._lock:
+            self.update()
+            groups = defaultdict(_new_totals)
+            positions = [GROUP_FIELDS.index(field) for field in group_by]
+            for key, totals in self.cells.items():
+                if since and (key[0] or "") < since:
+                    continue
+                _merge(groups[tuple(key[i] for i in positions)], totals)
+
+        rows = []
+        for key, group in sorted(groups.items(), key=lambda item: tuple(str(k) for k in item[0])):
+            row = dict(zip(group_by, key))
+            row.update(group)
+            row["cost_usd"] = round(row["cost_usd"], 6)
+            row["avg_latency_ms"] = round(row.pop("latency_ms_total") / row["calls"], 1)
+            rows.append(row)
+        return rows
+
+
+_rollup = None
+_rollup_lock = threading.Lock()
+
+def get_rollup() -> LedgerRollup:
+    global _rollup
+    with _rollup_lock:
+        if _rollup is None or _rollup.ledger_path != _ledger_path():
+            _rollup = LedgerRollup(_ledger_path())
+    return _rollup
+
+
+def aggregate(group_by: List[str], since: Optional[str] = None) -> List[Dict]:
+    """Roll the ledger up by the given fields (e.g. ["day", "department"])"""
+    for field in group_by:
+        if field not in GROUP_FIELDS:
+            raise ValueError(f"Cannot group by '{field}'. Choose from {GROUP_FIELDS}")
+
+    # Include what is still buffered so the view is current
+    get_ledger().flush()
+    return get_rollup().rows(group_by, since)
@@ -0,0 +1,296 @@
+import argparse
+import json
+import os
+import re
+import zlib
+from typing import Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from batching import BatchBuffer, append_jsonl, atomic_write
+
+DEPARTMENTS = ["traffic_dept", "waste_dept", "energy_dept"]
+
+# Reports store the display-ish department name, the classifier works with codes
+REPORT_DEPT_TO_CODE = {
+    "traffic": "traffic_dept",
+    "waste": "waste_dept",
+    "green_energy": "energy_dept",
+}
+
+DEFAULT_MODEL_PATH = "models/intent_nb.npz"
+DEFAULT_LABELS_PATH = "data/llm_labels.jsonl"
+DEFAULT_SEED_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "intent_seed.jsonl")
+
+# A message needs this many n-grams seen in training before the local model answers
+DEFAULT_MIN_FEATURES = 2
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+
+def hash_features(text: str, n_features: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Hashed word unigrams + bigrams -> (feature indices, counts)"""
+    tokens = _TOKEN_RE.findall(text.lower())
+    grams = tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+    if not grams:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+    # crc32 is stable across processes, unlike hash()
+    indices = np.fromiter((zlib.crc32(g.encode()) % n_features for g in grams), dtype=np.int64, count=len(grams))
+    unique, counts = np.unique(indices, return_counts=True)
+    return unique, counts.astype(np.float32)
+
+
+class LocalIntentClassifier:
+    """Multinomial naive Bayes over hashed n-grams.
+
+    Raw naive Bayes posteriors are overconfident (a handful of words seen once in training can
+    give 0.99), so scores are divided by a temperature fitted on held-out predictions, and a
+    message needs `min_features` n-grams seen in training before the model answers at all.
+    """
+
+    def __init__(self, feature_log_prob: np.ndarray, class_log_prior: np.ndarray, classes: List[str],
+                 temperature: float = 1.0, feature_seen: Optional[np.ndarray] = None,
+                 min_features: int = DEFAULT_MIN_FEATURES):
+        self.feature_log_prob = feature_log_prob
+        self.class_log_prior = class_log_prior
+        self.classes = classes
+        self.n_features = feature_log_prob.shape[1]
+        self.temperature = temperature
+        # Older artifacts have no vocabulary mask; treat every feature as known
+        self.feature_seen = feature_seen if feature_seen is not None else np.ones(self.n_features, dtype=bool)
+        self.min_features = min_features
+
+    @classmethod
+    def train(cls, texts: List[str], labels: List[str], n_features: int = 2 ** 16, alpha: float = 0.5):
+        classes = list(DEPARTMENTS)
+        counts = np.zeros((len(classes), n_features), dtype=np.float64)
+        class_counts = np.zeros(len(classes), dtype=np.float64)
+
+        for text, label in zip(texts, labels):
+            row = classes.index(label)
+            indices, values = hash_features(text, n_features)
+            np.add.at(counts[row], indices, values)
+            class_counts[row] += 1
+
+        smoothed = counts + alpha
+        feature_log_prob = np.log(smoothed) - np.log(smoothed.sum(axis=1, keepdims=True))
+        class_log_prior = np.log((class_counts + 1) / (class_counts.sum() + len(classes)))
+        return cls(feature_log_prob.astype(np.float32), class_log_prior.astype(np.float32), classes,
+                   feature_seen=counts.sum(axis=0) > 0)
+
+    def log_scores(self, text: str) -> Tuple[np.ndarray, int]:
+        """Uncalibrated class log-scores and the number of distinct n-grams seen in training"""
+        indices, values = hash_features(text, self.n_features)
+        scores = self.feature_log_prob[:, indices] @ values + self.class_log_prior
+        return scores, int(self.feature_seen[indices].sum())
+
+    def predict(self, text: str) -> Tuple[Optional[str], float]:
+        """Return (department code, confidence). Confidence is the calibrated posterior of the best class"""
+        scores, known = self.log_scores(text)
+        if known == 0 or known < self.min_features:
+            return None, 0.0
+        probs = _softmax(scores / self.temperature)
+        best = int(probs.argmax())
+        return self.classes[best], float(probs[best])
+
+    def save(self, path: str):
+        # float16 halves the artifact; the precision loss does not change rankings in practice
+        with atomic_write(path, "wb") as f:
+            np.savez_compressed(
+                f,
+                feature_log_prob=self.feature_log_prob.astype(np.float16),
+                class_log_prior=self.class_log_prior,
+                classes=np.array(self.classes),
+                temperature=np.float32(self.temperature),
+                feature_seen=np.packbits(self.feature_seen),
+            )
+
+    @classmethod
+    def load(cls, path: str) -> "LocalIntentClassifier":
+        with np.load(path) as data:
+            feature_log_prob = data["feature_log_prob"].astype(np.float32)
+            feature_seen = None
+            if "feature_seen" in data:
+                feature_seen = np.unpackbits(data["feature_seen"], count=feature_log_prob.shape[1]).astype(bool)
+            return cls(
+                feature_log_prob,
+                data["class_log_prior"].astype(np.float32),
+                [str(c) for c in data["classes"]],
+                temperature=float(data["temperature"]) if "temperature" in data else 1.0,
+                feature_seen=feature_seen,
+            )
+
+
+def _softmax(scores: np.ndarray) -> np.ndarray:
+    exp = np.exp(scores - scores.max(axis=-1, keepdims=True))
+    return exp / exp.sum(axis=-1, keepdims=True)
+
+
+def fit_temperature(scores: np.ndarray, targets: np.ndarray) -> float:
+    """Temperature minimising the negative log-likelihood of held-out (scores, true class) pairs"""
+    candidates = np.exp(np.linspace(np.log(0.5), np.log(50.0), 200))
+    rows = np.arange(len(targets))
+    nll = [-np.log(_softmax(scores / t)[rows, targets] + 1e-12).mean() for t in candidates]
+    return float(candidates[int(np.argmin(nll))])
+
+
+def calibration_table(confidences: np.ndarray, correct: np.ndarray,
+                      thresholds: Iterable[float] = (0.5, 0.6, 0.7, 0.8, 0.9, 0.95)) -> List[dict]:
+    """Per threshold: share of messages answered locally, their accuracy and mean confidence"""
+    table = []
+    for threshold in thresholds:
+        answered = confidences >= threshold
+        n = int(answered.sum())
+        table.append({
+            "threshold": threshold,
+            "coverage": n / len(confidences) if len(confidences) else 0.0,
+            "accuracy": float(correct[answered].mean()) if n else None,
+            "confidence": float(confidences[answered].mean()) if n else None,
+        })
+    return table
+
+
+# --- Runtime access ---
+
+_classifier = None
+_classifier_loaded = False
+
+
+def get_local_classifier() -> Optional[LocalIntentClassifier]:
+    """Load the trained artifact once; None when no model has been trained yet"""
+    global _classifier, _classifier_loaded
+    if not _classifier_loaded:
+        _classifier_loaded = True
+        path = os.getenv("LOCAL_MODEL_PATH", DEFAULT_MODEL_PATH)
+        if os.path.exists(path):
+            try:
+                _classifier = LocalIntentClassifier.load(path)
+                _classifier.min_features = int(os.getenv("LOCAL_MODEL_MIN_FEATURES", str(DEFAULT_MIN_FEATURES)))
+                print(f"[OK] Local intent model loaded from {path}")
+            except Exception as e:
+                print(f"[ERROR] Failed to load local intent model: {e}")
+        else:
+            print(f"Local intent model '{path}' not found. Falling back to LLM classification.")
+    return _classifier
+
+
+def get_local_threshold() -> float:
+    return float(os.getenv("LOCAL_MODEL_THRESHOLD", "0.8"))
+
+
+def _write_labels(rows: List[dict]):
+    append_jsonl(os.getenv("LLM_LABELS_PATH", DEFAULT_LABELS_PATH), rows)
+
+
+_label_log = None
+
+def record_label(message: str, department: str, source: str = "llm"):
+    """Keep LLM answers as future training data (written in the background)"""
+    global _label_log
+    if _label_log is None:
+        _label_log = BatchBuffer(_write_labels, max_items=100, flush_interval=5.0, name="llm-labels")
+    _label_log.add({"text": message, "department": department, "source": source})
+
+
+# --- Training data ---
+
+def load_jsonl_labels(path: str) -> Iterable[Tuple[str, str]]:
+    if not os.path.exists(path):
+        return
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            row = json.loads(line)
+            if row.get("text") and row.get("department") in DEPARTMENTS:
+                yield row["text"], row["department"]
+
+
+def load_report_labels(limit: Optional[int] = None) -> Iterable[Tuple[str, str]]:
+    """Historical reports from Firestore: issue_description labelled with its department"""
+    from firebase_client import get_db
+
+    db = get_db()
+    if not db:
+        return
+    query = db.collection("reports").select(["issue_description", "department"])
+    if limit:
+        query = query.limit(limit)
+    for doc in query.stream():
+        data = doc.to_dict()
+        code = REPORT_DEPT_TO_CODE.get(data.get("department", ""))
+        if code and data.get("issue_description"):
+            yield data["issue_description"], code
+
+
+def holdout_scores(rows: List[Tuple[str, str]], folds: int = 10, n_features: int = 2 ** 16):
+    """Cross-validate: every example is scored once by a model that did not see it.
+
+    Returns (log-scores, true class indices, known n-gram counts) for fit_temperature and
+    calibration_table.
+    """
+    folds = min(folds, len(rows))
+    scores, targets, known = [], [], []
+    for fold in range(folds):
+        train = [r for i, r in enumerate(rows) if i % folds != fold]
+        test = [r for i, r in enumerate(rows) if i % folds == fold]
+        if not train or not test:
+            continue
+        model = LocalIntentClassifier.train([t for t, _ in train], [d for _, d in train], n_features=n_features)
+        for text, department in test:
+            text_scores, text_known = model.log_scores(text)
+            scores.append(text_scores)
+            targets.append(DEPARTMENTS.index(department))
+            known.append(text_known)
+    return np.array(scores).reshape(-1, len(DEPARTMENTS)), np.array(targets, dtype=np.int64), np.array(known)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Train the local intent classifier")
+    parser.add_argument("--out", default=os.getenv("LOCAL_MODEL_PATH", DEFAULT_MODEL_PATH))
+    parser.add_argument("--labels", default=os.getenv("LLM_LABELS_PATH", DEFAULT_LABELS_PATH),
+                        help="JSONL of cached LLM labels ({text, department})")
+    parser.add_argument("--seed", default=DEFAULT_SEED_PATH, help="Hand-labelled seed examples")
+    parser.add_argument("--no-reports", action="store_true", help="Skip Firestore reports")
+    parser.add_argument("--report-limit", type=int, default=None)
+    parser.add_argument("--features", type=int, default=2 ** 16)
+    parser.add_argument("--folds", type=int, default=10, help="Cross-validation folds for calibration")
+    args = parser.parse_args()
+
+    rows = list(load_jsonl_labels(args.seed))
+    print(f"Seed examples: {len(rows)}")
+    llm_rows = list(load_jsonl_labels(args.labels))
+    print(f"Cached LLM labels: {len(llm_rows)}")
+    rows += llm_rows
+    if not args.no_reports:
+        report_rows = list(load_report_labels(args.report_limit))
+        print(f"Historical reports: {len(report_rows)}")
+        rows += report_rows
+
+    if not rows:
+        print("[ERROR] No training data found")
+        return
+
+    scores, targets, known = holdout_scores(rows, folds=args.folds, n_features=args.features)
+    model = LocalIntentClassifier.train([t for t, _ in rows], [d for _, d in rows], n_features=args.features)
+    if len(targets):
+        model.temperature = fit_temperature(scores, targets)
+        probs = _softmax(scores / model.temperature)
+        confidences = np.where(known >= model.min_features, probs.max(axis=1), 0.0)
+        correct = probs.argmax(axis=1) == targets
+        print(f"Holdout accuracy: {correct.sum()}/{len(correct)} ({correct.mean():.1%}), temperature {model.temperature:.2f}")
+        # Choose LOCAL_MODEL_THRESHOLD from this: accuracy of the messages answered locally at each cut-off
+        print("threshold  coverage  accuracy  mean confidence")
+        for row in calibration_table(confidences, correct):
+            if row["accuracy"] is None:
+                print(f"{row['threshold']:>9.2f}  {row['coverage']:>8.1%}         -                -")
+            else:
+                print(f"{row['threshold']:>9.2f}  {row['coverage']:>8.1%}  {row['accuracy']:>8.1%}  {row['confidence']:>15.1%}")
+
+    model.save(args.out)
+    print(f"[OK] Model saved to {args.out} ({os.path.getsize(args.out) // 1024} KB)")
+
+
+if __name__ == "__main__":
+    main()
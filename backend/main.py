@@ -1,14 +1,61 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request, Response, Depends, WebSocket, WebSocketDisconnect
+from fastapi.responses import StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
+from starlette.requests import HTTPConnection
 from pydantic import BaseModel
 from typing import Optional
+from contextlib import asynccontextmanager
+import asyncio
+import hmac
+import itertools
+import json
 import os
+import time
+import uuid
 from dotenv import load_dotenv
 from langgraph_workflow import process_message, classify_intent
+from admission import get_chat_admission, AdmissionRejected
+from tracing import span, new_id
+from profiling import should_profile, profile_request, memory_snapshot, stop_memory_tracing
+from idempotency import get_chat_idempotency, request_fingerprint, IdempotencyConflict, IdempotencyInFlight, MAX_KEY_LENGTH
+from transcript_store import get_transcript_store
+from firebase_client import pin_session, unpin_session
+import report_dispatch
+from warmup import warm_up
+from batching import close_all
+from webhook_client import close_http_client
+from report_export import EXPORT_FORMATS, iter_report_pages, parse_date, stream_export
+from report_queries import get_report_queries
+from report_search import get_report_search, save_report_search
+from incident_detector import get_incident_detector, save_incident_state
+import llm_ledger
 
 load_dotenv()
 
-app = FastAPI(title="Urban Planning Assistant API")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Warm clients in the background: /health answers at once, /ready only once warm
+    app.state.ready = False
+    app.state.warmup = {}
+
+    async def run_warmup():
+        app.state.warmup = await asyncio.to_thread(warm_up)
+        app.state.ready = True
+
+    warmup_task = asyncio.create_task(run_warmup())
+    yield
+    app.state.ready = False
+    warmup_task.cancel()
+    # Deliver queued reports, drain background writers and close pooled connections
+    await asyncio.to_thread(report_dispatch.drain)
+    await asyncio.to_thread(save_report_search)
+    await asyncio.to_thread(save_incident_state)
+    await asyncio.to_thread(close_all)
+    close_http_client()
+
+
+app = FastAPI(title="Urban Planning Assistant API", lifespan=lifespan)
 
 # CORS middleware
 app.add_middleware(
@@ -42,27 +89,182 @@ class ClassificationResponse(BaseModel):
     confidence: str
 
 
-@app.post("/chat", response_model=ChatResponse)
-async def chat_endpoint(request: ChatRequest):
+TRUSTED_PROXY_HOPS = int(os.getenv("TRUSTED_PROXY_HOPS", "0"))
+
+
+def get_client_id(request: HTTPConnection) -> str:
+    """Identify the caller of an HTTP request or WebSocket for rate limiting.
+
+    X-Forwarded-For entries left of those appended by our own proxies are client-controlled,
+    so with TRUSTED_PROXY_HOPS=N the Nth entry from the right is used; otherwise the peer address.
+    """
+    forwarded = request.headers.get("x-forwarded-for")
+    if TRUSTED_PROXY_HOPS and forwarded:
+        hops = [hop.strip() for hop in forwarded.split(",")]
+        return hops[max(0, len(hops) - TRUSTED_PROXY_HOPS)]
+    return request.client.host if request.client else "unknown"
+
+
+async def chat_admission(request: Request):
+    """Admit /chat requests or shed them fast with 429/503 and Retry-After"""
+    admission = get_chat_admission()
+    try:
+        await admission.acquire(get_client_id(request))
+    except AdmissionRejected as e:
+        raise HTTPException(
+            status_code=e.status_code,
+            detail=e.reason,
+            headers={"Retry-After": str(e.retry_after)}
+        )
+    try:
+        yield
+    finally:
+        admission.release()
+
+
+def require_debug_token(request: Request):
+    """Debug endpoints are hidden unless DEBUG_TOKEN is set and presented"""
+    debug_token = os.getenv("DEBUG_TOKEN")
+    if not debug_token:
+        raise HTTPException(status_code=404, detail="Not Found")
+    # Constant-time comparison so response timing does not leak the token
+    if not hmac.compare_digest(request.headers.get("x-debug-token", "").encode(), debug_token.encode()):
+        raise HTTPException(status_code=403, detail="Invalid debug token")
+
+
+def require_reports_token(request: Request):
+    """Report read APIs and /metrics/* are disabled unless REPORTS_API_TOKEN is set and presented as X-Api-Token"""
+    api_token = os.getenv("REPORTS_API_TOKEN")
+    if not api_token:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not hmac.compare_digest(request.headers.get("x-api-token", "").encode(), api_token.encode()):
+        raise HTTPException(status_code=401, detail="Invalid API token")
+
+
+@app.post("/chat", response_model=ChatResponse, dependencies=[Depends(chat_admission)])
+async def chat_endpoint(request: ChatRequest, http_request: Request, response: Response):
     import traceback
+    # Retries carrying the same Idempotency-Key replay the first response without touching the graph
+    idempotency_key = http_request.headers.get("idempotency-key")
+    if idempotency_key:
+        if len(idempotency_key) > MAX_KEY_LENGTH:
+            raise HTTPException(status_code=400, detail=f"Idempotency-Key longer than {MAX_KEY_LENGTH} characters")
+        idempotency = get_chat_idempotency()
+        fingerprint = request_fingerprint(request.session_id, request.message)
+        try:
+            replay = await idempotency.begin(idempotency_key, fingerprint)
+        except IdempotencyConflict as e:
+            raise HTTPException(status_code=422, detail=str(e))
+        except IdempotencyInFlight as e:
+            raise HTTPException(status_code=409, detail=str(e), headers={"Retry-After": "1"})
+        if replay is not None:
+            response.headers["Idempotent-Replayed"] = "true"
+            return ChatResponse(**replay)
+
     try:
-        result = await process_message(request.message, request.session_id)
-        return ChatResponse(
+        request_id = new_id()
+        profiled = should_profile(http_request.headers)
+        with profile_request(request_id, enabled=profiled), \
+                span("chat", request_id=request_id, session_id=request.session_id) as root:
+            result = await process_message(request.message, request.session_id)
+        if root:
+            response.headers["X-Trace-Id"] = root["trace_id"]
+        if profiled:
+            response.headers["X-Profile-Id"] = request_id
+        chat_response = ChatResponse(
             response=result["response"],
             session_id=result["session_id"],
             department=result.get("department"),
             status=result.get("status", "in_progress")
         )
+        if idempotency_key:
+            await idempotency.complete(idempotency_key, fingerprint, chat_response.model_dump())
+        return chat_response
     except Exception as e:
         error_detail = f"{str(e)}\n\n{traceback.format_exc()}"
         print(f"Error in chat endpoint: {error_detail}")
         raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        # No-op after complete(); otherwise frees the key so the client's retry runs normally
+        if idempotency_key:
+            await idempotency.abandon(idempotency_key)
+
+
+@app.websocket("/chat/ws")
+async def chat_websocket(websocket: WebSocket, session_id: Optional[str] = None):
+    """One connection per session: state stays loaded, turns are messages, report status is pushed"""
+    await websocket.accept()
+    session_id = session_id or str(uuid.uuid4())
+    loop = asyncio.get_running_loop()
+    outbox: asyncio.Queue = asyncio.Queue()
+    admission = get_chat_admission()
+    client_id = get_client_id(websocket)
+
+    # Statuses that finish mid-turn are held so they follow that turn's response
+    turn = {"busy": False, "held": []}
+
+    def queue_status(status: dict):
+        if turn["busy"]:
+            turn["held"].append(status)
+        else:
+            outbox.put_nowait({"type": "report_status", **status})
+
+    def on_report_status(status: dict):
+        # Called from a dispatch worker thread
+        loop.call_soon_threadsafe(queue_status, status)
+
+    async def send_loop():
+        while True:
+            await websocket.send_json(await outbox.get())
+
+    await asyncio.to_thread(pin_session, session_id)
+    report_dispatch.subscribe(session_id, on_report_status)
+    sender = asyncio.create_task(send_loop())
+    try:
+        await outbox.put({"type": "session", "session_id": session_id})
+        while True:
+            raw = await websocket.receive_text()
+            try:
+                payload = json.loads(raw)
+                message = payload.get("message") if isinstance(payload, dict) else None
+            except json.JSONDecodeError:
+                message = raw
+            if not isinstance(message, str) or not message.strip():
+                await outbox.put({"type": "error", "detail": "Send {\"message\": \"...\"}"})
+                continue
+
+            # Each turn goes through the same admission control as POST /chat
+            try:
+                await admission.acquire(client_id)
+            except AdmissionRejected as e:
+                await outbox.put({"type": "error", "detail": e.reason, "retry_after": e.retry_after})
+                continue
+            turn["busy"] = True
+            try:
+                result = await process_message(message, session_id)
+                await outbox.put({"type": "response", **result})
+            except Exception as e:
+                print(f"Error in chat websocket: {e}")
+                await outbox.put({"type": "error", "detail": str(e)})
+            finally:
+                admission.release()
+                turn["busy"] = False
+                for status in turn["held"]:
+                    queue_status(status)
+                turn["held"].clear()
+    except WebSocketDisconnect:
+        pass
+    finally:
+        report_dispatch.unsubscribe(session_id, on_report_status)
+        sender.cancel()
+        unpin_session(session_id)
 
 
 @app.post("/classify", response_model=ClassificationResponse)
 async def classify_endpoint(request: ClassificationRequest):
     """Classify user message into one of three departments: traffic, waste, energy"""
     try:
+        llm_ledger.set_llm_context(source="classify_api")
         department = classify_intent(request.message)
         
         # Map department codes to display names
@@ -84,11 +286,166 @@ async def classify_endpoint(request: ClassificationRequest):
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.get("/reports", dependencies=[Depends(require_reports_token)])
+def list_reports(
+    department: Optional[str] = None,
+    min_severity: Optional[int] = None,
+    max_severity: Optional[int] = None,
+    status: Optional[str] = None,
+    since: Optional[str] = None,
+    until: Optional[str] = None,
+    cursor: Optional[str] = None,
+    limit: int = 50,
+):
+    """Newest reports first; pass `next_cursor` back as `cursor` for the next page"""
+    try:
+        return get_report_queries().query(
+            department=department,
+            min_severity=min_severity,
+            max_severity=max_severity,
+            status=status,
+            since=parse_date(since),
+            until=parse_date(until),
+            cursor=cursor,
+            limit=max(1, min(limit, 200)),
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@app.get("/reports/search", dependencies=[Depends(require_reports_token)])
+def search_reports(q: str, department: Optional[str] = None, limit: int = 20):
+    """Full-text search over report issue descriptions and locations, best match first"""
+    started = time.perf_counter()
+    search = get_report_search()
+    results = search.search(q, limit=max(1, min(limit, 100)), department=department)
+    return {
+        "query": q,
+        # False while the index is still being built after a start: results may be incomplete
+        "complete": search.ready,
+        "results": results,
+        "took_ms": round((time.perf_counter() - started) * 1000, 2),
+    }
+
+
+@app.get("/incidents", dependencies=[Depends(require_reports_token)])
+def list_incidents(limit: int = 20):
+    """Recent escalations and the busiest department/location cells in the current window"""
+    detector = get_incident_detector()
+    return {
+        "escalations": detector.recent_events(limit=max(1, min(limit, 100))),
+        "hot_cells": detector.hot_cells(limit=max(1, min(limit, 100))),
+    }
+
+
+@app.get("/reports/export", dependencies=[Depends(require_reports_token)])
+def export_reports(
+    format: str = "ndjson",
+    department: Optional[str] = None,
+    since: Optional[str] = None,
+    until: Optional[str] = None,
+    cursor: Optional[str] = None,
+    page_size: int = 500,
+):
+    """Stream reports as NDJSON or CSV; pass the last report_id as `cursor` to resume"""
+    if format not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"format must be one of {EXPORT_FORMATS}")
+    try:
+        pages = iter_report_pages(
+            department=department,
+            since=parse_date(since),
+            until=parse_date(until),
+            cursor=cursor,
+            page_size=max(1, min(page_size, 1000)),
+        )
+        # Fetch the first page up front so a bad cursor becomes a 400 instead of a broken stream
+        first_page = next(pages, None)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    if first_page is not None:
+        pages = itertools.chain([first_page], pages)
+    media_type = "text/csv" if format == "csv" else "application/x-ndjson"
+    return StreamingResponse(
+        stream_export(pages, format),
+        media_type=media_type,
+        headers={"Content-Disposition": f"attachment; filename=reports.{format}"},
+    )
+
+
+@app.get("/conversations/{session_id}/transcript", dependencies=[Depends(require_reports_token)])
+def conversation_transcript(session_id: str):
+    """Full turn history for a session (compacted archive + recent turns)"""
+    return {"session_id": session_id, "turns": get_transcript_store().get_transcript(session_id)}
+
+
 @app.get("/health")
 async def health_check():
     return {"status": "healthy", "departments": ["Traffic", "Waste Management", "Green Energy & Spaces"]}
 
 
+@app.get("/ready")
+async def readiness_check(response: Response):
+    """Readiness for the load balancer: 503 until clients are warmed up"""
+    if not getattr(app.state, "ready", False):
+        response.status_code = 503
+        return {"status": "warming_up"}
+    return {"status": "ready", "warmup": app.state.warmup}
+
+
+@app.get("/metrics/admission", dependencies=[Depends(require_reports_token)])
+async def admission_metrics():
+    """Queue depth, in-flight count and rejection counters for /chat"""
+    return get_chat_admission().stats()
+
+
+@app.get("/metrics/dispatch", dependencies=[Depends(require_reports_token)])
+async def dispatch_metrics():
+    """Report dispatch queue depth and queue latency per severity lane"""
+    return report_dispatch.stats()
+
+
+@app.get("/metrics/search", dependencies=[Depends(require_reports_token)])
+async def search_metrics():
+    return get_report_search().stats()
+
+
+@app.get("/metrics/incidents", dependencies=[Depends(require_reports_token)])
+async def incident_metrics():
+    return get_incident_detector().stats()
+
+
+@app.get("/metrics/idempotency", dependencies=[Depends(require_reports_token)])
+async def idempotency_metrics():
+    return get_chat_idempotency().stats()
+
+
+@app.get("/metrics/llm", dependencies=[Depends(require_reports_token)])
+async def llm_metrics(group_by: str = "day,department", since: Optional[str] = None):
+    """LLM calls, tokens, cost and latency from the usage ledger, e.g. ?group_by=day,department&since=2024-01-01"""
+    try:
+        fields = [f.strip() for f in group_by.split(",") if f.strip()]
+        since_day = parse_date(since).date().isoformat() if since else None
+        rows = await asyncio.to_thread(llm_ledger.aggregate, fields, since_day)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"group_by": fields, "since": since_day, "rows": rows}
+
+
+@app.get("/debug/memory", dependencies=[Depends(require_debug_token)])
+async def debug_memory(limit: int = 20, key_type: str = "lineno", compare: bool = False):
+    """tracemalloc top allocations; the first call starts tracing"""
+    if key_type not in ("lineno", "filename", "traceback"):
+        raise HTTPException(status_code=400, detail="key_type must be lineno, filename or traceback")
+    return memory_snapshot(limit=limit, key_type=key_type, compare=compare)
+
+
+@app.delete("/debug/memory", dependencies=[Depends(require_debug_token)])
+async def debug_memory_stop():
+    stop_memory_tracing()
+    return {"tracing": False}
+
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
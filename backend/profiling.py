@@ -0,0 +1,144 @@
+import contextvars
+import hmac
+import os
+import random
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from contextlib import contextmanager
+from typing import Dict, Optional
+
+# The sampler profiling the current request, if any (propagates into graph worker threads)
+_active_profiler: contextvars.ContextVar[Optional["StackSampler"]] = contextvars.ContextVar("active_profiler", default=None)
+
+
+class StackSampler:
+    """Sampling profiler: periodically records the Python stacks of registered threads"""
+
+    def __init__(self, interval: float = 0.005):
+        self.interval = interval
+        self.samples: Counter = Counter()
+        self._threads = set()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def add_thread(self, thread_id: int):
+        self._threads.add(thread_id)
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=1)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frames = sys._current_frames()
+            for thread_id in list(self._threads):
+                frame = frames.get(thread_id)
+                if frame is None:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                    frame = frame.f_back
+                self.samples[";".join(reversed(stack))] += 1
+
+    def write_folded(self, path: str):
+        """Write collapsed stacks (flamegraph.pl / speedscope format)"""
+        with open(path, "w", encoding="utf-8") as f:
+            for stack, count in self.samples.most_common():
+                f.write(f"{stack} {count}\n")
+
+
+def should_profile(headers) -> bool:
+    """Profile when the caller asks with a valid debug token, or by random sampling"""
+    debug_token = os.getenv("DEBUG_TOKEN")
+    if debug_token and hmac.compare_digest(headers.get("x-profile", "").encode(), debug_token.encode()):
+        return True
+    sample_rate = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+    return sample_rate > 0 and random.random() < sample_rate
+
+
+def register_thread():
+    """Let the active request profiler (if any) sample the calling thread"""
+    profiler = _active_profiler.get()
+    if profiler is not None:
+        profiler.add_thread(threading.get_ident())
+
+
+@contextmanager
+def profile_request(name: str, enabled: bool = True):
+    """Profile the work done for one request and save it under PROFILE_DIR"""
+    if not enabled:
+        yield None
+        return
+
+    profiler = StackSampler(interval=float(os.getenv("PROFILE_INTERVAL_MS", "5")) / 1000)
+    token = _active_profiler.set(profiler)
+    profiler.start()
+    result = {"path": None}
+    try:
+        yield result
+    finally:
+        profiler.stop()
+        _active_profiler.reset(token)
+        profile_dir = os.getenv("PROFILE_DIR", "profiles")
+        try:
+            os.makedirs(profile_dir, exist_ok=True)
+            path = os.path.join(profile_dir, f"{time.strftime('%Y%m%d-%H%M%S')}-{name}.folded")
+            profiler.write_folded(path)
+            result["path"] = path
+            print(f"[OK] Profile saved to {path} ({sum(profiler.samples.values())} samples)")
+        except Exception as e:
+            print(f"[ERROR] Failed to save profile: {e}")
+
+
+# --- Memory snapshots ---
+
+_last_snapshot = None
+
+
+def memory_snapshot(limit: int = 20, key_type: str = "lineno", compare: bool = False) -> Dict:
+    """Top allocations from tracemalloc, optionally diffed against the previous snapshot"""
+    global _last_snapshot
+    if not tracemalloc.is_tracing():
+        tracemalloc.start(int(os.getenv("TRACEMALLOC_FRAMES", "10")))
+        return {"tracing": True, "started": True, "stats": []}
+
+    snapshot = tracemalloc.take_snapshot().filter_traces([
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+    ])
+    if compare and _last_snapshot is not None:
+        stats = snapshot.compare_to(_last_snapshot, key_type)[:limit]
+        rows = [{"location": str(s.traceback), "size_kb": round(s.size / 1024, 1),
+                 "size_diff_kb": round(s.size_diff / 1024, 1), "count": s.count,
+                 "count_diff": s.count_diff} for s in stats]
+    else:
+        stats = snapshot.statistics(key_type)[:limit]
+        rows = [{"location": str(s.traceback), "size_kb": round(s.size / 1024, 1),
+                 "count": s.count} for s in stats]
+    _last_snapshot = snapshot
+
+    current, peak = tracemalloc.get_traced_memory()
+    return {
+        "tracing": True,
+        "started": False,
+        "current_kb": round(current / 1024, 1),
+        "peak_kb": round(peak / 1024, 1),
+        "stats": rows,
+    }
+
+
+def stop_memory_tracing():
+    global _last_snapshot
+    _last_snapshot = None
+    if tracemalloc.is_tracing():
+        tracemalloc.stop()
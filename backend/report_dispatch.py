@@ -0,0 +1,110 @@
+import concurrent.futures
+import contextvars
+import os
+import threading
+from typing import Callable, Dict, List
+
+from dispatch_scheduler import PriorityScheduler
+from firebase_client import save_report, update_report_status
+from report_search import get_report_search
+from incident_detector import observe_report
+from webhook_client import send_webhook
+
+# Callbacks waiting for a session's report status (e.g. an open WebSocket)
+_listeners: Dict[str, List[Callable[[Dict], None]]] = {}
+_listeners_lock = threading.Lock()
+
+_scheduler = None
+
+
+def get_scheduler() -> PriorityScheduler:
+    """Get or create the severity-aware scheduler that persists reports and sends webhooks"""
+    global _scheduler
+    if _scheduler is None:
+        _scheduler = PriorityScheduler(
+            workers=int(os.getenv("REPORT_DISPATCH_WORKERS", "4")),
+            lanes=[
+                ("critical", int(os.getenv("REPORT_CRITICAL_SEVERITY", "8"))),
+                ("high", int(os.getenv("REPORT_HIGH_SEVERITY", "5"))),
+                ("low", 0),
+            ],
+            max_wait=float(os.getenv("REPORT_MAX_WAIT_SECONDS", "30")),
+            key_limit=int(os.getenv("REPORT_DEPT_CONCURRENCY", "2")),
+            name="report-dispatch",
+        )
+    return _scheduler
+
+
+def subscribe(session_id: str, callback: Callable[[Dict], None]):
+    """Call `callback(status)` from a worker thread when a report for the session is delivered"""
+    with _listeners_lock:
+        _listeners.setdefault(session_id, []).append(callback)
+
+
+def unsubscribe(session_id: str, callback: Callable[[Dict], None]):
+    with _listeners_lock:
+        callbacks = _listeners.get(session_id, [])
+        if callback in callbacks:
+            callbacks.remove(callback)
+        if not callbacks:
+            _listeners.pop(session_id, None)
+
+
+def _notify(session_id: str, status: Dict):
+    with _listeners_lock:
+        callbacks = list(_listeners.get(session_id, []))
+    for callback in callbacks:
+        try:
+            callback(status)
+        except Exception as e:
+            print(f"[ERROR] Report status listener failed: {e}")
+
+
+def deliver_report(report_data: Dict, webhook_data: Dict) -> Dict:
+    """Persist the report, send the webhook and tell listeners how it went"""
+    report_id = save_report(report_data)
+    # The department hears first; indexing and incident counting must not delay or block it
+    webhook_sent = send_webhook(webhook_data)
+    if report_id:
+        update_report_status(report_id, "dispatched" if webhook_sent else "webhook_failed")
+        try:
+            # Searchable right away in this worker; other workers pick it up on their next refresh
+            get_report_search().add(report_id, report_data)
+        except Exception as e:
+            print(f"[ERROR] Failed to index report {report_id} for search: {e}")
+        try:
+            # Several reports for one department and place within the window escalate as an incident
+            observe_report(report_data, report_id)
+        except Exception as e:
+            print(f"[ERROR] Failed to count report {report_id} for incidents: {e}")
+    status = {
+        "session_id": report_data.get("session_id"),
+        "report_id": report_id,
+        "saved": report_id is not None,
+        "webhook_sent": bool(webhook_sent),
+    }
+    _notify(report_data.get("session_id"), status)
+    return status
+
+
+def dispatch_report(report_data: Dict, webhook_data: Dict) -> concurrent.futures.Future:
+    """Deliver a completed report off the request path, most severe first"""
+    # Carry the tracing context so delivery spans join the request's trace
+    ctx = contextvars.copy_context()
+    return get_scheduler().submit(
+        ctx.run, deliver_report, report_data, webhook_data,
+        severity=int(report_data.get("severity_level") or 0),
+        key=report_data.get("department"),
+    )
+
+
+def stats() -> Dict:
+    return get_scheduler().stats()
+
+
+def drain():
+    """Wait for queued reports to be delivered (call on shutdown)"""
+    global _scheduler
+    if _scheduler is not None:
+        _scheduler.drain()
+        _scheduler = None
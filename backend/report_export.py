@@ -0,0 +1,164 @@
+import argparse
+import csv
+import io
+import json
+import os
+from datetime import datetime, timezone
+from typing import Dict, Iterable, Iterator, List, Optional
+
+from firebase_admin import firestore
+
+from batching import atomic_write
+from firebase_client import get_db
+
+EXPORT_FIELDS = ["report_id", "created_at", "department", "severity_level", "status", "location", "place_id", "issue_description", "session_id"]
+EXPORT_FORMATS = ["ndjson", "csv"]
+
+
+def parse_date(value: Optional[str]) -> Optional[datetime]:
+    """Parse an ISO date/datetime; naive values are taken as UTC"""
+    if not value:
+        return None
+    parsed = datetime.fromisoformat(value)
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed
+
+
+def iter_report_pages(
+    department: Optional[str] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    cursor: Optional[str] = None,
+    page_size: int = 500,
+) -> Iterator[List]:
+    """Yield pages of report snapshots ordered by (created_at, id); only one page is held at a time"""
+    db = get_db()
+    if not db:
+        return
+
+    collection = db.collection("reports")
+    query = collection
+    if department:
+        query = query.where(filter=firestore.FieldFilter("department", "==", department))
+    if since:
+        query = query.where(filter=firestore.FieldFilter("created_at", ">=", since))
+    if until:
+        query = query.where(filter=firestore.FieldFilter("created_at", "<", until))
+    # Document id ("__name__") breaks ties between reports saved in the same instant
+    query = query.order_by("created_at").order_by("__name__")
+
+    last = None
+    if cursor:
+        last = collection.document(cursor).get()
+        if not last.exists:
+            raise ValueError(f"Unknown cursor '{cursor}'")
+
+    while True:
+        page_query = query.limit(page_size)
+        if last is not None:
+            page_query = page_query.start_after(last)
+        docs = list(page_query.stream())
+        if docs:
+            yield docs
+        if len(docs) < page_size:
+            return
+        last = docs[-1]
+
+
+def report_row(doc) -> Dict:
+    """Flatten a report snapshot into an export row"""
+    data = doc.to_dict()
+    created_at = data.get("created_at")
+    return {
+        "report_id": doc.id,
+        "created_at": created_at.isoformat() if hasattr(created_at, "isoformat") else created_at,
+        "department": data.get("department", ""),
+        "severity_level": data.get("severity_level", 0),
+        "status": data.get("status", ""),
+        "location": data.get("location", ""),
+        "place_id": data.get("place_id") or "",
+        "issue_description": data.get("issue_description", ""),
+        "session_id": data.get("session_id", ""),
+    }
+
+
+def render_page(docs: List, fmt: str) -> str:
+    """Serialize one page; each row carries its own id, which doubles as the resume cursor"""
+    rows = [report_row(doc) for doc in docs]
+    if fmt == "csv":
+        buffer = io.StringIO()
+        writer = csv.DictWriter(buffer, fieldnames=EXPORT_FIELDS, extrasaction="ignore")
+        writer.writerows(rows)
+        return buffer.getvalue()
+    return "".join(json.dumps(row, ensure_ascii=False, default=str) + "\n" for row in rows)
+
+
+def csv_header() -> str:
+    buffer = io.StringIO()
+    csv.DictWriter(buffer, fieldnames=EXPORT_FIELDS).writeheader()
+    return buffer.getvalue()
+
+
+def stream_export(pages: Iterable[List], fmt: str = "ndjson", include_header: bool = True) -> Iterator[str]:
+    """Yield the export as text chunks, one chunk per page"""
+    if fmt == "csv" and include_header:
+        yield csv_header()
+    for docs in pages:
+        yield render_page(docs, fmt)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export Firestore reports as NDJSON or CSV")
+    parser.add_argument("--out", required=True, help="Output file")
+    parser.add_argument("--format", choices=EXPORT_FORMATS, default="ndjson")
+    parser.add_argument("--department", help="traffic, waste or green_energy")
+    parser.add_argument("--since", help="ISO date/datetime (inclusive)")
+    parser.add_argument("--until", help="ISO date/datetime (exclusive)")
+    parser.add_argument("--cursor", help="Resume after this report id")
+    parser.add_argument("--resume", action="store_true", help="Resume from the <out>.cursor checkpoint")
+    parser.add_argument("--page-size", type=int, default=500)
+    args = parser.parse_args()
+
+    checkpoint_path = f"{args.out}.cursor"
+    cursor = args.cursor
+    offset = None
+    if args.resume and os.path.exists(checkpoint_path):
+        with open(checkpoint_path) as f:
+            # "<last doc id> <output size>"; older checkpoints hold only the id
+            cursor, _, size = f.read().strip().partition(" ")
+            cursor = cursor or None
+            offset = int(size) if size else None
+    appending = bool(cursor) and os.path.exists(args.out)
+    if appending and offset is not None and os.path.getsize(args.out) > offset:
+        # A page written after the last checkpoint would otherwise be exported twice
+        with open(args.out, "r+b") as f:
+            f.truncate(offset)
+
+    filters = {
+        "department": args.department,
+        "since": parse_date(args.since),
+        "until": parse_date(args.until),
+        "cursor": cursor,
+        "page_size": args.page_size,
+    }
+
+    exported = 0
+    with open(args.out, "a" if appending else "w", encoding="utf-8", newline="") as out:
+        if args.format == "csv" and not appending:
+            out.write(csv_header())
+        for docs in iter_report_pages(**filters):
+            out.write(render_page(docs, args.format))
+            out.flush()
+            exported += len(docs)
+            # Checkpoint only after the page is on disk so a resume never skips rows; the size
+            # lets a resume cut off a page written after this checkpoint instead of repeating it
+            with atomic_write(checkpoint_path) as f:
+                f.write(f"{docs[-1].id} {out.tell()}")
+            print(f"Exported {exported} reports (cursor {docs[-1].id})")
+
+    print(f"[OK] Export finished: {exported} reports written to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
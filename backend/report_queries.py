@@ -0,0 +1,117 @@
+import base64
+import json
+import os
+from datetime import datetime
+from typing import Dict, Optional
+
+from firebase_admin import firestore
+
+from cache import TTLCache
+from firebase_client import get_db
+from report_export import report_row
+
+REPORT_STATUSES = ["submitted", "dispatched", "webhook_failed"]
+MIN_SEVERITY, MAX_SEVERITY = 1, 10
+
+
+def encode_cursor(created_at, report_id: str) -> str:
+    """Opaque page token: the sort key of the last report on the page"""
+    payload = {"t": created_at.isoformat() if hasattr(created_at, "isoformat") else created_at, "id": report_id}
+    return base64.urlsafe_b64encode(json.dumps(payload).encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Dict:
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        return {"created_at": datetime.fromisoformat(payload["t"]), "__name__": payload["id"]}
+    except Exception:
+        raise ValueError("Invalid cursor")
+
+
+def severity_values(min_severity: Optional[int], max_severity: Optional[int]) -> Optional[list]:
+    """Severity is a small integer, so a range becomes an `in` filter and keeps created_at free for ordering"""
+    low = MIN_SEVERITY if min_severity is None else min_severity
+    high = MAX_SEVERITY if max_severity is None else max_severity
+    if low < MIN_SEVERITY or high > MAX_SEVERITY or low > high:
+        raise ValueError(f"Severity range must be within {MIN_SEVERITY}-{MAX_SEVERITY} and min <= max")
+    if low == MIN_SEVERITY and high == MAX_SEVERITY:
+        return None
+    return list(range(low, high + 1))
+
+
+class ReportQueryService:
+    """Filtered, cursor-paginated reads of the reports collection with a short-lived page cache"""
+
+    def __init__(self, cache_ttl: float = 5.0, cache_size: int = 256):
+        self._pages = TTLCache(max_items=cache_size, ttl=cache_ttl)
+
+    def query(
+        self,
+        department: Optional[str] = None,
+        min_severity: Optional[int] = None,
+        max_severity: Optional[int] = None,
+        status: Optional[str] = None,
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None,
+        cursor: Optional[str] = None,
+        limit: int = 50,
+    ) -> Dict:
+        if status and status not in REPORT_STATUSES:
+            raise ValueError(f"status must be one of {REPORT_STATUSES}")
+        severities = severity_values(min_severity, max_severity)
+        start_after = decode_cursor(cursor) if cursor else None
+
+        cache_key = (department, tuple(severities or ()), status, since, until, cursor, limit)
+        page = self._pages.get(cache_key)
+        if page is not None:
+            return page
+
+        db = get_db()
+        if not db:
+            return {"reports": [], "next_cursor": None}
+
+        # Every filter combination here is backed by a composite index in firestore.indexes.json
+        query = db.collection("reports")
+        if department:
+            query = query.where(filter=firestore.FieldFilter("department", "==", department))
+        if status:
+            query = query.where(filter=firestore.FieldFilter("status", "==", status))
+        if severities:
+            query = query.where(filter=firestore.FieldFilter("severity_level", "in", severities))
+        if since:
+            query = query.where(filter=firestore.FieldFilter("created_at", ">=", since))
+        if until:
+            query = query.where(filter=firestore.FieldFilter("created_at", "<", until))
+        query = (query.order_by("created_at", direction=firestore.Query.DESCENDING)
+                 .order_by("__name__", direction=firestore.Query.DESCENDING))
+        if start_after:
+            query = query.start_after(start_after)
+
+        # One extra document tells us whether another page exists
+        docs = list(query.limit(limit + 1).stream())
+        has_more = len(docs) > limit
+        docs = docs[:limit]
+        rows = [report_row(doc) for doc in docs]
+
+        page = {
+            "reports": rows,
+            "next_cursor": encode_cursor(docs[-1].to_dict().get("created_at"), docs[-1].id) if has_more else None,
+        }
+        self._pages.set(cache_key, page)
+        return page
+
+    def stats(self) -> Dict:
+        return self._pages.stats()
+
+
+_report_queries = None
+
+def get_report_queries() -> ReportQueryService:
+    """Get or create the report query service"""
+    global _report_queries
+    if _report_queries is None:
+        _report_queries = ReportQueryService(
+            cache_ttl=float(os.getenv("REPORTS_CACHE_TTL", "5")),
+            cache_size=int(os.getenv("REPORTS_CACHE_SIZE", "256")),
+        )
+    return _report_queries
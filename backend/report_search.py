@@ -0,0 +1,348 @@
+import argparse
+import json
+import math
+import os
+import re
+import threading
+import time
+from array import array
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from batching import atomic_write
+
+DEFAULT_SNAPSHOT_PATH = "data/report_search.npz"
+DEPARTMENT_CODES = ["traffic", "waste", "green_energy"]
+NO_DEPARTMENT = 255
+
+# BM25 parameters; location terms count twice so "MG Road" outranks a passing mention
+K1, B = 1.2, 0.75
+LOCATION_WEIGHT = 2
+
+STOPWORDS = {
+    "a", "an", "and", "are", "at", "be", "been", "by", "for", "from", "has", "have", "in", "is", "it",
+    "its", "near", "of", "on", "or", "the", "there", "this", "to", "very", "was", "with",
+}
+_TOKEN = re.compile(r"[a-z0-9]+")
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase word tokens; dots are dropped first so "M.G. Road" -> ["mg", "road"]"""
+    tokens = []
+    for token in _TOKEN.findall((text or "").lower().replace(".", "")):
+        if token in STOPWORDS:
+            continue
+        # Light plural folding: lights -> light, potholes -> pothole
+        if len(token) > 3 and token.endswith("s") and not token.endswith("ss"):
+            token = token[:-1]
+        tokens.append(token)
+    return tokens
+
+
+def _iso(value) -> Optional[str]:
+    return value.isoformat() if hasattr(value, "isoformat") else value
+
+
+class ReportSearchIndex:
+    """In-memory inverted index over report issue descriptions and locations, ranked with BM25.
+
+    Postings are append-only arrays (doc number, term frequency) so adding a report is
+    O(terms in the report); scoring views them as NumPy arrays without copying.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._postings: Dict[str, tuple] = {}
+        self._report_ids: List[str] = []
+        self._positions: Dict[str, int] = {}
+        self._doc_len = array("I")
+        self._doc_dept = array("B")
+        self._docs: List[tuple] = []  # (department, severity_level, created_at, location, issue_description)
+        self._total_len = 0
+        self.watermark: Optional[str] = None  # newest Firestore created_at indexed
+        self.dirty = False
+
+    def __len__(self):
+        return len(self._report_ids)
+
+    def add(self, report_id: str, report: Dict) -> bool:
+        """Index one report; False if it is already indexed"""
+        location = report.get("location") or ""
+        issue = report.get("issue_description") or ""
+        counts: Dict[str, int] = {}
+        for token in tokenize(issue):
+            counts[token] = counts.get(token, 0) + 1
+        for token in tokenize(location):
+            counts[token] = counts.get(token, 0) + LOCATION_WEIGHT
+
+        created_at = report.get("created_at")
+        if not isinstance(created_at, (datetime, str)):
+            created_at = datetime.now(timezone.utc)  # SERVER_TIMESTAMP sentinel: not known locally
+        department = report.get("department") or ""
+
+        with self._lock:
+            if report_id in self._positions:
+                return False
+            doc = len(self._report_ids)
+            self._report_ids.append(report_id)
+            self._positions[report_id] = doc
+            length = sum(counts.values())
+            self._doc_len.append(length)
+            self._total_len += length
+            self._doc_dept.append(DEPARTMENT_CODES.index(department) if department in DEPARTMENT_CODES else NO_DEPARTMENT)
+            self._docs.append((department, report.get("severity_level", 0), _iso(created_at), location, issue))
+            for token, tf in counts.items():
+                postings = self._postings.get(token)
+                if postings is None:
+                    postings = self._postings[token] = (array("I"), array("H"))
+                postings[0].append(doc)
+                postings[1].append(min(tf, 65535))
+            self.dirty = True
+        return True
+
+    def search(self, query: str, limit: int = 20, department: Optional[str] = None) -> List[Dict]:
+        terms = list(dict.fromkeys(tokenize(query)))
+        if not terms:
+            return []
+        with self._lock:
+            n = len(self._report_ids)
+            if n == 0:
+                return []
+            avg_len = self._total_len / n or 1.0
+            doc_len = np.frombuffer(self._doc_len, dtype=np.uint32)
+            scores = np.zeros(n, dtype=np.float32)
+            for term in terms:
+                postings = self._postings.get(term)
+                if postings is None:
+                    continue
+                docs = np.frombuffer(postings[0], dtype=np.uint32)
+                tf = np.frombuffer(postings[1], dtype=np.uint16).astype(np.float32)
+                idf = math.log(1 + (n - len(docs) + 0.5) / (len(docs) + 0.5))
+                norm = K1 * (1 - B + B * doc_len[docs] / avg_len)
+                # A document appears once per term's postings, so plain fancy-index add is safe
+                scores[docs] += idf * tf * (K1 + 1) / (tf + norm)
+            if department:
+                code = DEPARTMENT_CODES.index(department) if department in DEPARTMENT_CODES else NO_DEPARTMENT
+                scores[np.frombuffer(self._doc_dept, dtype=np.uint8) != code] = 0
+
+            matched = np.flatnonzero(scores)
+            if len(matched) > limit:
+                matched = matched[np.argpartition(-scores[matched], limit - 1)[:limit]]
+            matched = matched[np.argsort(-scores[matched], kind="stable")]
+
+            results = []
+            for doc in matched:
+                dept, severity, created_at, location, issue = self._docs[doc]
+                results.append({
+                    "report_id": self._report_ids[doc],
+                    "score": round(float(scores[doc]), 4),
+                    "department": dept,
+                    "severity_level": severity,
+                    "created_at": created_at,
+                    "location": location,
+                    "issue_description": issue,
+                })
+            return results
+
+    def add_from_firestore(self, since: Optional[datetime] = None, page_size: int = 500) -> int:
+        """Index reports created at or after `since` (all reports when None); returns how many were new"""
+        from report_export import iter_report_pages
+
+        added = 0
+        for docs in iter_report_pages(since=since, page_size=page_size):
+            for doc in docs:
+                data = doc.to_dict()
+                added += self.add(doc.id, data)
+                created_at = _iso(data.get("created_at"))
+                if created_at and (self.watermark is None or created_at > self.watermark):
+                    self.watermark = created_at
+        return added
+
+    def save(self, path: str):
+        """Write a compact snapshot (flat NumPy arrays, loaded without re-tokenizing)"""
+        with self._lock:
+            terms = list(self._postings)
+            offsets = np.zeros(len(terms) + 1, dtype=np.uint64)
+            for i, term in enumerate(terms):
+                offsets[i + 1] = offsets[i] + len(self._postings[term][0])
+            header = {"report_ids": self._report_ids, "docs": self._docs, "watermark": self.watermark}
+            arrays = {
+                "terms": np.frombuffer("\n".join(terms).encode(), dtype=np.uint8),
+                "offsets": offsets,
+                "docs": np.concatenate([np.frombuffer(self._postings[t][0], dtype=np.uint32) for t in terms]) if terms else np.zeros(0, np.uint32),
+                "tfs": np.concatenate([np.frombuffer(self._postings[t][1], dtype=np.uint16) for t in terms]) if terms else np.zeros(0, np.uint16),
+                "doc_len": np.array(self._doc_len, dtype=np.uint32),
+                "doc_dept": np.array(self._doc_dept, dtype=np.uint8),
+                "header": np.frombuffer(json.dumps(header, default=str).encode(), dtype=np.uint8),
+            }
+            self.dirty = False
+
+        # Workers may save at the same time; the last rename wins
+        with atomic_write(path, "wb") as f:
+            np.savez(f, **arrays)
+
+    @classmethod
+    def load(cls, path: str) -> "ReportSearchIndex":
+        index = cls()
+        with np.load(path) as data:
+            header = json.loads(data["header"].tobytes())
+            raw_terms = data["terms"].tobytes().decode()
+            terms = raw_terms.split("\n") if raw_terms else []
+            offsets, docs, tfs = data["offsets"], data["docs"], data["tfs"]
+            for i, term in enumerate(terms):
+                start, end = int(offsets[i]), int(offsets[i + 1])
+                postings = (array("I"), array("H"))
+                postings[0].frombytes(docs[start:end].tobytes())
+                postings[1].frombytes(tfs[start:end].tobytes())
+                index._postings[term] = postings
+            index._doc_len.frombytes(data["doc_len"].tobytes())
+            index._doc_dept.frombytes(data["doc_dept"].tobytes())
+        index._report_ids = header["report_ids"]
+        index._positions = {report_id: i for i, report_id in enumerate(index._report_ids)}
+        index._docs = [tuple(doc) for doc in header["docs"]]
+        index._total_len = int(sum(index._doc_len))
+        index.watermark = header["watermark"]
+        return index
+
+
+class ReportSearch:
+    """The process-wide index: snapshot on start, incremental adds, periodic catch-up from Firestore.
+
+    The snapshot load and first catch-up run in a background thread (start()), so callers never
+    wait on them; reports added meanwhile are buffered and indexed once the snapshot is in.
+    """
+
+    def __init__(self, snapshot_path: str, refresh_interval: float = 30.0):
+        self.snapshot_path = snapshot_path
+        self.refresh_interval = refresh_interval
+        self._last_refresh = 0.0
+        self._refreshing = threading.Lock()
+        self.index = ReportSearchIndex()
+        self._loaded = False
+        self._pending: List[tuple] = []
+        self._pending_lock = threading.Lock()
+        self._ready = threading.Event()
+
+    def start(self):
+        threading.Thread(target=self._build, name="report-search-build", daemon=True).start()
+
+    def _build(self):
+        index = ReportSearchIndex()
+        if os.path.exists(self.snapshot_path):
+            try:
+                index = ReportSearchIndex.load(self.snapshot_path)
+            except Exception as e:
+                print(f"Warning: could not load search snapshot '{self.snapshot_path}': {e}. Rebuilding.")
+        with self._pending_lock:
+            for report_id, report in self._pending:
+                index.add(report_id, report)
+            self._pending = []
+            self.index = index
+            self._loaded = True
+        self.refresh()
+        self._ready.set()
+
+    def wait_ready(self, timeout: Optional[float] = None) -> bool:
+        return self._ready.wait(timeout)
+
+    @property
+    def ready(self) -> bool:
+        return self._ready.is_set()
+
+    def refresh(self):
+        """Index reports saved since the watermark (by any worker or instance)"""
+        if not self._refreshing.acquire(blocking=False):
+            return
+        try:
+            since = datetime.fromisoformat(self.index.watermark) if self.index.watermark else None
+            added = self.index.add_from_firestore(since=since)
+            if added:
+                print(f"[OK] Search index caught up: {added} new reports ({len(self.index)} total)")
+        except Exception as e:
+            print(f"[ERROR] Search index refresh failed: {e}")
+        finally:
+            self._last_refresh = time.monotonic()
+            self._refreshing.release()
+
+    def add(self, report_id: str, report: Dict):
+        if not self._loaded:
+            with self._pending_lock:
+                if not self._loaded:
+                    self._pending.append((report_id, report))
+                    return
+        self.index.add(report_id, report)
+
+    def search(self, query: str, limit: int = 20, department: Optional[str] = None) -> List[Dict]:
+        # Pick up reports saved by other workers in the background; never block the query
+        if self.ready and time.monotonic() - self._last_refresh > self.refresh_interval and not self._refreshing.locked():
+            self._last_refresh = time.monotonic()
+            threading.Thread(target=self.refresh, name="report-search-refresh", daemon=True).start()
+        return self.index.search(query, limit=limit, department=department)
+
+    def save(self):
+        if self._loaded and self.index.dirty:
+            self.index.save(self.snapshot_path)
+
+    def stats(self) -> Dict:
+        return {"ready": self.ready, "reports": len(self.index), "terms": len(self.index._postings),
+                "pending": len(self._pending), "watermark": self.index.watermark}
+
+
+_report_search = None
+_report_search_lock = threading.Lock()
+
+def get_report_search() -> ReportSearch:
+    """Get or create the search index; it is built in the background, so this never blocks"""
+    global _report_search
+    with _report_search_lock:
+        if _report_search is None:
+            _report_search = ReportSearch(
+                os.getenv("REPORT_SEARCH_SNAPSHOT", DEFAULT_SNAPSHOT_PATH),
+                refresh_interval=float(os.getenv("REPORT_SEARCH_REFRESH_SECONDS", "30")),
+            )
+            _report_search.start()
+    return _report_search
+
+
+def warm_up_report_search():
+    """Give the background build a bounded head start before traffic arrives"""
+    if not get_report_search().wait_ready(timeout=float(os.getenv("REPORT_SEARCH_WARMUP_SECONDS", "20"))):
+        raise RuntimeError("Search index is still building; searches return partial results until it finishes")
+
+
+def save_report_search():
+    """Persist the snapshot if anything was indexed (call on shutdown)"""
+    if _report_search is not None:
+        _report_search.save()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build or query the report search index")
+    parser.add_argument("query", nargs="?", help="Search terms, e.g. \"streetlight MG Road\"")
+    parser.add_argument("--rebuild", action="store_true", help="Index every report in Firestore and write the snapshot")
+    parser.add_argument("--department", choices=DEPARTMENT_CODES)
+    parser.add_argument("--limit", type=int, default=10)
+    args = parser.parse_args()
+
+    path = os.getenv("REPORT_SEARCH_SNAPSHOT", DEFAULT_SNAPSHOT_PATH)
+    if args.rebuild:
+        index = ReportSearchIndex()
+        started = time.perf_counter()
+        index.add_from_firestore()
+        index.save(path)
+        print(f"[OK] Indexed {len(index)} reports in {time.perf_counter() - started:.1f}s -> {path}")
+    if args.query:
+        search = get_report_search()
+        search.wait_ready()
+        started = time.perf_counter()
+        results = search.search(args.query, limit=args.limit, department=args.department)
+        print(f"{len(results)} results in {(time.perf_counter() - started) * 1000:.2f} ms")
+        for result in results:
+            print(f"{result['score']:7.3f}  {result['department']:<12} {result['location']} | {result['issue_description']}")
+        search.save()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+import importlib.util
+import os
+import sys
+
+from uvicorn.workers import UvicornWorker
+
+
+def available_cpus() -> int:
+    """Cores this process may actually use: CPU affinity, capped by a cgroup CPU quota (containers)"""
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:
+        cpus = os.cpu_count() or 1
+
+    quota = None
+    try:
+        # cgroup v2: "<quota> <period>" or "max <period>"
+        with open("/sys/fs/cgroup/cpu.max") as f:
+            limit, period = f.read().split()
+            if limit != "max":
+                quota = int(limit) / int(period)
+    except (OSError, ValueError):
+        try:
+            # cgroup v1
+            with open("/sys/fs/cgroup/cpu/cpu.cfs_quota_us") as f:
+                limit = int(f.read())
+            with open("/sys/fs/cgroup/cpu/cpu.cfs_period_us") as f:
+                period = int(f.read())
+            if limit > 0:
+                quota = limit / period
+        except (OSError, ValueError):
+            pass
+
+    if quota is not None:
+        cpus = min(cpus, max(1, int(quota)))
+    return max(1, cpus)
+
+
+def worker_count() -> int:
+    """WEB_CONCURRENCY if set, otherwise one worker per available core"""
+    configured = os.getenv("WEB_CONCURRENCY")
+    if configured:
+        return max(1, int(configured))
+    return available_cpus()
+
+
+def graceful_timeout() -> int:
+    return int(os.getenv("GRACEFUL_TIMEOUT", "30"))
+
+
+class TunedUvicornWorker(UvicornWorker):
+    """Uvicorn worker on uvloop + httptools (when installed) with a bounded graceful shutdown.
+
+    On SIGTERM the worker stops accepting, gives in-flight requests two thirds of
+    GRACEFUL_TIMEOUT to finish, then runs the lifespan shutdown (report dispatch and
+    batch buffers are drained) before gunicorn's own timeout kills it.
+    """
+
+    CONFIG_KWARGS = {
+        "loop": "uvloop" if importlib.util.find_spec("uvloop") else "asyncio",
+        "http": "httptools" if importlib.util.find_spec("httptools") else "h11",
+        "lifespan": "on",
+        "timeout_graceful_shutdown": max(1, graceful_timeout() * 2 // 3),
+    }
+
+
+def main():
+    """Run the production server: gunicorn with the settings in gunicorn.conf.py"""
+    here = os.path.dirname(os.path.abspath(__file__))
+    os.chdir(here)
+    args = ["gunicorn", "-c", "gunicorn.conf.py", "main:app"] + sys.argv[1:]
+    os.execvp(sys.executable, [sys.executable, "-m"] + args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+Test admission control: per-client token buckets and the global in-flight cap.
+"""
+
+import asyncio
+import sys
+sys.path.insert(0, '.')
+
+from admission import AdmissionController, AdmissionRejected, TokenBucket
+
+
+def test_token_bucket():
+    """Burst is allowed, then requests wait for refill"""
+    bucket = TokenBucket(rate=2.0, capacity=3)
+    now = bucket.updated
+
+    assert bucket.take(now) == 0
+    assert bucket.take(now) == 0
+    assert bucket.take(now) == 0
+    wait = bucket.take(now)
+    assert 0.4 < wait <= 0.5, f"Expected ~0.5s wait, got {wait}"
+
+    # Half a second later one token is back
+    assert bucket.take(now + 0.5) == 0
+
+
+def test_rate_limit_rejects_with_retry_after():
+    """A client over its budget gets a 429, other clients are unaffected"""
+    async def run():
+        admission = AdmissionController(rate=0.5, burst=2, max_in_flight=10)
+        for _ in range(2):
+            await admission.acquire("client-a")
+            admission.release()
+
+        try:
+            await admission.acquire("client-a")
+            assert False, "Third request should be rate limited"
+        except AdmissionRejected as e:
+            assert e.status_code == 429
+            assert e.retry_after >= 1
+
+        await admission.acquire("client-b")
+        admission.release()
+        assert admission.stats()["rejected"]["rate_limited"] == 1
+
+    asyncio.run(run())
+
+
+def test_queue_timeout_and_queue_full():
+    """Requests beyond the in-flight cap wait briefly, then get a 503"""
+    async def run():
+        admission = AdmissionController(rate=100, burst=100, max_in_flight=1,
+                                        max_queue_depth=1, max_queue_wait=0.05)
+        await admission.acquire("a")
+
+        waiter = asyncio.ensure_future(admission.acquire("b"))
+        await asyncio.sleep(0)
+        assert admission.stats()["queue_depth"] == 1
+
+        # Queue is full - shed immediately
+        try:
+            await admission.acquire("c")
+            assert False, "Queue should be full"
+        except AdmissionRejected as e:
+            assert e.status_code == 503
+
+        # The queued request times out
+        try:
+            await waiter
+            assert False, "Queued request should time out"
+        except AdmissionRejected as e:
+            assert e.status_code == 503
+
+        admission.release()
+        stats = admission.stats()
+        assert stats["in_flight"] == 0
+        assert stats["queue_depth"] == 0
+        assert stats["rejected"]["queue_full"] == 1
+        assert stats["rejected"]["queue_timeout"] == 1
+
+    asyncio.run(run())
+
+
+def test_queued_request_admitted_on_release():
+    """A waiting request is admitted as soon as a slot frees up"""
+    async def run():
+        admission = AdmissionController(rate=100, burst=100, max_in_flight=1, max_queue_wait=1.0)
+        await admission.acquire("a")
+        waiter = asyncio.ensure_future(admission.acquire("b"))
+        await asyncio.sleep(0)
+        admission.release()
+        await waiter
+        assert admission.stats()["in_flight"] == 1
+        admission.release()
+
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    test_token_bucket()
+    test_rate_limit_rejects_with_retry_after()
+    test_queue_timeout_and_queue_full()
+    test_queued_request_admitted_on_release()
+    print("✓ ALL ADMISSION TESTS PASSED!")
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+Test the batch buffer (bounded queue, retries) and the shared file helpers.
+"""
+
+import json
+import os
+import sys
+import tempfile
+sys.path.insert(0, '.')
+
+from batching import BatchBuffer, append_jsonl, atomic_write
+
+
+def test_full_buffer_drops_oldest():
+    written = []
+    buffer = BatchBuffer(written.extend, max_items=100, flush_interval=60, max_pending=3, name="test-bounded")
+    for i in range(5):
+        buffer.add(i)
+    buffer.close()
+    assert written == [2, 3, 4] and buffer.dropped == 2
+
+
+def test_failed_flush_is_retried_in_order():
+    written, failures = [], [RuntimeError("disk full")] * 2
+
+    def flaky(items):
+        if failures:
+            raise failures.pop()
+        written.extend(items)
+
+    buffer = BatchBuffer(flaky, max_items=100, flush_interval=60, name="test-retry")
+    buffer.add(1)
+    buffer.add(2)
+    assert buffer.flush() is False
+    buffer.add(3)
+    assert buffer.flush() is False
+    assert buffer.pending() == 3
+    assert buffer.flush() is True
+    buffer.close()
+    assert written == [1, 2, 3]
+    assert buffer.flushed == 3 and buffer.dropped == 0
+
+
+def test_batch_is_dropped_after_max_retries():
+    def broken(items):
+        raise RuntimeError("collector down")
+
+    buffer = BatchBuffer(broken, max_items=100, flush_interval=60, max_retries=2, name="test-drop")
+    buffer.add("a")
+    buffer.add("b")
+    buffer.close()  # one attempt per retry, then the batch is given up
+    assert buffer.pending() == 0
+    assert buffer.dropped == 2 and buffer.flushed == 0
+
+
+def test_append_jsonl_appends_lines():
+    path = os.path.join(tempfile.mkdtemp(), "logs", "events.jsonl")
+    append_jsonl(path, [{"a": 1}, {"b": 2}])
+    append_jsonl(path, [{"c": 3}])
+    with open(path) as f:
+        assert [json.loads(line) for line in f] == [{"a": 1}, {"b": 2}, {"c": 3}]
+
+
+def test_atomic_write_replaces_only_on_success():
+    tmp = tempfile.mkdtemp()
+    path = os.path.join(tmp, "state.json")
+    with atomic_write(path) as f:
+        json.dump({"version": 1}, f)
+
+    try:
+        with atomic_write(path) as f:
+            f.write("{\"version\": ")
+            raise RuntimeError("crashed mid-write")
+    except RuntimeError:
+        pass
+
+    with open(path) as f:
+        assert json.load(f) == {"version": 1}
+    assert os.listdir(tmp) == ["state.json"]  # no temporary file left behind
+
+
+if __name__ == "__main__":
+    test_full_buffer_drops_oldest()
+    test_failed_flush_is_retried_in_order()
+    test_batch_is_dropped_after_max_retries()
+    test_append_jsonl_appends_lines()
+    test_atomic_write_replaces_only_on_success()
+    print("✓ ALL BATCHING TESTS PASSED!")
@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+Test the severity-aware report dispatch scheduler.
+"""
+
+import sys
+import threading
+import time
+sys.path.insert(0, '.')
+
+from dispatch_scheduler import PriorityScheduler
+
+
+def _blocked_scheduler(**kwargs):
+    """A one-worker scheduler whose worker is busy until the returned event is set"""
+    scheduler = PriorityScheduler(workers=1, **kwargs)
+    gate = threading.Event()
+    started = threading.Event()
+
+    def block():
+        started.set()
+        gate.wait(5)
+
+    scheduler.submit(block, severity=10)
+    started.wait(5)
+    return scheduler, gate
+
+
+def test_critical_reports_jump_the_queue():
+    scheduler, gate = _blocked_scheduler()
+    order = []
+    futures = [
+        scheduler.submit(order.append, "low-1", severity=2),
+        scheduler.submit(order.append, "high", severity=6),
+        scheduler.submit(order.append, "low-2", severity=3),
+        scheduler.submit(order.append, "critical", severity=9),
+    ]
+    gate.set()
+    for f in futures:
+        f.result(timeout=5)
+    scheduler.drain()
+    assert order == ["critical", "high", "low-1", "low-2"], order
+
+    lanes = scheduler.stats()["lanes"]
+    assert lanes["critical"]["started"] == 2  # includes the blocking job
+    assert lanes["low"]["queued"] == 0
+    assert lanes["low"]["wait_ms"]["max"] > 0
+
+
+def test_aging_prevents_starvation():
+    """A low-severity report that waited past max_wait is served before fresh critical ones"""
+    scheduler, gate = _blocked_scheduler(max_wait=0.05)
+    order = []
+    old = scheduler.submit(order.append, "old-low", severity=1)
+    time.sleep(0.1)
+    fresh = scheduler.submit(order.append, "fresh-critical", severity=10)
+    gate.set()
+    old.result(timeout=5)
+    fresh.result(timeout=5)
+    scheduler.drain()
+    assert order == ["old-low", "fresh-critical"], order
+    assert scheduler.stats()["lanes"]["low"]["promoted_by_aging"] == 1
+
+
+def test_department_concurrency_limit():
+    """A saturated department does not block other departments"""
+    scheduler = PriorityScheduler(workers=3, key_limit=1)
+    gate = threading.Event()
+    running = []
+    lock = threading.Lock()
+
+    def job(name):
+        with lock:
+            running.append(name)
+        gate.wait(5)
+
+    scheduler.submit(job, "waste-1", severity=9, key="waste")
+    scheduler.submit(job, "waste-2", severity=9, key="waste")
+    scheduler.submit(job, "traffic-1", severity=1, key="traffic")
+    time.sleep(0.1)
+    with lock:
+        assert sorted(running) == ["traffic-1", "waste-1"], running
+    assert scheduler.stats()["running_by_key"] == {"waste": 1, "traffic": 1}
+
+    gate.set()
+    scheduler.drain()
+    assert sorted(running) == ["traffic-1", "waste-1", "waste-2"]
+
+
+def test_exceptions_reach_the_future():
+    scheduler = PriorityScheduler(workers=1)
+
+    def fail():
+        raise ValueError("boom")
+
+    future = scheduler.submit(fail, severity=5)
+    try:
+        future.result(timeout=5)
+        assert False, "Exception should propagate"
+    except ValueError:
+        pass
+    scheduler.drain()
+
+
+if __name__ == "__main__":
+    test_critical_reports_jump_the_queue()
+    test_aging_prevents_starvation()
+    test_department_concurrency_limit()
+    test_exceptions_reach_the_future()
+    print("✓ ALL SCHEDULER TESTS PASSED!")
@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""
+Test gazetteer building, normalization and memory-mapped lookups.
+"""
+
+import os
+import random
+import string
+import sys
+import tempfile
+import time
+sys.path.insert(0, '.')
+
+import gazetteer as gazetteer_module
+from gazetteer import Gazetteer, build, normalize, read_source, edit_distance, DEFAULT_SOURCE_PATH
+
+_path = os.path.join(tempfile.mkdtemp(), "gazetteer.bin")
+build(read_source(DEFAULT_SOURCE_PATH), _path)
+gazetteer = Gazetteer(_path)
+
+
+def test_normalize():
+    assert normalize("M.G. Road") == "mg road"
+    assert normalize("near MG rd") == "mg road"
+    assert normalize("Opp. the Railway Stn") == "railway station"
+    assert normalize("  ") == ""
+
+
+def test_variants_share_one_place():
+    """The three spellings from intake all resolve to the same place_id"""
+    ids = {gazetteer.lookup(text).place_id for text in ["near MG rd", "M.G. Road", "mg road junction"]}
+    assert ids == {"st-mg-road"}
+    assert gazetteer.lookup("Mahatma Gandhi Road").name == "MG Road"
+    assert gazetteer.lookup("mg road junction").method == "partial"
+
+
+def test_aliases_and_fuzzy():
+    assert gazetteer.lookup("Sindhi Camp").place_id == "lm-central-bus-stand"
+    match = gazetteer.lookup("hawa mahl")
+    assert match.place_id == "lm-hawa-mahal" and match.method == "fuzzy" and match.distance == 1
+    assert gazetteer.lookup("nowhere lane") is None
+    assert gazetteer.lookup("malviya nagr").place_id == "ar-malviya-nagar"
+    assert edit_distance("kitten", "sitting", 5) == 3
+    assert edit_distance("kitten", "sitting", 1) == 2  # gives up past the limit
+
+
+def test_generic_suffix_does_not_carry_a_match():
+    """A shared "road" is not a near-match: the names themselves must be close"""
+    for text in ["main road", "mill road", "tank road", "road", "the junction"]:
+        assert gazetteer.lookup(text) is None, (text, gazetteer.lookup(text))
+    assert gazetteer.lookup("Tonk Road").place_id == "st-tonk-road"
+
+
+def test_fuzzy_miss_is_indexed():
+    """A miss on a large gazetteer is a few index probes, not a scan of the keys"""
+    rng = random.Random(7)
+
+    def word():
+        return "".join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(4, 10)))
+
+    rows = [(f"p{i}", f"{word()} {word()} road", "street", []) for i in range(5000)]
+    path = os.path.join(tempfile.mkdtemp(), "large.bin")
+    build(iter(rows), path)
+    large = Gazetteer(path)
+    name = rows[42][1]
+    assert large.lookup(name[:2] + name[3:]).place_id == "p42"
+
+    queries = [f"{word()} {word()} road" for _ in range(200)]
+    started = time.perf_counter()
+    for query in queries:
+        large.lookup(query)
+    per_lookup_us = (time.perf_counter() - started) / len(queries) * 1e6
+    large.close()
+    assert per_lookup_us < 2000, f"{per_lookup_us:.0f} µs per miss"
+
+
+def test_prefix_search():
+    names = [m.name for m in gazetteer.prefix("ja", limit=5)]
+    assert names == ["Railway Station", "Jal Mahal", "JLN Marg"]
+    assert gazetteer.prefix("zzz") == []
+
+
+def test_lookup_is_microseconds():
+    started = time.perf_counter()
+    for _ in range(1000):
+        gazetteer.lookup("near MG rd")
+    per_lookup_us = (time.perf_counter() - started) * 1000
+    assert per_lookup_us < 500, f"{per_lookup_us:.0f} µs per lookup"
+
+
+def test_rejects_other_files():
+    path = os.path.join(tempfile.mkdtemp(), "not_a_gazetteer.bin")
+    with open(path, "wb") as f:
+        f.write(b"\0" * 64)
+    try:
+        Gazetteer(path)
+        assert False, "Should reject a file without the magic header"
+    except ValueError:
+        pass
+
+
+def test_unloadable_file_disables_lookups():
+    """A stale or truncated gazetteer is logged and skipped instead of failing every report"""
+    tmp = tempfile.mkdtemp()
+    stale, truncated = os.path.join(tmp, "stale.bin"), os.path.join(tmp, "truncated.bin")
+    with open(stale, "wb") as f:
+        f.write(b"GAZ1" + b"\0" * 64)
+    with open(_path, "rb") as src, open(truncated, "wb") as f:
+        f.write(src.read()[:256])
+
+    for path in (stale, truncated):
+        os.environ["GAZETTEER_PATH"] = path
+        gazetteer_module._gazetteer, gazetteer_module._gazetteer_loaded = None, False
+        try:
+            assert gazetteer_module.get_gazetteer() is None
+            assert gazetteer_module.resolve_place("MG Road") is None
+        finally:
+            del os.environ["GAZETTEER_PATH"]
+            gazetteer_module._gazetteer, gazetteer_module._gazetteer_loaded = None, False
+
+
+if __name__ == "__main__":
+    test_normalize()
+    test_variants_share_one_place()
+    test_aliases_and_fuzzy()
+    test_generic_suffix_does_not_carry_a_match()
+    test_fuzzy_miss_is_indexed()
+    test_prefix_search()
+    test_lookup_is_microseconds()
+    test_rejects_other_files()
+    test_unloadable_file_disables_lookups()
+    print("✓ ALL GAZETTEER TESTS PASSED!")
@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+"""
+Test Idempotency-Key handling: replay, conflicts and concurrent retries.
+"""
+
+import asyncio
+import sys
+import time
+sys.path.insert(0, '.')
+
+from google.api_core.exceptions import AlreadyExists, FailedPrecondition
+
+import idempotency
+from cache import TTLCache
+from idempotency import IdempotencyCache, IdempotencyConflict, IdempotencyInFlight, request_fingerprint
+
+
+def test_ttl_cache_expiry_and_lru():
+    cache = TTLCache(max_items=2, ttl=0.05)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1
+    cache.set("c", 3)  # evicts "b", the least recently used
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    time.sleep(0.06)
+    assert cache.get("a") is None
+
+
+def test_repeated_key_replays_response():
+    async def run():
+        cache = IdempotencyCache(use_store=False)
+        fp = request_fingerprint("session-1", "near railway station")
+        assert await cache.begin("key-1", fp) is None
+        await cache.complete("key-1", fp, {"response": "submitted", "status": "complete"})
+
+        replay = await cache.begin("key-1", fp)
+        assert replay == {"response": "submitted", "status": "complete"}
+        assert cache.stats()["replayed"] == 1
+
+        try:
+            await cache.begin("key-1", request_fingerprint("session-1", "something else"))
+            assert False, "Different payload should conflict"
+        except IdempotencyConflict:
+            pass
+
+    asyncio.run(run())
+
+
+def test_concurrent_retry_waits_for_original():
+    """A retry that arrives while the original is still running gets its response"""
+    async def run():
+        cache = IdempotencyCache(use_store=False)
+        fp = request_fingerprint(None, "hi")
+        assert await cache.begin("key-2", fp) is None
+
+        retry = asyncio.ensure_future(cache.begin("key-2", fp))
+        await asyncio.sleep(0)
+        assert not retry.done()
+
+        await cache.complete("key-2", fp, {"response": "hello"})
+        assert await retry == {"response": "hello"}
+
+    asyncio.run(run())
+
+
+def test_abandoned_key_lets_retry_run():
+    async def run():
+        cache = IdempotencyCache(use_store=False)
+        fp = request_fingerprint(None, "hi")
+        assert await cache.begin("key-3", fp) is None
+        retry = asyncio.ensure_future(cache.begin("key-3", fp))
+        await asyncio.sleep(0)
+
+        await cache.abandon("key-3")
+        # The retry now owns the key and must execute
+        assert await retry is None
+        await cache.complete("key-3", fp, {"response": "second try"})
+        await cache.abandon("key-3")  # no-op after complete
+        assert await cache.begin("key-3", fp) == {"response": "second try"}
+
+    asyncio.run(run())
+
+
+def test_only_one_waiter_runs_after_abandon():
+    async def run():
+        cache = IdempotencyCache(use_store=False)
+        fp = request_fingerprint(None, "hi")
+        assert await cache.begin("key-4", fp) is None
+        waiters = [asyncio.ensure_future(cache.begin("key-4", fp)) for _ in range(3)]
+        await asyncio.sleep(0)
+        await cache.abandon("key-4")
+        await asyncio.sleep(0.01)
+        # One waiter owns the key; the others keep waiting for its outcome
+        owners = [w for w in waiters if w.done()]
+        assert len(owners) == 1 and owners[0].result() is None
+        await cache.complete("key-4", fp, {"response": "once"})
+        assert [await w for w in waiters if w is not owners[0]] == [{"response": "once"}] * 2
+
+    asyncio.run(run())
+
+
+class FakeSnapshot:
+    def __init__(self, data, update_time):
+        self.exists = data is not None
+        self._data = data
+        self.update_time = update_time
+
+    def to_dict(self):
+        return dict(self._data)
+
+
+class FakeDocument:
+    def __init__(self, db, doc_id):
+        self.db, self.id = db, doc_id
+
+    def create(self, data):
+        if self.id in self.db.docs:
+            raise AlreadyExists("exists")
+        self.set(data)
+
+    def set(self, data):
+        self.db.version += 1
+        self.db.docs[self.id] = (dict(data), self.db.version)
+
+    def get(self):
+        data, version = self.db.docs.get(self.id, (None, None))
+        return FakeSnapshot(data, version)
+
+    def delete(self, option=None):
+        if option is not None and self.db.docs.get(self.id, (None, None))[1] != option:
+            raise FailedPrecondition("changed")
+        self.db.docs.pop(self.id, None)
+
+
+class FakeDb:
+    """One Firestore shared by two workers"""
+    def __init__(self):
+        self.docs, self.version = {}, 0
+
+    def collection(self, name):
+        return self
+
+    def document(self, doc_id):
+        return FakeDocument(self, doc_id)
+
+    def write_option(self, last_update_time):
+        return last_update_time
+
+
+def test_retry_on_another_worker_does_not_run_again():
+    async def run():
+        db = FakeDb()
+        original = idempotency.get_db
+        idempotency.get_db = lambda: db
+        try:
+            worker_a = IdempotencyCache(poll_interval=0.01)
+            worker_b = IdempotencyCache(poll_interval=0.01, wait_timeout=0.05)
+            fp = request_fingerprint("s1", "report")
+            assert await worker_a.begin("key-5", fp) is None
+
+            # While A is running, B's retry is refused rather than executed
+            try:
+                await worker_b.begin("key-5", fp)
+                assert False, "Retry should not run while the original is in flight"
+            except IdempotencyInFlight:
+                pass
+
+            retry = asyncio.ensure_future(IdempotencyCache(poll_interval=0.01).begin("key-5", fp))
+            await asyncio.sleep(0.02)
+            assert not retry.done()
+            await worker_a.complete("key-5", fp, {"response": "submitted"})
+            assert await retry == {"response": "submitted"}
+            assert await worker_b.begin("key-5", fp) == {"response": "submitted"}
+
+            # An abandoned key is released for the next attempt on any worker
+            assert await worker_a.begin("key-6", fp) is None
+            await worker_a.abandon("key-6")
+            assert await worker_b.begin("key-6", fp) is None
+        finally:
+            idempotency.get_db = original
+
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    test_ttl_cache_expiry_and_lru()
+    test_repeated_key_replays_response()
+    test_concurrent_retry_waits_for_original()
+    test_abandoned_key_lets_retry_run()
+    test_only_one_waiter_runs_after_abandon()
+    test_retry_on_another_worker_does_not_run_again()
+    print("✓ ALL IDEMPOTENCY TESTS PASSED!")
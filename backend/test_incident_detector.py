@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+"""
+Test sliding-window incident detection and escalation.
+"""
+
+import os
+import sys
+import tempfile
+sys.path.insert(0, '.')
+
+import incident_detector
+from incident_detector import FirestoreIncidentDetector, IncidentDetector, location_cell, parse_thresholds
+
+
+class FakeClock:
+    def __init__(self, now=1_700_000_000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+def _detector(**kwargs):
+    clock = FakeClock()
+    options = {"window": 600, "bucket": 60, "min_reports": 3, "cooldown": 1800, "clock": clock}
+    options.update(kwargs)
+    return IncidentDetector(**options), clock
+
+
+def test_location_cell():
+    assert location_cell("M.G. Road") == location_cell("near MG road") == "mg road"
+    assert parse_thresholds("waste=5, traffic=2") == {"waste": 5, "traffic": 2}
+
+
+def test_cluster_escalates_once():
+    detector, clock = _detector()
+    events = []
+    detector.subscribe(events.append)
+
+    assert detector.observe("waste", "MG Road", 5, "r1") is None
+    clock.now += 120
+    assert detector.observe("waste", "M.G. Road", 8, "r2") is None
+    # A different department or place does not count towards the cluster
+    assert detector.observe("traffic", "MG Road", 5, "r3") is None
+    assert detector.observe("waste", "Park Street", 5, "r4") is None
+    clock.now += 120
+    event = detector.observe("waste", "mg road", 6, "r5")
+    assert event is not None and event["reports"] == 3
+    assert event["max_severity"] == 8 and event["report_ids"] == ["r1", "r2", "r5"]
+    assert events == [event]
+
+    # Further reports inside the cooldown do not escalate again
+    assert detector.observe("waste", "MG Road", 9, "r6") is None
+    assert detector.stats()["escalations"] == 1
+
+
+def test_place_id_is_the_cell():
+    """Gazetteer place ids group spellings the text normalization cannot"""
+    detector, _ = _detector(min_reports=2)
+    detector.observe("traffic", "Jaipur Junction", cell="lm-railway-station")
+    event = detector.observe("traffic", "near the railway stn", cell="lm-railway-station")
+    assert event is not None and event["cell"] == "lm-railway-station"
+
+
+def test_old_reports_expire():
+    detector, clock = _detector()
+    detector.observe("traffic", "Ring Road")
+    detector.observe("traffic", "Ring Road")
+    clock.now += 601
+    assert detector.observe("traffic", "Ring Road") is None
+    assert detector.hot_cells()[0]["reports"] == 1
+
+
+def test_per_department_thresholds_and_cooldown():
+    detector, clock = _detector(dept_thresholds={"traffic": 2}, cooldown=300)
+    detector.observe("traffic", "Station Road")
+    assert detector.observe("traffic", "Station Road") is not None
+    clock.now += 200
+    assert detector.observe("traffic", "Station Road") is None
+    # An incident still active after the cooldown is escalated again
+    clock.now += 101
+    assert detector.observe("traffic", "Station Road") is not None
+    # Waste keeps the default threshold
+    detector.observe("waste", "Station Road")
+    assert detector.observe("waste", "Station Road") is None
+
+
+def test_state_is_bounded():
+    detector, _ = _detector(max_keys=3)
+    for i in range(10):
+        detector.observe("waste", f"Street {i}")
+    assert detector.stats()["keys"] == 3
+    assert detector.stats()["evicted"] == 7
+    assert {row["cell"] for row in detector.hot_cells()} == {"street 7", "street 8", "street 9"}
+
+
+def test_checkpoint_and_restore():
+    detector, clock = _detector()
+    detector.observe("waste", "MG Road", 4, "r1")
+    detector.observe("waste", "MG Road", 6, "r2")
+    path = os.path.join(tempfile.mkdtemp(), "incidents.json")
+    detector.save(path)
+
+    restored = IncidentDetector(window=600, bucket=60, min_reports=3, clock=clock)
+    restored.load(path)
+    clock.now += 60
+    event = restored.observe("waste", "MG Road", 5, "r3")
+    assert event is not None and event["report_ids"] == ["r1", "r2", "r3"]
+
+    # A checkpoint with a different layout is ignored rather than misread
+    other = IncidentDetector(window=300, bucket=30, clock=clock)
+    other.load(path)
+    assert other.stats()["keys"] == 0
+
+
+class FakeDoc:
+    def __init__(self, collection, doc_id):
+        self.collection, self.id = collection, doc_id
+
+    def get(self, transaction=None):
+        return self
+
+    @property
+    def exists(self):
+        return self.id in self.collection.docs
+
+    def to_dict(self):
+        return dict(self.collection.docs[self.id])
+
+
+class FakeCollection:
+    """Just enough of a Firestore collection and query for the detector"""
+    def __init__(self):
+        self.docs = {}
+
+    def document(self, doc_id=None):
+        return FakeDoc(self, doc_id or f"auto{len(self.docs)}")
+
+    def where(self, filter=None):
+        return self
+
+    def order_by(self, field, direction=None):
+        return self
+
+    def limit(self, count):
+        return self
+
+    def stream(self):
+        return [FakeDoc(self, doc_id) for doc_id in self.docs]
+
+
+class FakeTransaction:
+    def set(self, ref, data):
+        ref.collection.docs[ref.id] = data
+
+
+class FakeDb:
+    def __init__(self):
+        self.collections = {}
+
+    def collection(self, name):
+        return self.collections.setdefault(name, FakeCollection())
+
+    def transaction(self):
+        return FakeTransaction()
+
+
+def test_workers_share_firestore_windows():
+    """Two workers feeding the same cell escalate once, at the combined count"""
+    original = incident_detector._observe_in_transaction
+    incident_detector._observe_in_transaction = original.to_wrap  # run the body without retries
+    try:
+        db, clock = FakeDb(), FakeClock()
+        workers = [FirestoreIncidentDetector(db, window=600, bucket=60, min_reports=3, clock=clock) for _ in range(2)]
+        assert workers[0].observe("waste", "MG Road", 5, "r1") is None
+        assert workers[1].observe("waste", "M.G. Road", 7, "r2") is None
+        event = workers[0].observe("waste", "mg road", 6, "r3")
+        assert event is not None and event["report_ids"] == ["r1", "r2", "r3"]
+        assert workers[1].observe("waste", "MG Road", 6, "r4") is None  # cooldown is shared too
+
+        assert workers[1].hot_cells()[0]["reports"] == 4
+        assert workers[1].recent_events() == [event]
+    finally:
+        incident_detector._observe_in_transaction = original
+
+
+if __name__ == "__main__":
+    test_location_cell()
+    test_cluster_escalates_once()
+    test_place_id_is_the_cell()
+    test_old_reports_expire()
+    test_per_department_thresholds_and_cooldown()
+    test_state_is_bounded()
+    test_checkpoint_and_restore()
+    test_workers_share_firestore_windows()
+    print("✓ ALL INCIDENT DETECTOR TESTS PASSED!")
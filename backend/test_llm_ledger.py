@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+"""
+Test the LLM usage ledger and the cached LLM fallback in classify_intent.
+"""
+
+import json
+import os
+import sys
+import tempfile
+sys.path.insert(0, '.')
+
+_tmp = tempfile.mkdtemp()
+os.environ["LLM_LEDGER_PATH"] = os.path.join(_tmp, "ledger.jsonl")
+os.environ["LLM_LABELS_PATH"] = os.path.join(_tmp, "labels.jsonl")
+
+from langchain_core.messages import AIMessage
+from langchain_core.runnables import RunnableLambda
+
+import llm_ledger
+import langgraph_workflow
+from llm_ledger import track_llm_call, record_cache_hit, set_llm_context, aggregate
+
+
+def _read_ledger():
+    llm_ledger.get_ledger().flush()
+    with open(os.environ["LLM_LEDGER_PATH"]) as f:
+        return [json.loads(line) for line in f]
+
+
+def setup_function():
+    llm_ledger.get_ledger().flush()
+    open(os.environ["LLM_LEDGER_PATH"], "w").close()
+    llm_ledger._llm_context.set({})
+
+
+def test_call_is_recorded_with_context():
+    set_llm_context(session_id="s1", source="chat")
+    with track_llm_call("classify_intent", "gpt-3.5-turbo") as usage:
+        usage["department"] = "waste_dept"
+
+    records = _read_ledger()
+    assert len(records) == 1
+    record = records[0]
+    assert record["session_id"] == "s1" and record["source"] == "chat"
+    assert record["department"] == "waste_dept"
+    assert record["cache"] == "miss" and record["outcome"] == "ok"
+    assert record["latency_ms"] >= 0 and record["prompt_tokens"] == 0
+
+
+def test_failed_call_is_recorded_as_error():
+    try:
+        with track_llm_call("classify_intent", "gpt-3.5-turbo"):
+            raise RuntimeError("quota exceeded")
+        assert False, "Exception should propagate"
+    except RuntimeError:
+        pass
+    record = _read_ledger()[0]
+    assert record["outcome"] == "error" and "quota" in record["error"]
+
+
+def test_aggregate_by_department():
+    set_llm_context(source="classify_api")
+    for dept in ["traffic_dept", "traffic_dept", "energy_dept"]:
+        with track_llm_call("classify_intent", "gpt-3.5-turbo") as usage:
+            usage["department"] = dept
+    record_cache_hit("classify_intent", "gpt-3.5-turbo", "traffic_dept")
+
+    rows = {r["department"]: r for r in aggregate(["department"])}
+    assert rows["traffic_dept"]["calls"] == 3
+    assert rows["traffic_dept"]["cache_hits"] == 1
+    assert rows["energy_dept"]["calls"] == 1
+    assert aggregate(["source"])[0]["source"] == "classify_api"
+    assert aggregate(["day"], since="2999-01-01") == []
+    for field in ["message", "session_id"]:
+        try:
+            aggregate([field])
+            assert False, f"Grouping by {field} should be rejected"
+        except ValueError:
+            pass
+
+
+def test_aggregate_reads_only_new_lines():
+    with track_llm_call("classify_intent", "gpt-3.5-turbo") as usage:
+        usage["department"] = "waste_dept"
+    assert aggregate(["department"])[0]["calls"] == 1
+    rollup = llm_ledger.get_rollup()
+    offset = rollup.offset
+
+    with track_llm_call("classify_intent", "gpt-3.5-turbo") as usage:
+        usage["department"] = "waste_dept"
+    assert aggregate(["department"])[0]["calls"] == 2
+    assert rollup.offset > offset
+
+    # A restarted worker resumes from the saved rollup instead of re-reading the ledger
+    restarted = llm_ledger.LedgerRollup(os.environ["LLM_LEDGER_PATH"])
+    assert restarted.offset == rollup.offset
+    assert restarted.update() == 0
+    assert restarted.rows(["department"])[0]["calls"] == 2
+
+    # Truncating the ledger starts the totals over
+    open(os.environ["LLM_LEDGER_PATH"], "w").close()
+    assert aggregate(["department"]) == []
+
+
+def test_classify_intent_caches_llm_answers():
+    """A repeated message is answered from the cache and logged as a hit"""
+    calls = []
+
+    def fake_llm(prompt_value):
+        calls.append(prompt_value)
+        return AIMessage(content="waste_dept")
+
+    original_llm, original_local = langgraph_workflow._llm, langgraph_workflow.get_local_classifier
+    langgraph_workflow._llm = RunnableLambda(fake_llm)
+    langgraph_workflow.get_local_classifier = lambda: None
+    langgraph_workflow._llm_answers.clear()
+    try:
+        message = "Something odd is happening behind the school"
+        assert langgraph_workflow.classify_intent(message) == "waste_dept"
+        assert langgraph_workflow.classify_intent("  something ODD is happening behind the school") == "waste_dept"
+    finally:
+        langgraph_workflow._llm = original_llm
+        langgraph_workflow.get_local_classifier = original_local
+
+    assert len(calls) == 1
+    assert [r["cache"] for r in _read_ledger()] == ["miss", "hit"]
+
+
+def test_batch_classification_is_one_call():
+    calls = []
+
+    def fake_llm(prompt_value, **bound):
+        calls.append(prompt_value)
+        return AIMessage(content=json.dumps({"departments": ["waste_dept", "energy_dept"]}))
+
+    original_llm = langgraph_workflow._llm
+    langgraph_workflow._llm = RunnableLambda(fake_llm)
+    langgraph_workflow._llm_answers.clear()
+    langgraph_workflow._llm_answers.set("already known", "traffic_dept")
+    try:
+        departments = langgraph_workflow.classify_batch_with_llm(["Bins never emptied", "Already known", "Dark corner at night"])
+    finally:
+        langgraph_workflow._llm = original_llm
+
+    assert departments == ["waste_dept", "traffic_dept", "energy_dept"]
+    assert len(calls) == 1
+    assert [r["cache"] for r in _read_ledger()] == ["hit", "miss"]
+
+
+if __name__ == "__main__":
+    for test in [test_call_is_recorded_with_context, test_failed_call_is_recorded_as_error,
+                 test_aggregate_by_department, test_aggregate_reads_only_new_lines, test_classify_intent_caches_llm_answers,
+                 test_batch_classification_is_one_call]:
+        setup_function()
+        test()
+    print("✓ ALL LLM LEDGER TESTS PASSED!")
@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+Test the local naive Bayes intent classifier.
+"""
+
+import os
+import sys
+import tempfile
+sys.path.insert(0, '.')
+
+import numpy as np
+
+from local_classifier import (LocalIntentClassifier, load_jsonl_labels, hash_features, holdout_scores,
+                              fit_temperature, calibration_table, DEFAULT_SEED_PATH)
+
+
+def _seed_model():
+    rows = list(load_jsonl_labels(DEFAULT_SEED_PATH))
+    return LocalIntentClassifier.train([t for t, _ in rows], [d for _, d in rows])
+
+
+def test_hash_features_is_stable():
+    """Same text always maps to the same features (no per-process hash seed)"""
+    a = hash_features("Drain is clogged near the market", 1024)
+    b = hash_features("drain is CLOGGED near the market!", 1024)
+    assert (a[0] == b[0]).all() and (a[1] == b[1]).all()
+    assert hash_features("", 1024)[0].size == 0
+
+
+def test_seed_model_predictions():
+    """Messages without routing keywords are classified by the local model"""
+    model = _seed_model()
+    test_cases = [
+        ("the signal near the school is not working", "traffic_dept"),
+        ("sewage leaking in our lane", "waste_dept"),
+        ("electric pole wires are sparking", "energy_dept"),
+    ]
+    for message, expected in test_cases:
+        department, confidence = model.predict(message)
+        print(f"'{message}' → {department} ({confidence:.2f})")
+        assert department == expected, f"Failed for '{message}'"
+        assert 0.0 <= confidence <= 1.0
+
+
+def test_unknown_text_has_low_confidence():
+    """Unseen vocabulary stays near the uniform prior so the LLM is asked"""
+    model = _seed_model()
+    department, confidence = model.predict("qwerty zxcvb")
+    assert confidence < 0.5
+    assert model.predict("")[0] is None
+
+
+def test_calibrated_confidence_defers_off_topic_messages():
+    """Raw posteriors put these at 0.9+; after calibration they go to the LLM"""
+    rows = list(load_jsonl_labels(DEFAULT_SEED_PATH))
+    scores, targets, known = holdout_scores(rows)
+    model = _seed_model()
+    model.temperature = fit_temperature(scores, targets)
+    assert model.temperature > 1.0
+
+    for message in ("my neighbour dog keeps barking all night long", "water supply has been cut off"):
+        assert model.predict(message)[1] < 0.8, message
+    department, confidence = model.predict("electric pole wires are sparking")
+    assert department == "energy_dept" and confidence >= 0.8
+
+
+def test_too_few_known_features_is_undecided():
+    model = _seed_model()
+    assert model.predict("sparking qwerty")[0] is None  # one n-gram from training
+    model.min_features = 1
+    assert model.predict("sparking qwerty")[0] == "energy_dept"
+
+
+def test_calibration_table():
+    confidences = np.array([0.95, 0.85, 0.6, 0.4])
+    correct = np.array([True, False, True, False])
+    table = {row["threshold"]: row for row in calibration_table(confidences, correct, thresholds=(0.5, 0.8, 0.99))}
+    assert table[0.5]["coverage"] == 0.75 and abs(table[0.5]["accuracy"] - 2 / 3) < 1e-9
+    assert table[0.8]["coverage"] == 0.5 and table[0.8]["accuracy"] == 0.5
+    assert table[0.99]["coverage"] == 0.0 and table[0.99]["accuracy"] is None
+
+
+def test_save_and_load_roundtrip():
+    model = _seed_model()
+    model.temperature = 2.5
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "model.npz")
+        model.save(path)
+        loaded = LocalIntentClassifier.load(path)
+
+    message = "sewage leaking in our lane"
+    assert loaded.classes == model.classes
+    assert abs(loaded.temperature - 2.5) < 1e-6
+    assert (loaded.feature_seen == model.feature_seen).all()
+    assert loaded.predict(message)[0] == model.predict(message)[0]
+    assert abs(loaded.predict(message)[1] - model.predict(message)[1]) < 0.01
+
+
+if __name__ == "__main__":
+    test_hash_features_is_stable()
+    test_seed_model_predictions()
+    test_unknown_text_has_low_confidence()
+    test_calibrated_confidence_defers_off_topic_messages()
+    test_too_few_known_features_is_undecided()
+    test_calibration_table()
+    test_save_and_load_roundtrip()
+    print("✓ ALL LOCAL CLASSIFIER TESTS PASSED!")
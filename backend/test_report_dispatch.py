@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+Test background report delivery and session pinning used by the WebSocket transport.
+"""
+
+import os
+import sys
+import tempfile
+sys.path.insert(0, '.')
+
+# Keep the search snapshot and incident state written during delivery out of data/
+_tmp = tempfile.mkdtemp()
+os.environ.setdefault("REPORT_SEARCH_SNAPSHOT", os.path.join(_tmp, "report_search.npz"))
+os.environ.setdefault("INCIDENT_CHECKPOINT_PATH", os.path.join(_tmp, "incident_state.json"))
+os.environ.setdefault("INCIDENT_LOG_PATH", os.path.join(_tmp, "incidents.jsonl"))
+
+import firebase_client
+import report_dispatch
+import webhook_client
+
+
+def test_dispatch_notifies_subscribers():
+    """Listeners for the session hear about delivery; others do not"""
+    report_dispatch.save_report = lambda report: "report-1"
+    report_dispatch.send_webhook = lambda data: True
+    try:
+        heard, other = [], []
+        report_dispatch.subscribe("s1", heard.append)
+        report_dispatch.subscribe("s2", other.append)
+        future = report_dispatch.dispatch_report({"session_id": "s1"}, {"severity_level": 5})
+        status = future.result(timeout=5)
+        report_dispatch.unsubscribe("s1", heard.append)
+        report_dispatch.unsubscribe("s2", other.append)
+    finally:
+        report_dispatch.save_report = firebase_client.save_report
+        report_dispatch.send_webhook = webhook_client.send_webhook
+
+    assert status == {"session_id": "s1", "report_id": "report-1", "saved": True, "webhook_sent": True}
+    assert heard == [status]
+    assert other == []
+    assert report_dispatch._listeners == {}
+
+
+def test_webhook_is_sent_before_indexing_and_survives_their_failures():
+    calls = []
+
+    def failing_observe(report, report_id):
+        calls.append("observe")
+        raise RuntimeError("incident store down")
+
+    class FailingSearch:
+        def add(self, report_id, report):
+            calls.append("index")
+            raise RuntimeError("index unavailable")
+
+    originals = (report_dispatch.save_report, report_dispatch.send_webhook,
+                 report_dispatch.update_report_status, report_dispatch.get_report_search,
+                 report_dispatch.observe_report)
+    report_dispatch.save_report = lambda report: calls.append("save") or "report-2"
+    report_dispatch.send_webhook = lambda data: calls.append("webhook") or True
+    report_dispatch.update_report_status = lambda report_id, status: calls.append(status)
+    report_dispatch.get_report_search = lambda: FailingSearch()
+    report_dispatch.observe_report = failing_observe
+    try:
+        status = report_dispatch.deliver_report({"session_id": "s3"}, {"severity_level": 5})
+    finally:
+        (report_dispatch.save_report, report_dispatch.send_webhook,
+         report_dispatch.update_report_status, report_dispatch.get_report_search,
+         report_dispatch.observe_report) = originals
+
+    assert calls == ["save", "webhook", "dispatched", "index", "observe"]
+    assert status["webhook_sent"] is True and status["report_id"] == "report-2"
+
+
+def test_pinned_session_is_served_from_memory():
+    """While pinned, reads never reach Firestore and saves update the copy"""
+    firebase_client.pin_session("pinned-1")
+    firebase_client.pin_session("pinned-1")
+    assert firebase_client.get_conversation_state("pinned-1") is None
+
+    firebase_client.save_conversation_state({
+        "session_id": "pinned-1",
+        "department": "waste_dept",
+        "status": "awaiting_severity",
+        "user_message": "garbage overflowing",
+    })
+    state = firebase_client.get_conversation_state("pinned-1")
+    assert state["status"] == "awaiting_severity"
+    assert state["last_message"] == "garbage overflowing"
+
+    firebase_client.unpin_session("pinned-1")
+    assert "pinned-1" in firebase_client._pinned_sessions  # second connection still open
+    firebase_client.unpin_session("pinned-1")
+    assert "pinned-1" not in firebase_client._pinned_sessions
+
+
+if __name__ == "__main__":
+    test_dispatch_notifies_subscribers()
+    test_webhook_is_sent_before_indexing_and_survives_their_failures()
+    test_pinned_session_is_served_from_memory()
+    print("✓ ALL REPORT DISPATCH TESTS PASSED!")
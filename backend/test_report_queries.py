@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+Test the /reports query helpers: cursors, severity ranges and the page cache.
+"""
+
+import sys
+from datetime import datetime, timezone
+sys.path.insert(0, '.')
+
+import report_queries
+from report_queries import ReportQueryService, encode_cursor, decode_cursor, severity_values
+
+_real_get_db = report_queries.get_db
+
+
+def teardown_module():
+    report_queries.get_db = _real_get_db
+
+
+def test_cursor_roundtrip():
+    created_at = datetime(2024, 3, 1, 12, 30, 15, 123456, tzinfo=timezone.utc)
+    cursor = encode_cursor(created_at, "report-42")
+    assert "=" not in cursor
+    assert decode_cursor(cursor) == {"created_at": created_at, "__name__": "report-42"}
+
+    try:
+        decode_cursor("not-a-cursor")
+        assert False, "Garbage cursor should be rejected"
+    except ValueError:
+        pass
+
+
+def test_severity_range_becomes_in_filter():
+    assert severity_values(None, None) is None
+    assert severity_values(1, 10) is None
+    assert severity_values(8, None) == [8, 9, 10]
+    assert severity_values(None, 2) == [1, 2]
+    for bad in [(0, 5), (5, 11), (7, 3)]:
+        try:
+            severity_values(*bad)
+            assert False, f"{bad} should be rejected"
+        except ValueError:
+            pass
+
+
+def test_pages_are_cached():
+    """Repeated identical queries within the TTL do not hit Firestore"""
+    streams = []
+
+    class FakeQuery:
+        def where(self, filter):
+            return self
+
+        def order_by(self, field, direction=None):
+            return self
+
+        def limit(self, n):
+            return self
+
+        def stream(self):
+            streams.append(1)
+            return iter([])
+
+    class FakeDb:
+        def collection(self, name):
+            return FakeQuery()
+
+    report_queries.get_db = lambda: FakeDb()
+    service = ReportQueryService(cache_ttl=60)
+    first = service.query(department="waste", min_severity=8)
+    second = service.query(department="waste", min_severity=8)
+    service.query(department="traffic", min_severity=8)
+
+    assert first == second == {"reports": [], "next_cursor": None}
+    assert len(streams) == 2
+    assert service.stats()["hits"] == 1
+
+    try:
+        service.query(status="lost")
+        assert False, "Unknown status should be rejected"
+    except ValueError:
+        pass
+
+
+if __name__ == "__main__":
+    test_cursor_roundtrip()
+    test_severity_range_becomes_in_filter()
+    test_pages_are_cached()
+    print("✓ ALL REPORT QUERY TESTS PASSED!")
@@ -0,0 +1,33 @@
+#!/usr/bin/env python3
+"""
+Test the production launcher settings.
+"""
+
+import os
+import sys
+sys.path.insert(0, '.')
+
+from serve import available_cpus, worker_count, TunedUvicornWorker
+
+
+def test_worker_count_follows_cores_or_override():
+    os.environ.pop("WEB_CONCURRENCY", None)
+    assert worker_count() == available_cpus() >= 1
+    os.environ["WEB_CONCURRENCY"] = "3"
+    try:
+        assert worker_count() == 3
+    finally:
+        del os.environ["WEB_CONCURRENCY"]
+
+
+def test_worker_uses_fast_loop_and_bounded_shutdown():
+    config = TunedUvicornWorker.CONFIG_KWARGS
+    assert config["loop"] in ("uvloop", "asyncio")
+    assert config["http"] in ("httptools", "h11")
+    assert 1 <= config["timeout_graceful_shutdown"] < int(os.getenv("GRACEFUL_TIMEOUT", "30"))
+
+
+if __name__ == "__main__":
+    test_worker_count_follows_cores_or_override()
+    test_worker_uses_fast_loop_and_bounded_shutdown()
+    print("✓ ALL SERVE TESTS PASSED!")
@@ -0,0 +1,47 @@
+#!/usr/bin/env python3
+"""
+Test transcript packing and archive compaction helpers.
+"""
+
+import sys
+sys.path.insert(0, '.')
+
+from transcript_store import TranscriptStore, pack_turns, unpack_turns, merge_archive
+
+
+def _turns(n, start=0):
+    return [{"ts": float(i), "user_message": f"message {i}", "ai_response": "ok"} for i in range(start, start + n)]
+
+
+def test_pack_roundtrip():
+    turns = _turns(50) + [{"ts": 99.0, "user_message": "कचरा \n multi-line", "ai_response": ""}]
+    blob = pack_turns(turns)
+    assert unpack_turns(blob) == turns
+    assert len(blob) < len(str(turns)), "Blob should be compressed"
+    assert unpack_turns(None) == []
+
+
+def test_merge_archive_caps_oldest():
+    merged = merge_archive(_turns(8), _turns(4, start=8), max_turns=10)
+    assert len(merged) == 10
+    assert merged[0]["ts"] == 2.0 and merged[-1]["ts"] == 11.0
+
+
+def test_record_turn_is_buffered():
+    """Recording a turn does no I/O until the buffer flushes"""
+    store = TranscriptStore(flush_interval=3600)
+    flushed = []
+    store._writer.flush_fn = flushed.extend
+    store.record_turn("s1", "hi", "hello", status="greeting")
+    store.record_turn("s1", "garbage", "how severe?", department="waste_dept", status="awaiting_severity")
+    assert flushed == []
+    store.flush()
+    assert [t["user_message"] for t in flushed] == ["hi", "garbage"]
+    assert flushed[1]["department"] == "waste_dept"
+
+
+if __name__ == "__main__":
+    test_pack_roundtrip()
+    test_merge_archive_caps_oldest()
+    test_record_turn_is_buffered()
+    print("✓ ALL TRANSCRIPT TESTS PASSED!")
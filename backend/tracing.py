@@ -0,0 +1,88 @@
+import contextvars
+import functools
+import os
+import secrets
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+
+import httpx
+
+from batching import BatchBuffer, append_jsonl
+
+# The span that is currently open in this context (propagates into graph worker threads)
+_current_span: contextvars.ContextVar[Optional[Dict]] = contextvars.ContextVar("current_span", default=None)
+
+_exporter = None
+
+
+def tracing_enabled() -> bool:
+    return bool(os.getenv("TRACE_FILE") or os.getenv("TRACE_COLLECTOR_URL"))
+
+
+def new_id(nbytes: int = 8) -> str:
+    return secrets.token_hex(nbytes)
+
+
+def _export_spans(spans: List[Dict]):
+    """Append spans to the local trace file and/or POST them to a collector"""
+    trace_file = os.getenv("TRACE_FILE")
+    if trace_file:
+        append_jsonl(trace_file, spans)
+
+    collector_url = os.getenv("TRACE_COLLECTOR_URL")
+    if collector_url:
+        httpx.post(collector_url, json={"spans": spans}, timeout=5.0)
+
+
+def get_exporter() -> BatchBuffer:
+    """Get or create the batched span exporter"""
+    global _exporter
+    if _exporter is None:
+        _exporter = BatchBuffer(_export_spans, max_items=200, flush_interval=2.0, name="trace-exporter")
+    return _exporter
+
+
+def current_trace_id() -> Optional[str]:
+    current = _current_span.get()
+    return current["trace_id"] if current else None
+
+
+@contextmanager
+def span(name: str, **attributes):
+    """Time a block of work as a span; children opened inside it are linked to it"""
+    if not tracing_enabled():
+        yield None
+        return
+
+    parent = _current_span.get()
+    record = {
+        "trace_id": parent["trace_id"] if parent else new_id(16),
+        "span_id": new_id(),
+        "parent_id": parent["span_id"] if parent else None,
+        "name": name,
+        "start_time": time.time(),
+        "attributes": attributes,
+    }
+    token = _current_span.set(record)
+    started = time.perf_counter()
+    try:
+        yield record
+    except Exception as e:
+        record["error"] = repr(e)
+        raise
+    finally:
+        record["duration_ms"] = round((time.perf_counter() - started) * 1000, 3)
+        _current_span.reset(token)
+        get_exporter().add(record)
+
+
+def traced(name: str):
+    """Decorator form of span()"""
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
@@ -0,0 +1,150 @@
+import json
+import os
+import secrets
+import time
+import zlib
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+from firebase_admin import firestore
+
+from batching import BatchBuffer
+from firebase_client import get_db
+
+# Firestore rejects batches with more than 500 writes
+MAX_BATCH_WRITES = 500
+
+
+def pack_turns(turns: List[Dict]) -> bytes:
+    """Compress turns into a single blob (zlib'd JSON lines)"""
+    return zlib.compress("\n".join(json.dumps(t, ensure_ascii=False) for t in turns).encode(), 9)
+
+
+def unpack_turns(blob: Optional[bytes]) -> List[Dict]:
+    if not blob:
+        return []
+    return [json.loads(line) for line in zlib.decompress(blob).decode().split("\n") if line]
+
+
+def merge_archive(archived: List[Dict], compacted: List[Dict], max_turns: int) -> List[Dict]:
+    """Append compacted turns to the archive, dropping the oldest beyond the cap"""
+    merged = archived + compacted
+    return merged[-max_turns:] if max_turns > 0 else merged
+
+
+def _turn_id(turn: Dict) -> str:
+    # Sorts chronologically; the suffix keeps ids unique within the same microsecond
+    return f"{int(turn['ts'] * 1_000_000):016d}-{secrets.token_hex(3)}"
+
+
+class TranscriptStore:
+    """Append-only per-session transcript, buffered and written in batches"""
+
+    def __init__(self, live_turns: int = 40, max_turns: int = 1000, flush_interval: float = 1.0):
+        self.live_turns = live_turns
+        self.max_turns = max_turns
+        # Turns written since the last compaction, per session (bounded)
+        self._uncompacted: "OrderedDict[str, int]" = OrderedDict()
+        self._writer = BatchBuffer(self._flush, max_items=200, flush_interval=flush_interval, name="transcripts")
+
+    def record_turn(self, session_id: str, user_message: str, ai_response: str, department: str = "", status: str = ""):
+        """Queue one turn; returns immediately, no Firestore round trip on the request path"""
+        self._writer.add({
+            "session_id": session_id,
+            "ts": time.time(),
+            "user_message": user_message,
+            "ai_response": ai_response,
+            "department": department,
+            "status": status,
+        })
+
+    def flush(self):
+        self._writer.flush()
+
+    def _flush(self, turns: List[Dict]):
+        db = get_db()
+        if not db:
+            return
+
+        batch, writes = db.batch(), 0
+        for turn in turns:
+            ref = (db.collection("conversations").document(turn["session_id"])
+                   .collection("turns").document(_turn_id(turn)))
+            batch.set(ref, {k: v for k, v in turn.items() if k != "session_id"})
+            writes += 1
+            if writes == MAX_BATCH_WRITES:
+                batch.commit()
+                batch, writes = db.batch(), 0
+        if writes:
+            batch.commit()
+
+        due = []
+        for turn in turns:
+            session_id = turn["session_id"]
+            count = self._uncompacted.pop(session_id, 0) + 1
+            self._uncompacted[session_id] = count
+            # Compact once the live tail may have grown past its cap
+            if count > self.live_turns:
+                due.append(session_id)
+        while len(self._uncompacted) > 10000:
+            self._uncompacted.popitem(last=False)
+
+        for session_id in dict.fromkeys(due):
+            try:
+                self.compact(session_id)
+            except Exception as e:
+                print(f"[ERROR] Transcript compaction failed for {session_id}: {e}")
+
+    def compact(self, session_id: str):
+        """Fold all but the newest `live_turns` turns into the session's compressed archive"""
+        db = get_db()
+        if not db:
+            return
+        conversation = db.collection("conversations").document(session_id)
+        turns_ref = conversation.collection("turns")
+        docs = list(turns_ref.order_by("__name__").stream())
+        self._uncompacted.pop(session_id, None)
+        if len(docs) <= self.live_turns:
+            return
+
+        # Capped so the archive write and the deletes always fit in one atomic batch
+        old_docs = docs[:min(len(docs) - self.live_turns, MAX_BATCH_WRITES - 1)]
+        archive_ref = conversation.collection("transcript_archive").document("blob")
+        archive = archive_ref.get()
+        archived = unpack_turns(archive.to_dict().get("data")) if archive.exists else []
+        merged = merge_archive(archived, [d.to_dict() for d in old_docs], self.max_turns)
+
+        batch = db.batch()
+        batch.set(archive_ref, {
+            "data": pack_turns(merged),
+            "turns": len(merged),
+            "updated_at": firestore.SERVER_TIMESTAMP,
+        })
+        for doc in old_docs:
+            batch.delete(doc.reference)
+        batch.commit()
+
+    def get_transcript(self, session_id: str) -> List[Dict]:
+        """Archived turns followed by the live tail, oldest first"""
+        self.flush()
+        db = get_db()
+        if not db:
+            return []
+        conversation = db.collection("conversations").document(session_id)
+        archive = conversation.collection("transcript_archive").document("blob").get()
+        turns = unpack_turns(archive.to_dict().get("data")) if archive.exists else []
+        turns += [d.to_dict() for d in conversation.collection("turns").order_by("__name__").stream()]
+        return turns[-self.max_turns:]
+
+
+_transcripts = None
+
+def get_transcript_store() -> TranscriptStore:
+    """Get or create the transcript store"""
+    global _transcripts
+    if _transcripts is None:
+        _transcripts = TranscriptStore(
+            live_turns=int(os.getenv("TRANSCRIPT_LIVE_TURNS", "40")),
+            max_turns=int(os.getenv("TRANSCRIPT_MAX_TURNS", "1000")),
+        )
+    return _transcripts
@@ -0,0 +1,54 @@
+import os
+import time
+from typing import Callable, Dict, List, Tuple
+
+from firebase_client import warm_up_firestore
+from webhook_client import warm_up_webhook
+from langgraph_workflow import get_llm
+from local_classifier import get_local_classifier
+from report_search import warm_up_report_search
+from gazetteer import get_gazetteer
+
+
+def warm_up_llm():
+    """Build the ChatOpenAI client (no API call, so no cost)"""
+    if not os.getenv("OPENAI_API_KEY"):
+        raise RuntimeError("OPENAI_API_KEY not set")
+    get_llm()
+
+
+def warm_up_gazetteer():
+    if get_gazetteer() is None:
+        raise RuntimeError("No gazetteer")
+
+
+def warm_up_local_model():
+    if get_local_classifier() is None:
+        raise RuntimeError("No local intent model")
+
+
+WARMUP_STEPS: List[Tuple[str, Callable[[], None]]] = [
+    ("local_model", warm_up_local_model),
+    ("gazetteer", warm_up_gazetteer),
+    ("llm", warm_up_llm),
+    ("firestore", warm_up_firestore),
+    ("webhook", warm_up_webhook),
+    # Load the snapshot and catch up on newer reports before traffic arrives
+    ("report_search", warm_up_report_search),
+]
+
+
+def warm_up() -> Dict[str, Dict]:
+    """Run every warm-up step; a failed step is reported but does not stop the others"""
+    results = {}
+    for name, step in WARMUP_STEPS:
+        started = time.perf_counter()
+        try:
+            step()
+            results[name] = {"ok": True}
+        except Exception as e:
+            print(f"Warning: warm-up step '{name}' failed: {e}")
+            results[name] = {"ok": False, "error": str(e)}
+        results[name]["ms"] = round((time.perf_counter() - started) * 1000, 1)
+    print(f"[OK] Warm-up finished: {results}")
+    return results
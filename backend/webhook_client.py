@@ -2,8 +2,41 @@ import os
 import httpx
 from typing import Dict
 import json
+from tracing import traced
 
 
+# Shared client so webhook calls reuse pooled keep-alive connections
+_http_client = None
+
+def get_http_client() -> httpx.Client:
+    """Get or create the pooled HTTP client used for webhooks"""
+    global _http_client
+    if _http_client is None:
+        _http_client = httpx.Client(
+            timeout=10.0,
+            limits=httpx.Limits(max_connections=20, max_keepalive_connections=10, keepalive_expiry=60.0),
+        )
+    return _http_client
+
+
+def warm_up_webhook():
+    """Open (and pool) the TCP/TLS connection to the webhook host ahead of the first report"""
+    client = get_http_client()
+    webhook_url = os.getenv("WEBHOOK_URL")
+    if not webhook_url:
+        return
+    # HEAD does not create a row; any status is fine, we only want the connection
+    client.head(webhook_url, timeout=5.0)
+
+
+def close_http_client():
+    global _http_client
+    if _http_client is not None:
+        _http_client.close()
+        _http_client = None
+
+
+@traced("webhook.send")
 def send_webhook(data: Dict):
     """Send webhook POST request with report data to Relay/Google Sheet"""
     webhook_url = os.getenv("WEBHOOK_URL")
@@ -26,7 +59,7 @@ def send_webhook(data: Dict):
         payload["Severity"] = 5
     
     try:
-        response = httpx.post(
+        response = get_http_client().post(
             webhook_url, 
             json=payload, 
             timeout=10.0,
@@ -2,6 +2,7 @@ import React, { useState, useRef, useEffect } from 'react'
 import './App.css'
 
 const API_URL = 'http://localhost:8000'
+const WS_URL = API_URL.replace(/^http/, 'ws') + '/chat/ws'
 
 function App() {
   const [messages, setMessages] = useState([
@@ -9,8 +10,9 @@ function App() {
   ])
   const [input, setInput] = useState('')
   const [loading, setLoading] = useState(false)
-  const [sessionId, setSessionId] = useState(null)
   const messagesEndRef = useRef(null)
+  const socketRef = useRef(null)
+  const sessionIdRef = useRef(null)
 
   const scrollToBottom = () => {
     messagesEndRef.current?.scrollIntoView({ behavior: 'smooth' })
@@ -20,6 +22,67 @@ function App() {
     scrollToBottom()
   }, [messages])
 
+  // A ref rather than state: the socket handlers need the latest value without re-rendering
+  const updateSessionId = (id) => {
+    sessionIdRef.current = id
+  }
+
+  // Keep one WebSocket open per session; fall back to POST /chat while it is down
+  useEffect(() => {
+    let closed = false
+    let retryTimer = null
+    let socket = null
+
+    const connect = () => {
+      const query = sessionIdRef.current ? `?session_id=${encodeURIComponent(sessionIdRef.current)}` : ''
+      socket = new WebSocket(WS_URL + query)
+
+      socket.onmessage = (event) => {
+        const data = JSON.parse(event.data)
+        if (data.type === 'session') {
+          updateSessionId(data.session_id)
+        } else if (data.type === 'response') {
+          setMessages(prev => [...prev, { role: 'assistant', content: data.response }])
+          setLoading(false)
+        } else if (data.type === 'report_status') {
+          const content = data.webhook_sent
+            ? 'Your report has been delivered to the department.'
+            : data.saved
+              ? 'Your report is saved, but we could not notify the department automatically. Staff will review it.'
+              : 'Sorry, we could not save your report. Please try again.'
+          setMessages(prev => [...prev, { role: 'assistant', content }])
+        } else if (data.type === 'error') {
+          setMessages(prev => [...prev, {
+            role: 'assistant',
+            content: 'Sorry, I encountered an error. Please try again.'
+          }])
+          setLoading(false)
+        }
+      }
+
+      socket.onclose = (event) => {
+        if (socketRef.current === event.target) {
+          socketRef.current = null
+          // A reply that was in flight is lost; let the user resend
+          setLoading(false)
+        }
+        if (!closed) retryTimer = setTimeout(connect, 3000)
+      }
+
+      socket.onopen = (event) => {
+        if (!closed) socketRef.current = event.target
+      }
+    }
+
+    connect()
+    return () => {
+      closed = true
+      clearTimeout(retryTimer)
+      socketRef.current = null
+      socket?.close()
+    }
+  }, [])
+
   const sendMessage = async () => {
     if (!input.trim() || loading) return
 
@@ -30,6 +93,13 @@ function App() {
     // Add user message to chat
     setMessages(prev => [...prev, { role: 'user', content: userMessage }])
 
+    const socket = socketRef.current
+    if (socket && socket.readyState === WebSocket.OPEN) {
+      // The reply arrives through socket.onmessage
+      socket.send(JSON.stringify({ message: userMessage }))
+      return
+    }
+
     try {
       const response = await fetch(`${API_URL}/chat`, {
         method: 'POST',
@@ -38,7 +108,7 @@ function App() {
         },
         body: JSON.stringify({
           message: userMessage,
-          session_id: sessionId
+          session_id: sessionIdRef.current
         })
       })
 
@@ -50,7 +120,7 @@ function App() {
       
       // Update session ID if provided
       if (data.session_id) {
-        setSessionId(data.session_id)
+        updateSessionId(data.session_id)
       }
 
       // Add AI response to chat